@@ -0,0 +1,31 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# cli.py
+#
+# Copyright 2015
+# Leodanis Pozo Ramos <lpozo@openmailbox.org>
+# Ozkar L. Garcell <ozkar.garcell@gmail.com>
+#
+# Important: This module is the Prognos command line executable, e.g.:
+#     python cli.py daemon --interval 1800
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Prognos command line executable."""
+
+
+if __name__ == '__main__':
+    import sys
+    from prognos.cli import main
+    sys.exit(main())
@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+
+# bench.py
+#
+# Copyright 2015
+# Leodanis Pozo Ramos <lpozo@openmailbox.org>
+# Ozkar L. Garcell <ozkar.garcell@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Micro-benchmarks of the forecast engine.
+
+Every benchmark times one step, parse, transform, date resolution, store,
+diff, applying a changeset, each store query and the temperature and date
+helpers, against recorded feed files and synthetic feeds of several sizes.
+Results are saved as JSON, and compare_results flags the benchmarks that got
+slower than a threshold.
+
+Run them with: python cli.py bench run
+"""
+
+import datetime
+import itertools
+import json
+import platform
+import sqlite3
+import timeit
+from collections import OrderedDict
+from os.path import basename
+
+from .core.dates import resolve_dates
+from .core.diff import diff_records
+from .core.parser import CELLS_PER_DAY
+from .core.parser import parse_feed
+from .core.store import PrognosStore
+from .core.synthetic import generate_feed
+from .core.transform import transform
+from .utils import convert_temp
+from .utils import get_current_date
+
+
+# Number of stations of the default synthetic feeds
+DEFAULT_SIZES = (8, 64, 512)
+
+# Slowdown, as a fraction of the baseline, flagged as a regression
+DEFAULT_THRESHOLD = 0.1
+
+# Minimum seconds a timed run of a benchmark takes
+MIN_RUN_TIME = 0.2
+
+# One in every CHANGE_EVERY records changes between generations
+CHANGE_EVERY = 10
+
+
+def _next_generation(records):
+    """Get records with the day temperature of one in every CHANGE_EVERY
+    of them raised, as a new ingest might bring."""
+    return [record[:4] + (record[4] + 1,) + record[5:]
+            if i % CHANGE_EVERY == 0 else record
+            for i, record in enumerate(records)]
+
+
+def _feed_benchmarks(content):
+    """Get an OrderedDict of benchmark name -> callable for a feed."""
+    forecast = parse_feed(content)
+    records = transform(forecast)
+    cells = forecast.values()[0] if forecast else []
+    days = [int(cell) for cell in cells[::CELLS_PER_DAY] if cell.isdigit()]
+    temps = [record[4] for record in records]
+    location = records[0][3] if records else u''
+
+    store = PrognosStore(database_path=':memory:')
+    store.store_weather_forecast_data(forecast_data=records)
+
+    # Apply the changes back and forth, so every call writes them
+    changed = _next_generation(records)
+    changesets = itertools.cycle((diff_records(records, changed),
+                                  diff_records(changed, records)))
+    apply_store = PrognosStore(database_path=':memory:')
+    apply_store.store_weather_forecast_data(forecast_data=records)
+
+    return OrderedDict([
+        ('parse_feed', lambda: parse_feed(content)),
+        ('transform', lambda: transform(forecast)),
+        ('resolve_dates', lambda: resolve_dates(days)),
+        ('store_weather_forecast_data',
+         lambda: store.store_weather_forecast_data(forecast_data=records)),
+        ('diff_records_unchanged', lambda: diff_records(records, records)),
+        ('diff_records_changed', lambda: diff_records(records, changed)),
+        ('apply_changeset',
+         lambda: apply_store.apply_changeset(next(changesets))),
+        ('get_forecast_data', store.get_forecast_data),
+        ('get_extended_forecast',
+         lambda: store.get_extended_forecast(location, 5)),
+        ('get_current_forecast', store.get_current_forecast),
+        ('get_current_forecast_location',
+         lambda: store.get_current_forecast(location)),
+        ('current_forecast_in_db', store.current_forecast_in_db),
+        ('db_is_not_updated', lambda: store.db_is_not_updated),
+        ('db_is_empty', lambda: store.db_is_empty),
+        ('db_is_obsolete', lambda: store.db_is_obsolete),
+        ('last_update', lambda: store.last_update),
+        ('last_refresh', lambda: store.last_refresh),
+        ('generation', lambda: store.generation),
+        ('get_sources', store.get_sources),
+        ('convert_temp_column', lambda: convert_temp(temps)),
+    ])
+
+
+def _helper_benchmarks():
+    """Get an OrderedDict of benchmark name -> callable for the helpers."""
+    return OrderedDict([
+        ('convert_temp', lambda: convert_temp(25)),
+        ('get_current_date', get_current_date),
+    ])
+
+
+def _time(func, repeat):
+    """Time func, returning the seconds per call of every run."""
+    timer = timeit.Timer(func)
+
+    # Call it enough times for every run to take MIN_RUN_TIME
+    number = 1
+    while True:
+        elapsed = timer.timeit(number)
+        if elapsed >= MIN_RUN_TIME or number >= 10 ** 7:
+            break
+        number *= 10 if elapsed < MIN_RUN_TIME / 10 else 2
+
+    return [elapsed / number for elapsed in
+            timer.repeat(repeat=repeat, number=number)], number
+
+
+def get_feeds(sizes=DEFAULT_SIZES, feed_files=()):
+    """Get an OrderedDict of feed name -> content to benchmark with.
+
+    :param sizes: Numbers of stations of the synthetic feeds
+    :param feed_files: Paths to recorded feed files
+    """
+    feeds = OrderedDict()
+    for path in feed_files:
+        with open(path, 'rb') as feed_file:
+            feeds['file-' + basename(path)] = feed_file.read()
+    for size in sizes:
+        feeds['synthetic-{s}'.format(s=size)] = generate_feed(stations=size)
+
+    return feeds
+
+
+def run_benchmarks(feeds, repeat=5, name_filter=None, report=None):
+    """Run every benchmark against every feed.
+
+    Returns the results, ready to be saved with save_results.
+    :param feeds: OrderedDict of feed name -> content, see get_feeds
+    :param repeat: Number of timed runs of every benchmark
+    :param name_filter: Run only the benchmarks with this in their name
+    :param report: Called as report(name, result) after every benchmark
+    """
+    benchmarks = OrderedDict()
+    for feed_name, content in feeds.iteritems():
+        for name, func in _feed_benchmarks(content).iteritems():
+            benchmarks['{n}[{f}]'.format(n=name, f=feed_name)] = func
+    benchmarks.update(_helper_benchmarks())
+
+    results = OrderedDict()
+    for name, func in benchmarks.iteritems():
+        if name_filter and name_filter not in name:
+            continue
+
+        times, number = _time(func, repeat)
+        times.sort()
+        results[name] = OrderedDict([('min', times[0]),
+                                     ('median', times[len(times) // 2]),
+                                     ('max', times[-1]),
+                                     ('number', number),
+                                     ('repeat', repeat)])
+        if report is not None:
+            report(name, results[name])
+
+    return OrderedDict([
+        ('created', datetime.datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S')),
+        ('python', platform.python_version()),
+        ('sqlite', sqlite3.sqlite_version),
+        ('platform', platform.platform()),
+        ('benchmarks', results)])
+
+
+def save_results(results, path):
+    """Save benchmark results as JSON."""
+    with open(path, 'w') as results_file:
+        json.dump(results, results_file, indent=2)
+
+
+def load_results(path):
+    """Load benchmark results saved with save_results."""
+    with open(path) as results_file:
+        return json.load(results_file, object_pairs_hook=OrderedDict)
+
+
+def compare_results(baseline, current, threshold=DEFAULT_THRESHOLD,
+                    stat='min'):
+    """Compare two benchmark results.
+
+    Returns a list of (name, baseline seconds, current seconds, change,
+    regressed) for the benchmarks in both, change being the relative
+    difference, e.g. 0.25 for 25 % slower.
+    :param baseline: Results to compare against
+    :param current: New results
+    :param threshold: Change over which a benchmark regressed
+    :param stat: Statistic to compare: min, median or max
+    """
+    comparison = []
+    for name, result in current['benchmarks'].iteritems():
+        if name not in baseline['benchmarks']:
+            continue
+
+        before = baseline['benchmarks'][name][stat]
+        after = result[stat]
+        change = (after - before) / before if before else 0.0
+        comparison.append((name, before, after, change, change > threshold))
+
+    return comparison
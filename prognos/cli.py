@@ -0,0 +1,869 @@
+# -*- coding: utf-8 -*-
+
+# cli.py
+#
+# Copyright 2015
+# Leodanis Pozo Ramos <lpozo@openmailbox.org>
+# Ozkar L. Garcell <ozkar.garcell@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Command line interface for running Prognos without a UI."""
+
+import argparse
+import datetime
+import logging
+import signal
+import sys
+import threading
+from os import makedirs
+from os.path import dirname
+from os.path import exists
+from os.path import join
+
+from .core.analytics import ForecastAnalytics
+from .core.api import ForecastResponses
+from .core.api import ForecastServer
+from .core.api import StoreWatcher
+from .core.leader import LeaderLock
+from .core.memprofile import MemoryProfiler
+from .core.metrics import metrics
+from .core.pipeline import ForecastPipeline
+from .core.providers.base import DEFAULT_PROVIDER
+from .core.providers.base import discover_providers
+from .core.providers.base import load_providers
+from .core.scheduler import RefreshScheduler
+from .core.store import DEFAULT_DATABASE_PATH
+from .core.store import PrognosStore
+
+
+logger = logging.getLogger('prognos')
+
+
+def _log_error(error):
+    """Log a failed refresh."""
+    logger.warning('Refresh failed: %s', error)
+
+
+def _build_scheduler(args, store):
+    """Build a RefreshScheduler over store from the daemon options."""
+    providers = load_providers(args.provider or [DEFAULT_PROVIDER])
+    for url in args.feed:
+        providers[0].add_feed(url)
+
+    pipeline = ForecastPipeline(store=store,
+                                providers=providers,
+                                deadline=args.deadline,
+                                analytics=ForecastAnalytics(store))
+    pipeline.bind(on_error=_log_error)
+
+    if args.memprofile:
+        profiler = MemoryProfiler(log_path=join(dirname(args.db),
+                                                'memory.jsonl'))
+        profiler.start()
+        pipeline.bind(on_stored=lambda records: profiler.snapshot('refresh'))
+
+    return RefreshScheduler(pipeline=pipeline,
+                            interval=args.interval,
+                            jitter=args.jitter,
+                            ttl=args.ttl,
+                            max_interval=args.max_interval,
+                            leader=LeaderLock(store.lock_path))
+
+
+def daemon(args):
+    """Refresh the forecast store on a schedule."""
+    store = PrognosStore(database_path=args.db)
+    scheduler = _build_scheduler(args, store)
+
+    try:
+        if args.once:
+            scheduler.run_once()
+        else:
+            signal.signal(signal.SIGTERM,
+                          lambda signum, frame: scheduler.stop())
+            scheduler.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        scheduler.leader.release()
+        store.close_connection()
+
+
+def serve(args):
+    """Serve the stored forecast over HTTP."""
+    responses = ForecastResponses()
+    watcher = StoreWatcher(database_path=args.db,
+                           responses=responses,
+                           interval=args.poll)
+    watcher.start()
+
+    if args.refresh:
+        def run_scheduler():
+            """Refresh in the background, updating on every change."""
+            store = PrognosStore(database_path=args.db)
+            scheduler = _build_scheduler(args, store)
+            scheduler.pipeline.bind(on_changed=responses.apply)
+            scheduler.run()
+
+        scheduler_thread = threading.Thread(target=run_scheduler,
+                                            name='prognos-scheduler')
+        scheduler_thread.daemon = True
+        scheduler_thread.start()
+
+    server = ForecastServer((args.host, args.port), responses)
+    # shutdown() blocks until serve_forever() returns, so it can't run in
+    # the main thread
+    signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(
+        target=server.shutdown).start())
+    logger.info('Serving on http://%s:%d', args.host, args.port)
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.stop()
+        server.server_close()
+
+
+def bench_run(args):
+    """Run the micro-benchmarks and save their results."""
+    # Imported here so the other commands don't pay for it
+    from . import bench
+
+    def report(name, result):
+        """Print a benchmark result."""
+        print('{n:<60} {t:>12.2f} us'.format(n=name, t=result['min'] * 1e6))
+
+    feeds = bench.get_feeds(sizes=args.size or bench.DEFAULT_SIZES,
+                            feed_files=args.feed_file)
+    results = bench.run_benchmarks(feeds,
+                                   repeat=args.repeat,
+                                   name_filter=args.filter,
+                                   report=report)
+
+    output = args.output or join(
+        dirname(args.db), 'bench',
+        datetime.datetime.now().strftime('%Y%m%d-%H%M%S.json'))
+    if not exists(dirname(output)):
+        makedirs(dirname(output))
+    bench.save_results(results, output)
+    logger.info('Results saved to %s', output)
+
+
+def bench_compare(args):
+    """Compare two benchmark results, failing on regressions."""
+    from . import bench
+
+    comparison = bench.compare_results(bench.load_results(args.baseline),
+                                       bench.load_results(args.current),
+                                       threshold=args.threshold,
+                                       stat=args.stat)
+
+    regressions = 0
+    for name, before, after, change, regressed in comparison:
+        regressions += regressed
+        print('{n:<60} {b:>12.2f} {a:>12.2f} us {c:>+8.1%}{r}'.format(
+            n=name, b=before * 1e6, a=after * 1e6, c=change,
+            r='  REGRESSION' if regressed else ''))
+
+    if regressions:
+        logger.warning('%d benchmarks regressed more than %.0f %%',
+                       regressions, args.threshold * 100)
+        return 1
+
+    return 0
+
+
+def generate(args):
+    """Write a synthetic feed, or a directory of daily ones."""
+    from .core.synthetic import generate_feed
+    from .core.synthetic import write_snapshots
+
+    options = dict(stations=args.stations,
+                   days=args.days,
+                   seed=args.seed,
+                   malformed=args.malformed,
+                   empty=args.empty,
+                   unknown_statuses=args.unknown_statuses,
+                   rollover=args.rollover,
+                   shuffle=args.shuffle)
+
+    if args.snapshots:
+        if not exists(args.output):
+            makedirs(args.output)
+        paths = write_snapshots(args.output, args.snapshots,
+                                args.issue_date or datetime.date.today(),
+                                **options)
+        logger.info('Wrote %d feeds to %s', len(paths), args.output)
+        return
+
+    content = generate_feed(issue_date=args.issue_date, **options)
+    if args.output == '-':
+        sys.stdout.write(content)
+    else:
+        with open(args.output, 'wb') as feed_file:
+            feed_file.write(content)
+
+
+def atlas(args):
+    """Pack the weather icons into atlases, before packaging the app."""
+    # Imported here so the other commands don't need Kivy
+    from .core.statuses import STATUSES
+    from .imagecache import build_atlases
+
+    built = build_atlases(STATUSES.icons.values(), force=args.force)
+    for path in built:
+        logger.info('Built %s', path)
+    if not built:
+        logger.info('Atlases are up to date')
+
+
+def export(args):
+    """Export the stored forecast or the archive as CSV, chunk by chunk."""
+    from .core.frame import FRAME_QUERY_COLUMNS
+    from .core.frame import ForecastFrame
+
+    if args.archive:
+        sql_cmd, parameters = ForecastFrame.archive_query(
+            location=args.location, start=args.start, end=args.end)
+    else:
+        sql_cmd = u"SELECT {c} FROM 'main'.'prognos';".format(
+            c=FRAME_QUERY_COLUMNS)
+        parameters = ()
+
+    store = PrognosStore(database_path=args.db)
+    output = sys.stdout if args.output == '-' else open(args.output, 'wb')
+    rows = 0
+    try:
+        for number, frame in enumerate(ForecastFrame.iter_query(
+                store.cursor_, sql_cmd, parameters,
+                chunk_size=args.chunk_size)):
+            if not args.archive:
+                frame = frame.where(
+                    stations=[args.location] if args.location else None,
+                    start=args.start, end=args.end)
+            frame.convert(args.unit).write_csv(output, header=number == 0)
+            rows += len(frame)
+    except ImportError as error:
+        logger.error('%s', error)
+        return 1
+    finally:
+        if output is not sys.stdout:
+            output.close()
+        store.close_connection()
+
+    logger.info('Exported %d rows', rows)
+
+
+def overview(args):
+    """Print the upcoming forecast of every station side by side."""
+    from .core.frame import ForecastFrame
+
+    today = datetime.date.today()
+    store = PrognosStore(database_path=args.db)
+    try:
+        frame = ForecastFrame.from_store(store).where(start=today)
+        finals = ForecastAnalytics(store).final_frame(codes=frame.codes)
+    except ImportError as error:
+        logger.error('%s', error)
+        return 1
+    finally:
+        store.close_connection()
+
+    frame = frame.convert(args.unit)
+
+    # Rolling mean of the final day temperatures, the last one of every
+    # station wins
+    finals = finals.where(end=today).convert(args.unit).sort()
+    recent = dict(zip(
+        [frame.codes.stations[station]
+         for station in finals.data['station'].tolist()],
+        finals.rolling('day_temp', args.window)['mean'].tolist()))
+
+    def temps(day_temp, night_temp):
+        """Format the temperatures of a day."""
+        return '{d}/{n}'.format(d='-' if day_temp is None else day_temp,
+                                n='-' if night_temp is None else night_temp)
+
+    days = [today + datetime.timedelta(days=number)
+            for number in xrange(args.days)]
+    print(u'{s:<24} {d} {r:>7}'.format(
+        s='station', r='recent',
+        d=' '.join('{0:>7}'.format(day.strftime('%d/%m')) for day in days)))
+    for station, station_frame in frame.group_by_station().iteritems():
+        forecasts = dict((date, temps(day_temp, night_temp))
+                         for _, date, _, day_temp, night_temp, _ in
+                         station_frame.records())
+        mean = recent.get(station)
+        print(u'{s:<24} {d} {r:>7}'.format(
+            s=station,
+            d=' '.join('{0:>7}'.format(forecasts.get(day, ''))
+                       for day in days),
+            r='-' if mean is None or mean != mean else
+            '{0:.1f}'.format(mean)).encode('utf-8'))
+
+
+def _build_standin(args):
+    """Build the stand-in Met server, and proxy if asked for, from the
+    standin options.
+
+    Returns (server, proxy), proxy being None without --proxy-port.
+    """
+    from .core.synthetic import generate_feed
+    from .standin import StandInProxy
+    from .standin import StandInServer
+
+    feeds = []
+    for path in args.feed_file:
+        with open(path, 'rb') as feed_file:
+            feeds.append(feed_file.read())
+    if not feeds:
+        feeds = [generate_feed(stations=args.stations, days=args.days,
+                               seed=seed)
+                 for seed in xrange(args.variants)]
+
+    server = StandInServer((args.host, args.port), feeds,
+                           latency=args.latency,
+                           bandwidth=args.bandwidth,
+                           error_rate=args.error_rate,
+                           truncate_rate=args.truncate_rate)
+
+    proxy = None
+    if args.proxy_port is not None:
+        proxy = StandInProxy((args.host, args.proxy_port),
+                             user=args.proxy_user,
+                             password=args.proxy_password)
+
+    return server, proxy
+
+
+def standin(args):
+    """Serve feeds from a local stand-in of the Met site."""
+    from .standin import serve_in_background
+
+    server, proxy = _build_standin(args)
+    logger.info('Serving feeds on %s', server.url)
+    if proxy is not None:
+        serve_in_background(proxy)
+        logger.info('Proxy on %s:%d as %s', args.host,
+                    proxy.server_address[1], args.proxy_user)
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if proxy is not None:
+            proxy.shutdown()
+
+
+def loadtest(args):
+    """Time refreshes against a stand-in of the Met site."""
+    from .loadtest import run_latency
+    from .standin import serve_in_background
+
+    server = proxy = None
+    url = args.url
+    if url is None:
+        server, proxy = _build_standin(args)
+        serve_in_background(server)
+        url = server.url
+        if proxy is not None:
+            serve_in_background(proxy)
+
+    def report(number, time_to_stored, time_to_ui):
+        """Log a refresh."""
+        if time_to_stored is None:
+            logger.debug('Refresh %d failed', number)
+        else:
+            logger.debug('Refresh %d: stored in %.1f ms, UI in %.1f ms',
+                         number, time_to_stored * 1000, time_to_ui * 1000)
+
+    try:
+        summary = run_latency(
+            url,
+            refreshes=args.refreshes,
+            interval=args.interval,
+            proxy=(args.host, proxy.server_address[1], args.proxy_user,
+                   args.proxy_password) if proxy is not None else None,
+            report=report)
+    finally:
+        for running in (server, proxy):
+            if running is not None:
+                running.shutdown()
+                running.server_close()
+
+    print('refreshes: {refreshes}  stored: {stored}  '
+          'failures: {failures}  shown: {shown}'.format(**summary))
+    for name in ('time_to_stored', 'time_to_ui'):
+        print('{n:<15} '.format(n=name) + '  '.join(
+            '{p}: {t}'.format(p=percent, t='-' if value is None else
+                              '%.1f ms' % (value * 1000))
+            for percent, value in summary[name].iteritems()))
+
+
+def soak(args):
+    """Refresh many times from a stand-in, failing if memory grows."""
+    from .loadtest import run_soak
+    from .standin import serve_in_background
+
+    server, proxy = _build_standin(args)
+    serve_in_background(server)
+    if proxy is not None:
+        serve_in_background(proxy)
+
+    def report(snapshot):
+        """Log a memory sample."""
+        logger.info('%s: %.1f MiB, %d objects', snapshot['label'],
+                    snapshot['memory'] / 1048576.0, snapshot['objects'])
+        for where, size, count in snapshot['growths']:
+            logger.debug('  %s: %+d B, %+d', where, size, count)
+
+    try:
+        summary = run_soak(
+            server.url,
+            refreshes=args.refreshes,
+            sample_every=args.sample_every,
+            proxy=(args.host, proxy.server_address[1], args.proxy_user,
+                   args.proxy_password) if proxy is not None else None,
+            profiler=MemoryProfiler(log_path=join(dirname(args.db),
+                                                  'memory.jsonl')),
+            report=report)
+    finally:
+        for running in (server, proxy):
+            if running is not None:
+                running.shutdown()
+                running.server_close()
+
+    print('refreshes: {refreshes}  failures: {failures}  '
+          'baseline: {b:.1f} MiB  final: {f:.1f} MiB  '
+          'growth: {g:+.1f} KiB'.format(b=summary['baseline'] / 1048576.0,
+                                         f=summary['final'] / 1048576.0,
+                                         g=summary['growth'] / 1024.0,
+                                         **summary))
+
+    if summary['growth'] > args.tolerance:
+        logger.warning('Memory grew more than %d bytes', args.tolerance)
+        return 1
+
+    return 0
+
+
+def _add_standin_arguments(parser):
+    """Add the stand-in server and proxy options to parser."""
+    parser.add_argument('--host', default='127.0.0.1',
+                        help='address to listen on (default: %(default)s)')
+    parser.add_argument('--port', type=int, default=0,
+                        help='port to listen on (default: any free one)')
+    parser.add_argument('--feed-file', action='append', default=[],
+                        metavar='PATH',
+                        help='recorded feed to serve, can be repeated, they '
+                             'are served in turn (default: synthetic feeds)')
+    parser.add_argument('--stations', type=int, default=8,
+                        help='stations of the synthetic feeds '
+                             '(default: %(default)s)')
+    parser.add_argument('--days', type=int, default=5,
+                        help='days of the synthetic feeds '
+                             '(default: %(default)s)')
+    parser.add_argument('--variants', type=int, default=2,
+                        help='different synthetic feeds served in turn '
+                             '(default: %(default)s)')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='seconds to wait before answering '
+                             '(default: %(default)s)')
+    parser.add_argument('--bandwidth', type=int, default=0,
+                        help='bytes per second of the bodies, 0 for no '
+                             'limit (default: %(default)s)')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='fraction of requests failing with a 503 '
+                             '(default: %(default)s)')
+    parser.add_argument('--truncate-rate', type=float, default=0.0,
+                        help='fraction of bodies cut halfway '
+                             '(default: %(default)s)')
+    parser.add_argument('--proxy-port', type=int,
+                        help='also run an authenticating proxy on this port, '
+                             '0 for any free one')
+    parser.add_argument('--proxy-user', default='prognos',
+                        help='user name the proxy asks for '
+                             '(default: %(default)s)')
+    parser.add_argument('--proxy-password', default='prognos',
+                        help='password the proxy asks for '
+                             '(default: %(default)s)')
+
+
+def backfill(args):
+    """Archive a directory of saved feed files."""
+    from .core.backfill import backfill as backfill_archive
+
+    store = PrognosStore(database_path=args.db)
+    last_report = [0]
+
+    def report(done, total, rows, seconds):
+        """Log the progress about once a second."""
+        if seconds - last_report[0] >= 1 or done == total:
+            last_report[0] = seconds
+            logger.info('%d/%d files, %d rows, %.1f files/s, %.0f rows/s',
+                        done, total, rows, done / seconds if seconds else 0,
+                        rows / seconds if seconds else 0)
+
+    try:
+        result = backfill_archive(store, args.directory,
+                                  provider_name=args.provider,
+                                  processes=args.processes,
+                                  batch_size=args.batch_size,
+                                  report=report)
+    except KeyboardInterrupt:
+        logger.warning('Interrupted, run again to resume')
+        return 1
+    finally:
+        store.close_connection()
+
+    seconds = result.seconds or 1e-9
+    print('files: {f}  skipped: {s}  failed: {x}  rows: {r}  '
+          '{fs:.1f} files/s  {rs:.0f} rows/s'.format(
+              f=result.files, s=result.skipped, x=result.failed,
+              r=result.rows, fs=(result.files + result.failed) / seconds,
+              rs=result.rows / seconds))
+
+    return 1 if result.failed else 0
+
+
+def analytics(args):
+    """Print the accuracy and drift of the archived forecasts."""
+    store = PrognosStore(database_path=args.db)
+    try:
+        forecast_analytics = ForecastAnalytics(store)
+        if args.rebuild:
+            forecast_analytics.rebuild()
+
+        if args.by_lead:
+            rows = forecast_analytics.lead_summary(location=args.location)
+        else:
+            rows = [row for row in forecast_analytics.station_summary(
+                min_lead=args.min_lead, max_lead=args.max_lead)
+                    if args.location is None or row.location == args.location]
+    finally:
+        store.close_connection()
+
+    def number(value, spec='{0:+.2f}'):
+        """Format a statistic, '-' if there is no data for it."""
+        return '-' if value is None else spec.format(value)
+
+    print(u'{0:<24} {1:>9} {2:>7} {3:>7} {4:>7} {5:>7} {6:>7} {7:>7} '
+          u'{8:>6}'.format('lead' if args.by_lead else 'station',
+                           'forecasts', 'd.drift', 'n.drift', 'd.bias',
+                           'd.mae', 'n.bias', 'n.mae', 'hits'))
+    for row in rows:
+        print(u'{0:<24} {1:>9} {2:>7} {3:>7} {4:>7} {5:>7} {6:>7} {7:>7} '
+              u'{8:>6}'.format(row.lead if args.by_lead else row.location,
+                               row.forecasts,
+                               number(row.day_drift, '{0:.2f}'),
+                               number(row.night_drift, '{0:.2f}'),
+                               number(row.day_bias),
+                               number(row.day_mae, '{0:.2f}'),
+                               number(row.night_bias),
+                               number(row.night_mae, '{0:.2f}'),
+                               number(row.status_hit_rate, '{0:.0%}'))
+              .encode('utf-8'))
+
+
+def _parse_date(text):
+    """Parse a YYYY-MM-DD date option."""
+    try:
+        return datetime.datetime.strptime(text, '%Y-%m-%d').date()
+    except ValueError:
+        raise argparse.ArgumentTypeError('not a YYYY-MM-DD date: %s' % text)
+
+
+def _parse_text(text):
+    """Decode a text option, e.g. a station name."""
+    return text.decode('utf-8')
+
+
+def _add_schedule_arguments(parser):
+    """Add the scheduler options to parser."""
+    parser.add_argument('--interval', type=float, default=1800,
+                        help='seconds between checks (default: %(default)s)')
+    parser.add_argument('--jitter', type=float, default=0.1,
+                        help='fraction of the interval to randomize '
+                             '(default: %(default)s)')
+    parser.add_argument('--ttl', type=float, default=3600,
+                        help='seconds stored data stays fresh '
+                             '(default: %(default)s)')
+    parser.add_argument('--max-interval', type=float, default=21600,
+                        help='maximum seconds between checks while backing '
+                             'off (default: %(default)s)')
+    parser.add_argument('--provider', action='append',
+                        choices=sorted(discover_providers()),
+                        help='forecast provider to fetch, can be repeated, '
+                             'earlier ones win where they overlap '
+                             '(default: %s)' % DEFAULT_PROVIDER)
+    parser.add_argument('--feed', action='append', default=[],
+                        metavar='URL',
+                        help='URL of another feed of the first provider to '
+                             'ingest too, can be repeated')
+    parser.add_argument('--deadline', type=float, default=120,
+                        help='seconds to wait for all feeds on a refresh '
+                             '(default: %(default)s)')
+
+
+def build_parser():
+    """Build the command line parser."""
+    parser = argparse.ArgumentParser(prog='prognos')
+    parser.add_argument('--db', default=DEFAULT_DATABASE_PATH,
+                        help='path to prognos.db (default: %(default)s)')
+    parser.add_argument('-v', '--verbose', action='store_true',
+                        help='log debug messages')
+    parser.add_argument('--metrics', action='store_true',
+                        help='export metrics.prom and trace.jsonl next to '
+                             'the DB')
+    parser.add_argument('--memprofile', action='store_true',
+                        help='snapshot memory after every refresh into '
+                             'memory.jsonl next to the DB')
+    commands = parser.add_subparsers(title='commands')
+
+    daemon_parser = commands.add_parser(
+        'daemon', help='refresh the forecast on a schedule')
+    _add_schedule_arguments(daemon_parser)
+    daemon_parser.add_argument('--once', action='store_true',
+                               help='check once and exit')
+    daemon_parser.set_defaults(func=daemon)
+
+    serve_parser = commands.add_parser(
+        'serve', help='serve the forecast as JSON over HTTP')
+    serve_parser.add_argument('--host', default='127.0.0.1',
+                              help='address to listen on '
+                                   '(default: %(default)s)')
+    serve_parser.add_argument('--port', type=int, default=8080,
+                              help='port to listen on (default: %(default)s)')
+    serve_parser.add_argument('--poll', type=float, default=5,
+                              help='seconds between store checks '
+                                   '(default: %(default)s)')
+    serve_parser.add_argument('--refresh', action='store_true',
+                              help='also refresh the store on a schedule')
+    _add_schedule_arguments(serve_parser)
+    serve_parser.set_defaults(func=serve)
+
+    generate_parser = commands.add_parser(
+        'generate', help='write a synthetic feed in the Met format')
+    generate_parser.add_argument('--stations', type=int, default=8,
+                                 help='number of stations '
+                                      '(default: %(default)s)')
+    generate_parser.add_argument('--days', type=int, default=5,
+                                 help='forecast days of every station '
+                                      '(default: %(default)s)')
+    generate_parser.add_argument('--issue-date', type=_parse_date,
+                                 metavar='YYYY-MM-DD',
+                                 help='first forecast day (default: today)')
+    generate_parser.add_argument('--seed', type=int, default=0,
+                                 help='seed of the random data '
+                                      '(default: %(default)s)')
+    generate_parser.add_argument('--malformed', type=float, default=0.0,
+                                 help='fraction of malformed cells '
+                                      '(default: %(default)s)')
+    generate_parser.add_argument('--empty', type=float, default=0.0,
+                                 help='fraction of empty cells '
+                                      '(default: %(default)s)')
+    generate_parser.add_argument('--unknown-statuses', type=float,
+                                 default=0.0,
+                                 help='fraction of unknown statuses '
+                                      '(default: %(default)s)')
+    generate_parser.add_argument('--rollover', action='store_true',
+                                 help='cross the end of the month and year')
+    generate_parser.add_argument('--shuffle', action='store_true',
+                                 help='shuffle the order of the stations')
+    generate_parser.add_argument('--snapshots', type=int, metavar='N',
+                                 help='write N daily feeds, from the issue '
+                                      'date on, into the --output directory')
+    generate_parser.add_argument('-o', '--output', default='-',
+                                 metavar='PATH',
+                                 help='where to write the feed '
+                                      '(default: stdout)')
+    generate_parser.set_defaults(func=generate)
+
+    atlas_parser = commands.add_parser(
+        'atlas', help='pack the weather icons into atlases, run it before '
+                      'packaging the app')
+    atlas_parser.add_argument('--force', action='store_true',
+                              help='rebuild up to date atlases too')
+    atlas_parser.set_defaults(func=atlas)
+
+    standin_parser = commands.add_parser(
+        'standin', help='serve feeds from a local stand-in of the Met site')
+    _add_standin_arguments(standin_parser)
+    standin_parser.set_defaults(func=standin)
+
+    loadtest_parser = commands.add_parser(
+        'loadtest', help='time refreshes against a stand-in of the Met site')
+    _add_standin_arguments(loadtest_parser)
+    loadtest_parser.add_argument('--url',
+                                 help='feed to refresh from instead of a '
+                                      'stand-in started for the test')
+    loadtest_parser.add_argument('--refreshes', type=int, default=100,
+                                 help='number of refreshes '
+                                      '(default: %(default)s)')
+    loadtest_parser.add_argument('--interval', type=float, default=0.0,
+                                 help='seconds between refreshes '
+                                      '(default: %(default)s)')
+    loadtest_parser.set_defaults(func=loadtest)
+
+    soak_parser = commands.add_parser(
+        'soak', help='refresh many times from a stand-in of the Met site, '
+                     'exit with 1 if memory grows')
+    _add_standin_arguments(soak_parser)
+    soak_parser.add_argument('--refreshes', type=int, default=10000,
+                             help='number of refreshes '
+                                  '(default: %(default)s)')
+    soak_parser.add_argument('--sample-every', type=int, default=100,
+                             help='refreshes between memory samples '
+                                  '(default: %(default)s)')
+    soak_parser.add_argument('--tolerance', type=int, default=1048576,
+                             help='bytes memory may grow after the warmup '
+                                  '(default: %(default)s)')
+    soak_parser.set_defaults(func=soak)
+
+    backfill_parser = commands.add_parser(
+        'backfill', help='archive a directory of saved feed files')
+    backfill_parser.add_argument('directory',
+                                 help='directory with the feed files, '
+                                      'scanned recursively')
+    backfill_parser.add_argument('--provider', default=DEFAULT_PROVIDER,
+                                 choices=sorted(discover_providers()),
+                                 help='provider of the feeds '
+                                      '(default: %(default)s)')
+    backfill_parser.add_argument('--processes', type=int,
+                                 help='parser processes '
+                                      '(default: one per CPU)')
+    backfill_parser.add_argument('--batch-size', type=int, default=50000,
+                                 help='rows archived per transaction '
+                                      '(default: %(default)s)')
+    backfill_parser.set_defaults(func=backfill)
+
+    analytics_parser = commands.add_parser(
+        'analytics', help='print the accuracy and drift of the archived '
+                          'forecasts')
+    analytics_parser.add_argument('--location', type=_parse_text,
+                                  help='only this station')
+    analytics_parser.add_argument('--by-lead', action='store_true',
+                                  help='by lead time instead of by station')
+    analytics_parser.add_argument('--min-lead', type=int, default=1,
+                                  help='shortest lead time in days, by '
+                                       'station (default: %(default)s)')
+    analytics_parser.add_argument('--max-lead', type=int,
+                                  help='longest lead time in days, by '
+                                       'station (default: all)')
+    analytics_parser.add_argument('--rebuild', action='store_true',
+                                  help='rebuild the aggregates from the '
+                                       'whole archive first')
+    analytics_parser.set_defaults(func=analytics)
+
+    units = ('Celsius', 'Fahrenheit')
+
+    export_parser = commands.add_parser(
+        'export', help='export the stored forecast or the archive as CSV '
+                       '(needs NumPy)')
+    export_parser.add_argument('--archive', action='store_true',
+                               help='export the archive instead of the '
+                                    'stored forecast')
+    export_parser.add_argument('--location', type=_parse_text,
+                               help='only this station')
+    export_parser.add_argument('--start', type=_parse_date,
+                               metavar='YYYY-MM-DD',
+                               help='first date, issue date for the archive')
+    export_parser.add_argument('--end', type=_parse_date,
+                               metavar='YYYY-MM-DD',
+                               help='last date, issue date for the archive')
+    export_parser.add_argument('--unit', choices=units, default=units[0],
+                               help='temperature unit (default: '
+                                    '%(default)s)')
+    export_parser.add_argument('--chunk-size', type=int, default=10000,
+                               help='rows loaded at a time (default: '
+                                    '%(default)s)')
+    export_parser.add_argument('-o', '--output', default='-',
+                               metavar='PATH',
+                               help='where to write the CSV '
+                                    '(default: stdout)')
+    export_parser.set_defaults(func=export)
+
+    overview_parser = commands.add_parser(
+        'overview', help='print the upcoming forecast of every station '
+                         '(needs NumPy)')
+    overview_parser.add_argument('--days', type=int, default=5,
+                                 help='days shown (default: %(default)s)')
+    overview_parser.add_argument('--window', type=int, default=7,
+                                 help='final forecasts in the recent mean '
+                                      'day temperature (default: '
+                                      '%(default)s)')
+    overview_parser.add_argument('--unit', choices=units, default=units[0],
+                                 help='temperature unit (default: '
+                                      '%(default)s)')
+    overview_parser.set_defaults(func=overview)
+
+    bench_parser = commands.add_parser(
+        'bench', help='run and compare the micro-benchmarks')
+    bench_commands = bench_parser.add_subparsers(title='bench commands')
+
+    run_parser = bench_commands.add_parser(
+        'run', help='run the benchmarks and save their results as JSON')
+    run_parser.add_argument('--size', type=int, action='append',
+                            help='stations of a synthetic feed, can be '
+                                 'repeated (default: 8, 64 and 512)')
+    run_parser.add_argument('--feed-file', action='append', default=[],
+                            metavar='PATH',
+                            help='recorded feed to benchmark with too, can '
+                                 'be repeated')
+    run_parser.add_argument('--repeat', type=int, default=5,
+                            help='timed runs of every benchmark '
+                                 '(default: %(default)s)')
+    run_parser.add_argument('--filter', metavar='TEXT',
+                            help='run only the benchmarks with TEXT in their '
+                                 'name')
+    run_parser.add_argument('-o', '--output', metavar='PATH',
+                            help='where to save the results (default: '
+                                 'bench/<date>.json next to the DB)')
+    run_parser.set_defaults(func=bench_run)
+
+    compare_parser = bench_commands.add_parser(
+        'compare', help='compare two results, exit with 1 on regressions')
+    compare_parser.add_argument('baseline', help='results to compare against')
+    compare_parser.add_argument('current', help='new results')
+    compare_parser.add_argument('--threshold', type=float, default=0.1,
+                                help='slowdown flagged as a regression, as a '
+                                     'fraction (default: %(default)s)')
+    compare_parser.add_argument('--stat', default='min',
+                                choices=('min', 'median', 'max'),
+                                help='statistic to compare '
+                                     '(default: %(default)s)')
+    compare_parser.set_defaults(func=bench_compare)
+
+    return parser
+
+
+def main(argv=None):
+    """Prognos' command line main function."""
+    args = build_parser().parse_args(argv)
+
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.INFO,
+        format='%(asctime)s %(name)s %(levelname)s %(message)s')
+
+    if args.metrics:
+        metrics.enable(dirname(args.db))
+
+    try:
+        return args.func(args)
+    finally:
+        metrics.export()
@@ -0,0 +1,6 @@
+# -*- coding: utf-8 -*-
+
+# prognos.core Package __init__.py file.
+#
+# Headless forecast engine: feed client, parser, transformer, store and date
+# resolver. Nothing in this package may import Kivy or the UI modules.
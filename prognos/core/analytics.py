@@ -0,0 +1,426 @@
+# -*- coding: utf-8 -*-
+
+# analytics.py
+#
+# Copyright 2015
+# Leodanis Pozo Ramos <lpozo@openmailbox.org>
+# Ozkar L. Garcell <ozkar.garcell@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Forecast accuracy and drift analytics over the archive.
+
+For every station and target day, forecasts issued on earlier days are
+compared with the final one, issued on the target day itself, which stands
+in for the observation:
+
+    drift   mean absolute change from the previous issue's forecast
+    bias    mean of forecast - final
+    MAE     mean absolute error, |forecast - final|
+    hits    fraction of forecasts with the final weather status
+
+all by lead time, the days between issue and target. Per-forecast errors
+are computed with SQL window functions, or in Python if SQLite is older than
+3.25, and summed into aggregate tables updated on every ingest, so reports
+never rescan the archive. Weather statuses are compared by their canonical
+id in a StatusVocabulary, so synonymous phrases are hits, and forecasts with
+an unavailable status are left out.
+"""
+
+import sqlite3
+from collections import namedtuple
+from itertools import groupby
+
+from .metrics import traced
+from .statuses import STATUSES
+
+
+# SQLite supports window functions from 3.25 on
+WINDOW_FUNCTIONS = sqlite3.sqlite_version_info >= (3, 25, 0)
+
+# Bumped whenever the aggregates change meaning, so they get rebuilt
+ANALYTICS_VERSION = 2
+
+# Accuracy of the forecasts of a station, lead is None for all leads
+Accuracy = namedtuple('Accuracy',
+                      'location lead forecasts day_drift night_drift '
+                      'day_bias day_mae night_bias night_mae '
+                      'status_hit_rate')
+
+# Sums kept per station and lead, in station_accuracy
+_SUMS = ('forecasts', 'drifts', 'day_abs_drift_sum',
+         'night_abs_drift_sum', 'scored', 'day_error_sum',
+         'day_abs_error_sum', 'night_error_sum', 'night_abs_error_sum',
+         'status_hits')
+
+# Lead time in days of an archive row
+_LEAD_SQL = (u"CAST(julianday(printf('%04d-%02d-%02d', a.year, a.month, "
+             "a.day)) - julianday(a.issue_date) AS INTEGER)")
+
+_ERRORS_SQL = u"""
+    SELECT location, year, month, day, issue_date, lead,
+        CASE WHEN prev_day IS NOT NULL THEN day_temp - prev_day END,
+        CASE WHEN prev_day IS NOT NULL THEN night_temp - prev_night END,
+        CASE WHEN final_lead = 0 AND lead > 0 THEN day_temp - final_day END,
+        CASE WHEN final_lead = 0 AND lead > 0
+            THEN night_temp - final_night END,
+        CASE WHEN final_lead = 0 AND lead > 0
+            THEN status = final_status END
+    FROM (
+        SELECT a.location, a.year, a.month, a.day, a.issue_date,
+            a.day_temp, a.night_temp,
+            status_id(a.weather_status) AS status,
+            {lead} AS lead,
+            LAG(a.day_temp) OVER previous AS prev_day,
+            LAG(a.night_temp) OVER previous AS prev_night,
+            FIRST_VALUE({lead}) OVER final AS final_lead,
+            FIRST_VALUE(a.day_temp) OVER final AS final_day,
+            FIRST_VALUE(a.night_temp) OVER final AS final_night,
+            FIRST_VALUE(status_id(a.weather_status)) OVER final
+                AS final_status
+        FROM archive AS a
+        JOIN temp.analytics_targets USING (location, year, month, day)
+        WHERE status_id(a.weather_status) != ? AND {lead} >= 0
+        WINDOW previous AS (PARTITION BY a.location, a.year, a.month, a.day
+                            ORDER BY a.issue_date),
+               final AS (PARTITION BY a.location, a.year, a.month, a.day
+                         ORDER BY a.issue_date DESC));""".format(
+    lead=_LEAD_SQL)
+
+_ROWS_SQL = u"""
+    SELECT a.location, a.year, a.month, a.day, a.issue_date,
+        a.day_temp, a.night_temp, a.weather_status, {lead}
+    FROM archive AS a
+    JOIN temp.analytics_targets USING (location, year, month, day)
+    WHERE {lead} >= 0
+    ORDER BY a.location, a.year, a.month, a.day, a.issue_date;""".format(
+    lead=_LEAD_SQL)
+
+
+def _mean(total, count):
+    """Get total / count, None if count is 0."""
+    return float(total) / count if count else None
+
+
+class ForecastAnalytics(object):
+    """Accuracy and drift of the archived forecasts of a PrognosStore.
+
+    Call update() with the rows just archived, every ingest. Only the target
+    days those rows forecast are recomputed. The aggregate tables are
+    created, and built from the whole archive, on first use by update(),
+    rebuild() or the summaries, so only the workers and commands that use
+    them pay for it. final_frame() never writes to the DB.
+    """
+
+    def __init__(self, store, window_functions=WINDOW_FUNCTIONS,
+                 vocabulary=STATUSES):
+        """Initialize ForecastAnalytics objects.
+
+        :param store: PrognosStore holding the archive
+        :param window_functions: Compute errors with SQL window functions,
+        default to whether SQLite supports them
+        :param vocabulary: StatusVocabulary to compare statuses with
+        """
+        self.store = store
+        self.window_functions = window_functions
+        self.vocabulary = vocabulary
+        self.cursor_ = store.cursor_
+
+        # Canonical status id of a phrase, for the window functions SQL
+        store.connection.create_function('status_id', 1, self._status_id)
+
+        self._prepared = False
+
+    def _prepare(self):
+        """Create the aggregate tables and build them from the whole archive
+        if they are missing or outdated."""
+        if self._prepared:
+            return
+
+        self._prepared = True
+        self._create_tables()
+
+        version = self.cursor_.execute(
+            u"SELECT value FROM metadata WHERE key = 'analytics';").fetchone()
+        if version is None or version[0] != ANALYTICS_VERSION:
+            self.rebuild()
+
+    def _create_tables(self):
+        """Create the aggregate tables."""
+        self.cursor_.executescript(u"""
+            CREATE INDEX IF NOT EXISTS idx_archive_target ON archive
+                (location, year, month, day, issue_date);
+            CREATE TABLE IF NOT EXISTS forecast_errors
+                (location TEXT,
+                year INT,
+                month INT,
+                day INT,
+                issue_date TEXT,
+                lead INT,
+                day_drift INT,
+                night_drift INT,
+                day_error INT,
+                night_error INT,
+                status_hit INT,
+                PRIMARY KEY(location, year, month, day, issue_date));
+            CREATE TABLE IF NOT EXISTS station_accuracy
+                (location TEXT,
+                lead INT,
+                forecasts INT DEFAULT 0,
+                drifts INT DEFAULT 0,
+                day_abs_drift_sum INT DEFAULT 0,
+                night_abs_drift_sum INT DEFAULT 0,
+                scored INT DEFAULT 0,
+                day_error_sum INT DEFAULT 0,
+                day_abs_error_sum INT DEFAULT 0,
+                night_error_sum INT DEFAULT 0,
+                night_abs_error_sum INT DEFAULT 0,
+                status_hits INT DEFAULT 0,
+                PRIMARY KEY(location, lead));
+            CREATE TEMP TABLE IF NOT EXISTS analytics_targets
+                (location TEXT,
+                year INT,
+                month INT,
+                day INT,
+                PRIMARY KEY(location, year, month, day));""")
+
+    def _status_id(self, phrase):
+        """Get the canonical status id of a weather status phrase."""
+        return self.vocabulary.lookup(phrase).id
+
+    def _compute_errors(self):
+        """Compute the errors of the forecasts of analytics_targets.
+
+        Returns rows in the forecast_errors layout.
+        """
+        unavailable = self.vocabulary.default.id
+        if self.window_functions:
+            return self.cursor_.execute(_ERRORS_SQL,
+                                        (unavailable,)).fetchall()
+
+        rows = [row[:7] + (self._status_id(row[7]),) + row[8:]
+                for row in self.cursor_.execute(_ROWS_SQL)]
+        rows = [row for row in rows if row[7] != unavailable]
+
+        errors = []
+        for _, forecasts in groupby(rows, key=lambda row: row[:4]):
+            forecasts = list(forecasts)
+            final = forecasts[-1]
+            scored = final[8] == 0
+            previous = None
+            for row in forecasts:
+                (location, year, month, day, issue_date, day_temp,
+                 night_temp, status, lead) = row
+                errors.append((
+                    location, year, month, day, issue_date, lead,
+                    day_temp - previous[5] if previous else None,
+                    night_temp - previous[6] if previous else None,
+                    day_temp - final[5] if scored and lead > 0 else None,
+                    night_temp - final[6] if scored and lead > 0 else None,
+                    int(status == final[7]) if scored and lead > 0
+                    else None))
+                previous = row
+
+        return errors
+
+    def _add_totals(self, sign):
+        """Add the errors of analytics_targets to station_accuracy.
+
+        :param sign: 1 to add them, -1 to subtract them
+        """
+        totals = self.cursor_.execute(u"""
+            SELECT e.location, e.lead,
+                COUNT(*),
+                COUNT(e.day_drift),
+                TOTAL(ABS(e.day_drift)),
+                TOTAL(ABS(e.night_drift)),
+                COUNT(e.day_error),
+                TOTAL(e.day_error),
+                TOTAL(ABS(e.day_error)),
+                TOTAL(e.night_error),
+                TOTAL(ABS(e.night_error)),
+                TOTAL(e.status_hit)
+            FROM forecast_errors AS e
+            JOIN temp.analytics_targets USING (location, year, month, day)
+            GROUP BY e.location, e.lead;""").fetchall()
+
+        self.cursor_.executemany(u"INSERT OR IGNORE INTO station_accuracy"
+                                 "(location, lead) VALUES(?, ?);",
+                                 [row[:2] for row in totals])
+        self.cursor_.executemany(
+            u"UPDATE station_accuracy SET {s} "
+            "WHERE location = ? AND lead = ?;".format(
+                s=', '.join('{c} = {c} + ?'.format(c=column)
+                            for column in _SUMS)),
+            [tuple(sign * int(value) for value in row[2:]) + row[:2]
+             for row in totals])
+
+    def _recompute(self, targets):
+        """Recompute the errors of target days and their totals.
+
+        :param targets: (location, year, month, day) of the target days
+        """
+        self.cursor_.execute(u"DELETE FROM temp.analytics_targets;")
+        self.cursor_.executemany(u"INSERT OR IGNORE INTO "
+                                 "temp.analytics_targets VALUES(?, ?, ?, ?);",
+                                 targets)
+
+        self._add_totals(-1)
+        self.cursor_.execute(u"""
+            DELETE FROM forecast_errors WHERE EXISTS
+                (SELECT 1 FROM temp.analytics_targets AS t
+                WHERE t.location = forecast_errors.location AND
+                    t.year = forecast_errors.year AND
+                    t.month = forecast_errors.month AND
+                    t.day = forecast_errors.day);""")
+
+        self.cursor_.executemany(u"INSERT INTO forecast_errors VALUES"
+                                 "(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);",
+                                 self._compute_errors())
+        self._add_totals(1)
+
+        self.cursor_.execute(u"DELETE FROM station_accuracy "
+                             "WHERE forecasts = 0;")
+        self.cursor_.execute(u"DELETE FROM temp.analytics_targets;")
+
+    @traced('analytics.update')
+    def update(self, archive_data):
+        """Update the aggregates with newly archived rows.
+
+        :param archive_data: Rows just archived, in the layout
+        PrognosStore.archive_forecast_data expects
+        """
+        self._prepare()
+        self._recompute(set((row[4],) + tuple(row[1:4])
+                            for row in archive_data))
+
+        # Save changes
+        self.store.connection.commit()
+
+    @traced('analytics.rebuild')
+    def rebuild(self):
+        """Rebuild the aggregates from the whole archive."""
+        self._prepared = True
+        self._create_tables()
+        self.cursor_.execute(u"DELETE FROM forecast_errors;")
+        self.cursor_.execute(u"DELETE FROM station_accuracy;")
+        self._recompute(self.cursor_.execute(
+            u"SELECT DISTINCT location, year, month, day "
+            "FROM archive;").fetchall())
+
+        self.cursor_.execute(u"INSERT OR REPLACE INTO metadata(key, value) "
+                             "VALUES('analytics', ?);", (ANALYTICS_VERSION,))
+
+        # Save changes
+        self.store.connection.commit()
+
+    @staticmethod
+    def _to_accuracy(location, lead, sums):
+        """Build an Accuracy from the sums of station_accuracy."""
+        sums = dict(zip(_SUMS, sums))
+
+        return Accuracy(
+            location=location,
+            lead=lead,
+            forecasts=sums['forecasts'],
+            day_drift=_mean(sums['day_abs_drift_sum'], sums['drifts']),
+            night_drift=_mean(sums['night_abs_drift_sum'],
+                              sums['drifts']),
+            day_bias=_mean(sums['day_error_sum'], sums['scored']),
+            day_mae=_mean(sums['day_abs_error_sum'], sums['scored']),
+            night_bias=_mean(sums['night_error_sum'], sums['scored']),
+            night_mae=_mean(sums['night_abs_error_sum'], sums['scored']),
+            status_hit_rate=_mean(sums['status_hits'], sums['scored']))
+
+    @traced('analytics.station_summary')
+    def station_summary(self, min_lead=0, max_lead=None):
+        """Get the Accuracy of every station over a range of lead times.
+
+        :param min_lead: Shortest lead time included, in days
+        :param max_lead: Longest lead time included, default to all
+        """
+        self._prepare()
+        sql_cmd = (u"SELECT location, {s} FROM station_accuracy "
+                   "WHERE lead >= ? {m} "
+                   "GROUP BY location ORDER BY location;").format(
+            s=', '.join('SUM({c})'.format(c=column) for column in _SUMS),
+            m='AND lead <= ?' if max_lead is not None else '')
+        rows = self.cursor_.execute(
+            sql_cmd, (min_lead,) + ((max_lead,) if max_lead is not None
+                                    else ()))
+
+        return [self._to_accuracy(row[0], None, row[1:]) for row in rows]
+
+    @traced('analytics.lead_summary')
+    def lead_summary(self, location=None):
+        """Get the Accuracy by lead time, of a station or all of them.
+
+        :param location: Station, default to all of them
+        """
+        self._prepare()
+        sql_cmd = (u"SELECT lead, {s} FROM station_accuracy "
+                   "{w} GROUP BY lead ORDER BY lead;").format(
+            s=', '.join('SUM({c})'.format(c=column) for column in _SUMS),
+            w='WHERE location = ?' if location is not None else '')
+        rows = self.cursor_.execute(
+            sql_cmd, (location,) if location is not None else ())
+
+        return [self._to_accuracy(location, row[0], row[1:]) for row in rows]
+
+    @traced('analytics.final_frame')
+    def final_frame(self, location=None, codes=None, chunk_size=None):
+        """Load the final forecasts, the ones issued on their own day, into
+        a frame.ForecastFrame. Needs NumPy, reads the archive only.
+
+        :param location: Only this station, default to all of them
+        :param codes: frame.FrameCodes, default to new ones
+        :param chunk_size: Rows loaded at a time, default to
+        frame.DEFAULT_CHUNK_SIZE
+        """
+        # Imported here so the analytics don't need NumPy
+        from .frame import DEFAULT_CHUNK_SIZE
+        from .frame import FRAME_QUERY_COLUMNS
+        from .frame import ForecastFrame
+
+        # Read from the archive alone, the aggregates may not exist yet
+        sql_cmd = (u"SELECT {c}, issue_date FROM archive "
+                   "WHERE issue_date = printf('%04d-%02d-%02d', year, "
+                   "month, day) {w};").format(
+            c=FRAME_QUERY_COLUMNS,
+            w='AND location = ?' if location is not None else '')
+
+        return ForecastFrame.from_query(
+            self.cursor_, sql_cmd,
+            (location,) if location is not None else (),
+            codes=codes, chunk_size=chunk_size or DEFAULT_CHUNK_SIZE)
+
+    @traced('analytics.forecast_history')
+    def forecast_history(self, location, date):
+        """Get how the forecast of a station for a day changed as it
+        approached.
+
+        Returns (issue_date, lead, day_temp, night_temp, weather_status,
+        day_drift, night_drift) tuples, from the earliest issue.
+        :param location: Station
+        :param date: datetime.date of the target day
+        """
+        self._prepare()
+        return self.cursor_.execute(u"""
+            SELECT a.issue_date, e.lead, a.day_temp, a.night_temp,
+                a.weather_status, e.day_drift, e.night_drift
+            FROM forecast_errors AS e
+            JOIN archive AS a USING (location, year, month, day, issue_date)
+            WHERE e.location = ? AND e.year = ? AND e.month = ? AND
+                e.day = ?
+            ORDER BY a.issue_date;""",
+            (location, date.year, date.month, date.day)).fetchall()
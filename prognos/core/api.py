@@ -0,0 +1,299 @@
+# -*- coding: utf-8 -*-
+
+# api.py
+#
+# Copyright 2015
+# Leodanis Pozo Ramos <lpozo@openmailbox.org>
+# Ozkar L. Garcell <ozkar.garcell@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Read-only HTTP JSON API serving the stored forecast.
+
+Response bodies are serialized once per ingest and served as is, with ETags
+so unchanged data costs clients a 304 and no body. Ingests that change a few
+locations only reserialize those locations and the endpoints listing all of
+them.
+
+Endpoints:
+    /forecast/current               Today's forecast for every location
+    /forecast/extended              Upcoming forecast for every location
+    /forecast/locations             Location names
+    /forecast/locations/<location>  Current and upcoming forecast of location
+"""
+
+import datetime
+import hashlib
+import json
+import logging
+import threading
+import urllib
+from collections import OrderedDict
+from BaseHTTPServer import BaseHTTPRequestHandler
+from BaseHTTPServer import HTTPServer
+from SocketServer import ThreadingMixIn
+
+from .diff import apply_to_index
+from .diff import diff_records
+from .store import PrognosStore
+
+
+logger = logging.getLogger('prognos.api')
+
+LOCATIONS_PATH = '/forecast/locations'
+
+
+def _record_to_dict(record):
+    """Convert a forecast record into a JSON friendly dict."""
+    year, month, day, location, day_temp, night_temp, status = record
+
+    return {'location': location,
+            'date': datetime.date(year, month, day).isoformat(),
+            'day_temp': day_temp,
+            'night_temp': night_temp,
+            'weather_status': status}
+
+
+def _location_path(location):
+    """Get the path of a location endpoint, unquoted and utf-8 encoded."""
+    if isinstance(location, unicode):
+        location = location.encode('utf-8')
+
+    return '{p}/{l}'.format(p=LOCATIONS_PATH, l=location)
+
+
+class ForecastResponses(object):
+    """Pre-serialized responses of every endpoint.
+
+    rebuild() and apply() swap in a whole new set of responses at once, so
+    request threads always see a consistent one without locking.
+    """
+
+    def __init__(self):
+        # Path -> (body, etag)
+        self.responses = {}
+        self.built_on = None
+
+        # Station index the responses are built from, see diff.apply_to_index.
+        # Never mutated once swapped in, so readers can use it unlocked
+        self.index = {}
+
+        # Location -> upcoming forecasts, as dicts
+        self._upcoming = {}
+
+        # Serializes writers, e.g. an ingest and a StoreWatcher
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _serialize(data):
+        """Serialize data and compute its ETag."""
+        body = json.dumps(data, ensure_ascii=False,
+                          separators=(',', ':')).encode('utf-8')
+
+        return body, '"{d}"'.format(d=hashlib.sha1(body).hexdigest()[:16])
+
+    @property
+    def records(self):
+        """Get the records the responses are built from."""
+        index = self.index
+
+        return [record for dates in index.itervalues()
+                for record in dates.itervalues()]
+
+    def rebuild(self, records, today=None):
+        """Regenerate every response from records.
+
+        :param records: Forecast records in the store layout
+        :param today: datetime.date for today, default to today
+        """
+        index = {}
+        for record in sorted(records):
+            index.setdefault(record[3], OrderedDict())[record[:3]] = record
+
+        with self._lock:
+            self.index = index
+            self._build(today)
+
+    def apply(self, changeset, today=None):
+        """Regenerate the responses a changeset affects.
+
+        Every response is regenerated if the day changed since the last
+        build.
+        :param changeset: diff.Changeset of the stored records
+        :param today: datetime.date for today, default to today
+        """
+        with self._lock:
+            # apply_to_index replaces the dates of every location it
+            # touches, so a shallow copy leaves the current index untouched
+            index = dict(self.index)
+            apply_to_index(index, changeset)
+            self.index = index
+            self._build(today, changeset.locations)
+
+    def _build(self, today=None, locations=None):
+        """Regenerate the responses of locations and the ones listing every
+        location.
+
+        :param today: datetime.date for today, default to today
+        :param locations: Locations to regenerate, default to all of them
+        """
+        if today is None:
+            today = datetime.date.today()
+        key = (today.year, today.month, today.day)
+
+        if locations is None or today != self.built_on:
+            locations = self.index.keys()
+            responses = {}
+            self._upcoming = {}
+        else:
+            responses = dict(self.responses)
+
+        for location in locations:
+            forecasts = [_record_to_dict(record) for date, record in
+                         self.index.get(location, {}).iteritems()
+                         if date >= key]
+            if not forecasts:
+                self._upcoming.pop(location, None)
+                responses.pop(_location_path(location), None)
+                continue
+
+            self._upcoming[location] = forecasts
+            responses[_location_path(location)] = self._serialize(
+                {'location': location,
+                 'current': forecasts[0] if forecasts[0]['date'] ==
+                 today.isoformat() else None,
+                 'upcoming': forecasts})
+
+        upcoming = self._upcoming
+        current = [upcoming[location][0] for location in sorted(upcoming)
+                   if upcoming[location][0]['date'] == today.isoformat()]
+
+        responses.update({
+            '/forecast/current': self._serialize(
+                {'date': today.isoformat(), 'forecasts': current}),
+            '/forecast/extended': self._serialize(
+                {'date': today.isoformat(), 'locations': upcoming}),
+            LOCATIONS_PATH: self._serialize(sorted(upcoming))})
+
+        self.responses = responses
+        self.built_on = today
+
+    def get(self, path):
+        """Get (body, etag) for a request path, or None if unknown.
+
+        :param path: Request path, query strings are ignored
+        """
+        path = urllib.unquote(path.split('?', 1)[0]).rstrip('/')
+
+        return self.responses.get(path)
+
+
+class ForecastRequestHandler(BaseHTTPRequestHandler):
+    """Serve the responses of server.responses."""
+
+    # Keep connections alive between requests
+    protocol_version = 'HTTP/1.1'
+
+    def _send(self, status, body=None, etag=None):
+        """Send a JSON response."""
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body or '')))
+        self.send_header('Cache-Control', 'no-cache')
+        if etag:
+            self.send_header('ETag', etag)
+        self.end_headers()
+
+        if body and self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def do_GET(self):
+        """Serve a pre-serialized response."""
+        response = self.server.responses.get(self.path)
+        if response is None:
+            self._send(404, body='{"error":"not found"}')
+            return
+
+        body, etag = response
+        if self.headers.get('If-None-Match') == etag:
+            self._send(304, etag=etag)
+        else:
+            self._send(200, body=body, etag=etag)
+
+    do_HEAD = do_GET
+
+    def log_message(self, format_, *args):
+        """Log requests at debug level only."""
+        logger.debug('%s %s', self.address_string(), format_ % args)
+
+
+class ForecastServer(ThreadingMixIn, HTTPServer):
+    """Threaded HTTP server for the forecast API."""
+
+    daemon_threads = True
+
+    def __init__(self, address, responses):
+        """Initialize ForecastServer objects.
+
+        :param address: (host, port) to listen on
+        :param responses: ForecastResponses to serve
+        """
+        HTTPServer.__init__(self, address, ForecastRequestHandler)
+        self.responses = responses
+
+
+class StoreWatcher(threading.Thread):
+    """Update responses whenever the store gets new data.
+
+    Polls the store's generation, so it picks up ingests made by other
+    processes, e.g. the daemon, and applies only what changed. Also rebuilds
+    when the day changes.
+    """
+
+    def __init__(self, database_path, responses, interval=5.0):
+        """Initialize StoreWatcher objects.
+
+        :param database_path: Path to prognos.db
+        :param responses: ForecastResponses to rebuild
+        :param interval: Seconds between polls
+        """
+        super(StoreWatcher, self).__init__(name='prognos-store-watcher')
+        self.daemon = True
+        self.database_path = database_path
+        self.responses = responses
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def run(self):
+        """Poll the store until stop() is called."""
+        # SQLite connections can't be shared between threads
+        store = PrognosStore(database_path=self.database_path)
+        last_generation = None
+        try:
+            while not self._stop_event.is_set():
+                generation = store.generation
+                if (generation != last_generation or
+                        self.responses.built_on != datetime.date.today()):
+                    changeset = diff_records(self.responses.records,
+                                             store.get_forecast_data())
+                    self.responses.apply(changeset)
+                    last_generation = generation
+                    logger.info('Responses updated, %r', changeset)
+
+                self._stop_event.wait(self.interval)
+        finally:
+            store.close_connection()
+
+    def stop(self):
+        """Stop watching the store."""
+        self._stop_event.set()
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+
+# backfill.py
+#
+# Copyright 2015
+# Leodanis Pozo Ramos <lpozo@openmailbox.org>
+# Ozkar L. Garcell <ozkar.garcell@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Historical backfill of the forecast archive from saved feed files.
+
+Feed files are parsed in a process pool, one file per task. Each file's
+issue date is read from its own pubDate, or its modification time if it has
+none. A single writer, the calling process, archives the records in large
+batches. Files are only recorded as archived once their records and the
+analytics built on them are, so an interrupted backfill resumes where it
+stopped.
+"""
+
+import datetime
+import fnmatch
+import gzip
+import logging
+import multiprocessing
+import os
+import time
+from collections import namedtuple
+from os.path import abspath
+from os.path import getmtime
+from os.path import join
+
+from .analytics import ForecastAnalytics
+from .parser import ParseError
+from .providers.base import DEFAULT_PROVIDER
+from .providers.base import load_providers
+
+
+logger = logging.getLogger('prognos.backfill')
+
+# Names of the feed files looked for, gzipped ones included
+FEED_PATTERNS = ('*.xml', '*.rss', '*.xml.gz', '*.rss.gz')
+
+# Outcome of a backfill
+BackfillReport = namedtuple('BackfillReport',
+                            'files skipped failed rows seconds')
+
+# Provider of the worker processes, see _init_worker
+_provider = None
+
+
+def find_feed_files(directory, patterns=FEED_PATTERNS):
+    """Get the sorted absolute paths of the feed files under directory.
+
+    :param directory: Directory to scan, recursively
+    :param patterns: fnmatch patterns of the feed file names
+    """
+    paths = []
+    for root, _, names in os.walk(directory):
+        for name in names:
+            if any(fnmatch.fnmatch(name, pattern) for pattern in patterns):
+                paths.append(abspath(join(root, name)))
+
+    return sorted(paths)
+
+
+def _init_worker(provider_name):
+    """Build the provider of a worker process."""
+    global _provider
+    _provider = load_providers([provider_name])[0]
+
+
+def parse_snapshot(path):
+    """Parse a feed file into archive rows. Runs in the worker processes.
+
+    Returns (path, issue_date, rows, error): the ISO issue date and rows in
+    the layout PrognosStore.archive_forecast_data expects, or the repr of
+    the error if the file couldn't be read or parsed.
+    :param path: Path to the feed file
+    """
+    try:
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'rb') as feed_file:
+            content = feed_file.read()
+
+        parser = _provider.parser()
+        parser.feed(content)
+        parsed = parser.close()
+    except (IOError, ParseError) as error:
+        return path, None, [], repr(error)
+
+    issue_date = (parsed.issue_date or
+                  datetime.date.fromtimestamp(getmtime(path)))
+    iso_date = issue_date.isoformat()
+
+    return path, iso_date, [
+        (iso_date,) + record + (_provider.name,)
+        for record in _provider.to_records(parsed.forecast, issue_date)], None
+
+
+def backfill(store, directory, provider_name=DEFAULT_PROVIDER,
+             processes=None, batch_size=50000, report=None):
+    """Archive every feed file under directory not archived yet, updating
+    the analytics along.
+
+    Returns a BackfillReport.
+    :param store: PrognosStore holding the archive
+    :param directory: Directory with the feed files
+    :param provider_name: Name of the provider of the feeds
+    :param processes: Number of worker processes, default to the CPU count
+    :param batch_size: Rows archived per transaction
+    :param report: Called as report(files_done, files_total, rows, seconds)
+    after every file
+    """
+    analytics = ForecastAnalytics(store)
+    archived = store.get_archived_files()
+    all_paths = find_feed_files(directory)
+    paths = [path for path in all_paths if path not in archived]
+
+    started = time.time()
+    done = failed = rows_archived = 0
+    rows = []
+    files = []
+
+    def flush():
+        """Archive the pending rows, update the analytics, then record
+        their files as archived.
+
+        Archiving and the analytics are idempotent, so a backfill stopped
+        before the files are recorded just redoes them on resume.
+        """
+        store.archive_forecast_data(rows)
+        analytics.update(rows)
+        store.archive_forecast_data([], files)
+        del rows[:]
+        del files[:]
+
+    pool = multiprocessing.Pool(processes, initializer=_init_worker,
+                                initargs=(provider_name,))
+    try:
+        for path, issue_date, file_rows, error in pool.imap_unordered(
+                parse_snapshot, paths, chunksize=1):
+            done += 1
+            if error is not None:
+                # Not recorded as archived, the next backfill retries it
+                failed += 1
+                logger.warning('Could not archive %s: %s', path, error)
+            else:
+                rows.extend(file_rows)
+                files.append((path, issue_date, len(file_rows)))
+                rows_archived += len(file_rows)
+                if len(rows) >= batch_size:
+                    flush()
+
+            if report is not None:
+                report(done, len(paths), rows_archived,
+                       time.time() - started)
+
+        flush()
+        pool.close()
+    except BaseException:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+    return BackfillReport(files=done - failed,
+                          skipped=len(all_paths) - len(paths),
+                          failed=failed,
+                          rows=rows_archived,
+                          seconds=time.time() - started)
@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+
+# catalog.py
+#
+# Copyright 2015
+# Leodanis Pozo Ramos <lpozo@openmailbox.org>
+# Ozkar L. Garcell <ozkar.garcell@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module containing the StationCatalog class.
+
+Feed items are matched to stations by their title through a hash index of
+normalized keys, so extra, missing or reordered items don't shift the data
+of other stations, and matching an item is a dict lookup however many
+stations there are. GUIDs are only used for items without a title: the feed
+numbers them by position, so they are remembered in memory from the latest
+titled items and never persisted. Titles with no exact match are matched to the
+closest known station name before a new station is registered, so a typo
+or a mangled accent doesn't split a station in two.
+"""
+
+import difflib
+import logging
+import re
+import threading
+from collections import OrderedDict
+
+from .text import normalize_key
+
+
+logger = logging.getLogger('prognos.catalog')
+
+
+class StationCatalog(object):
+    """Stations of a provider, indexed by the keys of their titles.
+
+    Items of unknown stations register them, and they are kept in
+    new_stations until the store persists them. Safe to use from any
+    thread.
+    """
+
+    def __init__(self, stations=(), cutoff=0.8, guids_size=1024):
+        """Initialize StationCatalog objects.
+
+        :param stations: Names of the known stations, in display order
+        :param cutoff: Minimum similarity, 0 to 1, of a fuzzy match
+        :param guids_size: Maximum number of GUIDs remembered
+        """
+        self.cutoff = cutoff
+        self.guids_size = guids_size
+        self._lock = threading.Lock()
+
+        # Station key -> station name
+        self._index = {}
+
+        # GUID key -> name of the station of the latest item with it, least
+        # recently seen first
+        self._guids = OrderedDict()
+
+        # Station names in registration order
+        self._names = OrderedDict()
+
+        # (key, name) pairs registered since the last drain_new()
+        self.new_stations = []
+
+        # Seed stations are taken as they are, not matched to each other
+        with self._lock:
+            for name in stations:
+                name = unicode(name).strip()
+                self._add(normalize_key(name), name)
+
+        # Seed stations are not new
+        self.new_stations = []
+
+    def __len__(self):
+        return len(self._names)
+
+    def __contains__(self, name):
+        return name in self._names
+
+    @property
+    def names(self):
+        """Get the station names in registration order."""
+        return self._names.keys()
+
+    def _add(self, key, name):
+        """Index key under name. Must hold the lock."""
+        if key and key not in self._index:
+            self._index[key] = name
+            self._names[name] = None
+            self.new_stations.append((key, name))
+
+    def _match(self, key):
+        """Get the name of the known station closest to key, None if none
+        is close enough. Names with other numbers never match, so e.g.
+        "Estación 10" is not taken for "Estación 11". Must hold the lock.
+        """
+        digits = re.findall(r'\d+', key)
+        candidates = {}
+        for name in self._names:
+            candidate = normalize_key(name)
+            if re.findall(r'\d+', candidate) == digits:
+                candidates[candidate] = name
+
+        matches = difflib.get_close_matches(key, candidates, n=1,
+                                            cutoff=self.cutoff)
+        return candidates[matches[0]] if matches else None
+
+    def _remember_guid(self, guid, name):
+        """Remember the station of the latest item with guid. Must hold the
+        lock."""
+        key = normalize_key(guid)
+        if not key:
+            return
+
+        self._guids.pop(key, None)
+        self._guids[key] = name
+        if len(self._guids) > self.guids_size:
+            self._guids.popitem(last=False)
+
+    def register(self, name, guid=None):
+        """Register a station, if its name isn't known yet.
+
+        A name close to a known station's is indexed as a variant of it.
+        Returns the name of the station.
+        :param name: Station name, e.g. the item title
+        :param guid: GUID of the item, remembered for items without a title
+        """
+        key = normalize_key(name)
+        with self._lock:
+            known = self._index.get(key)
+            if known is None and key:
+                known = self._match(key)
+                if known is not None:
+                    logger.info(u'Station %r matched to %r', name, known)
+                else:
+                    logger.info(u'New station registered: %r', name)
+
+            name = known if known is not None else unicode(name).strip()
+            self._add(key, name)
+            if guid:
+                self._remember_guid(guid, name)
+
+        return name
+
+    def load(self, stations):
+        """Index stations persisted by the store.
+
+        :param stations: (key, name) pairs, as PrognosStore.get_stations
+        returns
+        """
+        with self._lock:
+            for key, name in stations:
+                self._index.setdefault(key, name)
+                self._names[name] = None
+
+    def identify(self, title=None, guid=None):
+        """Get the name of the station of an item, None if unknown.
+
+        Items are identified by title, by GUID only if they have no title.
+        :param title: Title of the item
+        :param guid: GUID of the item
+        """
+        if title and title.strip():
+            return self._index.get(normalize_key(title))
+
+        if guid:
+            with self._lock:
+                return self._guids.get(normalize_key(guid))
+
+        return None
+
+    def resolve(self, title=None, guid=None):
+        """Get the name of the station of an item, registering the station
+        if it is unknown.
+
+        Returns None for items with neither title nor GUID.
+        :param title: Title of the item
+        :param guid: GUID of the item
+        """
+        if not (title and title.strip()):
+            return self.identify(guid=guid)
+
+        name = self.identify(title)
+        if name is None:
+            return self.register(title, guid)
+
+        if guid:
+            with self._lock:
+                self._remember_guid(guid, name)
+
+        return name
+
+    def drain_new(self):
+        """Get and forget the (key, name) pairs registered since the last
+        call."""
+        with self._lock:
+            new_stations, self.new_stations = self.new_stations, []
+
+        return new_stations
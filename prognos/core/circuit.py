@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+
+# circuit.py
+#
+# Copyright 2015
+# Leodanis Pozo Ramos <lpozo@openmailbox.org>
+# Ozkar L. Garcell <ozkar.garcell@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module containing the CircuitBreaker class."""
+
+import threading
+import time
+
+
+class CircuitBreaker(object):
+    """Stop calling a failing upstream for a cooldown period.
+
+    After failure_threshold consecutive failures the circuit opens and
+    allow() returns False for cooldown seconds. Then it is half open: calls
+    are allowed again, a success closes it and a failure opens it again.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, failure_threshold=3, cooldown=300):
+        """Initialize CircuitBreaker objects.
+
+        :param failure_threshold: Consecutive failures that open the circuit
+        :param cooldown: Seconds the circuit stays open
+        """
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        """Get the state of the circuit: CLOSED, OPEN or HALF_OPEN."""
+        if self.opened_at is None:
+            return self.CLOSED
+
+        if time.time() - self.opened_at < self.cooldown:
+            return self.OPEN
+
+        return self.HALF_OPEN
+
+    def allow(self):
+        """Check if a call may go through."""
+        return self.state != self.OPEN
+
+    def record_success(self):
+        """Record a successful call, closing the circuit."""
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        """Record a failed call, opening the circuit if needed."""
+        with self._lock:
+            self.failures += 1
+            if (self.state == self.HALF_OPEN or
+                    self.failures >= self.failure_threshold):
+                self.opened_at = time.time()
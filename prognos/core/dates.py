@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+
+# dates.py
+#
+# Copyright 2015
+# Leodanis Pozo Ramos <lpozo@openmailbox.org>
+# Ozkar L. Garcell <ozkar.garcell@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Date resolver: turn the day numbers of the Met feed into full dates."""
+
+import datetime
+from email.utils import parsedate
+
+
+# A first day this far behind the issue day belongs to the next month
+ROLLOVER_DAYS = 15
+
+
+def _next_month(year, month):
+    """Get (year, month) of the month after the given one."""
+    return (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+def next_valid_date(year, month, day):
+    """Get the date for (year, month, day), or the first day of the next
+    month if day is past the end of month.
+
+    :param year: Year as an int
+    :param month: Month as an int
+    :param day: Day as an int
+    """
+    try:
+        return datetime.date(year, month, day)
+    except ValueError:
+        year, month = _next_month(year, month)
+        return datetime.date(year, month, 1)
+
+
+def parse_feed_date(text):
+    """Parse an RSS (RFC 822) date, e.g. 'Mon, 04 Jan 2016 08:00:00 -0500'.
+
+    Returns a datetime.date, or None if text isn't a valid date.
+    :param text: Date as found in pubDate or lastBuildDate
+    """
+    parsed = parsedate(text) if text else None
+    if parsed is None:
+        return None
+
+    try:
+        return datetime.date(*parsed[:3])
+    except ValueError:
+        return None
+
+
+def _is_day(day):
+    """Tell if day can be a day of month, empty or malformed cells being
+    None or 0."""
+    return day is not None and 1 <= day <= 31
+
+
+def resolve_dates(days, issue_date=None):
+    """Resolve a sequence of consecutive forecast days into dates.
+
+    The feed only gives the day of the month. Days are taken to start in
+    the month of issue_date and to move to the next month (and year) every
+    time a day is lower than the previous valid one. Invalid days (None, 0
+    or over 31, as empty or malformed cells give) and days that do not exist
+    in their month resolve to None, and don't move the month.
+    :param days: List of ints, the days of month in forecast order
+    :param issue_date: datetime.date the feed was issued, default to today
+    """
+    if issue_date is None:
+        issue_date = datetime.date.today()
+
+    year, month = issue_date.year, issue_date.month
+    first = next((day for day in days if _is_day(day)), None)
+    if first is not None and first < issue_date.day - ROLLOVER_DAYS:
+        year, month = _next_month(year, month)
+
+    dates = []
+    previous = None
+    for day in days:
+        if not _is_day(day):
+            dates.append(None)
+            continue
+
+        if previous is not None and day < previous:
+            year, month = _next_month(year, month)
+        previous = day
+
+        try:
+            dates.append(datetime.date(year, month, day))
+        except ValueError:
+            dates.append(None)
+
+    return dates
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+
+# diff.py
+#
+# Copyright 2015
+# Leodanis Pozo Ramos <lpozo@openmailbox.org>
+# Ozkar L. Garcell <ozkar.garcell@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Diff engine: what changed between two generations of stored records.
+
+Records are keyed by (year, month, day, location) and compared in a single
+pass over dicts, so storage, caches and UIs can apply only what changed
+instead of rewriting and rebuilding everything on every ingest.
+"""
+
+from collections import OrderedDict
+
+
+def record_key(record):
+    """Get the key of a forecast record: (year, month, day, location)."""
+    return record[:4]
+
+
+class Changeset(object):
+    """Records added, changed and removed between two generations.
+
+    added, changed and removed are dicts of location -> list of records.
+    Added and changed records are the new ones, removed records the old
+    ones.
+    """
+
+    def __init__(self):
+        self.added = {}
+        self.changed = {}
+        self.removed = {}
+
+    def __len__(self):
+        return sum(len(records) for kind in (self.added, self.changed,
+                                             self.removed)
+                   for records in kind.itervalues())
+
+    def __nonzero__(self):
+        return bool(self.added or self.changed or self.removed)
+
+    def __repr__(self):
+        return '<Changeset added={a} changed={c} removed={r}>'.format(
+            a=sum(len(records) for records in self.added.itervalues()),
+            c=sum(len(records) for records in self.changed.itervalues()),
+            r=sum(len(records) for records in self.removed.itervalues()))
+
+    @property
+    def locations(self):
+        """Get the set of locations with any change."""
+        return set(self.added) | set(self.changed) | set(self.removed)
+
+    @property
+    def upserts(self):
+        """Get the added and changed records."""
+        return [record for kind in (self.added, self.changed)
+                for records in kind.itervalues() for record in records]
+
+    @property
+    def removals(self):
+        """Get the removed records."""
+        return [record for records in self.removed.itervalues()
+                for record in records]
+
+
+def diff_records(previous, current, previous_sources=None, sources=None):
+    """Compare two generations of records.
+
+    Returns a Changeset. A record is changed if any of its values or the
+    source of its location differ.
+    :param previous: Records of the previous generation, or a dict of
+    record_key -> record
+    :param current: Records of the new generation
+    :param previous_sources: dict of location -> source of previous
+    :param sources: dict of location -> source of current
+    """
+    previous_sources = previous_sources or {}
+    sources = sources or {}
+
+    if isinstance(previous, dict):
+        remaining = dict(previous)
+    else:
+        remaining = dict((record_key(record), record) for record in previous)
+
+    changeset = Changeset()
+    for record in current:
+        location = record[3]
+        old = remaining.pop(record_key(record), None)
+        if old is None:
+            changeset.added.setdefault(location, []).append(record)
+        elif (old != record or
+              previous_sources.get(location) != sources.get(location)):
+            changeset.changed.setdefault(location, []).append(record)
+
+    for record in remaining.itervalues():
+        changeset.removed.setdefault(record[3], []).append(record)
+
+    return changeset
+
+
+def apply_to_records(records, changeset):
+    """Apply changeset to a dict of record_key -> record, in place.
+
+    :param records: dict of record_key -> record
+    :param changeset: Changeset to apply
+    """
+    for record in changeset.removals:
+        records.pop(record_key(record), None)
+    for record in changeset.upserts:
+        records[record_key(record)] = record
+
+
+def apply_to_index(index, changeset):
+    """Apply changeset to a station index, in place.
+
+    A station index maps each location to an OrderedDict of (year, month,
+    day) -> record, sorted by date. Only the locations in changeset are
+    touched, locations left without records are dropped.
+    :param index: Station index to update
+    :param changeset: Changeset to apply
+    """
+    for location in changeset.locations:
+        dates = dict(index.get(location, ()))
+        for record in changeset.removed.get(location, ()):
+            dates.pop(record[:3], None)
+        for kind in (changeset.added, changeset.changed):
+            for record in kind.get(location, ()):
+                dates[record[:3]] = record
+
+        if dates:
+            index[location] = OrderedDict(sorted(dates.iteritems()))
+        else:
+            index.pop(location, None)
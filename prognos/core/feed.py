@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+
+# feed.py
+#
+# Copyright 2015
+# Leodanis Pozo Ramos <lpozo@openmailbox.org>
+# Ozkar L. Garcell <ozkar.garcell@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Feed client: download the Met RSS feed.
+
+Downloads have connect and read timeouts and are retried with exponential
+backoff and jitter. A circuit breaker stops hitting a failing upstream for a
+while; callers keep serving the data they already have meanwhile.
+
+Downloads ask for gzip or deflate and are decompressed chunk by chunk
+straight into a consumer, e.g. the incremental FeedParser, so the body is
+never buffered whole.
+"""
+
+import httplib
+import random
+import socket
+import time
+import urllib2
+import zlib
+from collections import deque
+from collections import namedtuple
+
+from .circuit import CircuitBreaker
+from .metrics import metrics
+
+
+# Weather URL for Cuba
+FEED_URL = u'http://www.met.inf.cu/asp/genesis.asp?TB0=RSSFEED'
+
+# HTTP statuses worth retrying
+RETRY_STATUSES = frozenset([408, 429, 500, 502, 503, 504])
+
+# Errors of a failed download: connection, HTTP protocol (e.g. a dropped
+# connection's BadStatusLine), socket and decompression errors
+TRANSPORT_ERRORS = (urllib2.URLError, httplib.HTTPException, socket.error,
+                    IOError, zlib.error)
+
+# Size of the chunks read from the network
+CHUNK_SIZE = 16 * 1024
+
+# Outcome of a download attempt, with its bytes on the wire and decompressed.
+# error is the repr of the error, the error itself would keep its response
+# and traceback alive
+FetchAttempt = namedtuple('FetchAttempt',
+                          'url attempt started latency outcome error '
+                          'wire_bytes body_bytes')
+
+
+class FeedError(Exception):
+    """The feed could not be downloaded."""
+
+
+class CircuitOpenError(FeedError):
+    """The feed is not downloaded because its circuit is open."""
+
+
+class ProxyAuthError(FeedError):
+    """The proxy rejected the credentials."""
+
+
+class _Buffer(object):
+    """Consumer collecting the whole body."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def feed(self, chunk):
+        self.chunks.append(chunk)
+
+    def close(self):
+        return ''.join(self.chunks)
+
+
+class _Decoder(object):
+    """Streaming decoder for a Content-Encoding."""
+
+    def __init__(self, encoding):
+        """Initialize _Decoder objects.
+
+        :param encoding: Content-Encoding of the response
+        """
+        encoding = (encoding or '').strip().lower()
+        if encoding in ('gzip', 'x-gzip'):
+            self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif encoding == 'deflate':
+            self._decompressor = zlib.decompressobj()
+        else:
+            self._decompressor = None
+
+        self._raw_fallback = encoding == 'deflate'
+
+    def decode(self, chunk):
+        """Decode a chunk of the body."""
+        if self._decompressor is None:
+            return chunk
+
+        try:
+            data = self._decompressor.decompress(chunk)
+        except zlib.error:
+            # Some servers send raw deflate instead of zlib data
+            if not self._raw_fallback:
+                raise
+            self._decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+            data = self._decompressor.decompress(chunk)
+        self._raw_fallback = False
+
+        return data
+
+    def flush(self):
+        """Get the rest of the decoded body."""
+        if self._decompressor is None:
+            return ''
+
+        return self._decompressor.flush()
+
+
+def _is_retryable(error):
+    """Check if a failed download is worth retrying."""
+    if isinstance(error, urllib2.HTTPError):
+        return error.code in RETRY_STATUSES
+
+    return True
+
+
+class FeedClient(object):
+    """Client for the Met RSS feed."""
+
+    def __init__(self, url=FEED_URL, connect_timeout=10, read_timeout=30,
+                 max_retries=3, backoff=1.0, max_backoff=30, breaker=None):
+        """Initialize FeedClient objects.
+
+        :param url: URL of the feed
+        :param connect_timeout: Seconds to wait for the connection, and for
+        every socket read
+        :param read_timeout: Seconds to wait for the whole body
+        :param max_retries: Retries after a failed attempt
+        :param backoff: Base seconds to wait before the first retry
+        :param max_backoff: Maximum seconds to wait before a retry
+        :param breaker: CircuitBreaker for the feed, a new one by default
+        """
+        self.url = url
+        self.opener = urllib2.build_opener()
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.breaker = breaker if breaker is not None else CircuitBreaker()
+
+        # Recent FetchAttempts, for instrumentation
+        self.attempts = deque(maxlen=100)
+
+    def set_proxy_session(self, session):
+        """Download through an authenticating HTTP proxy.
+
+        :param session: ProxySession holding credentials
+        """
+        self.opener = session.opener
+
+    def clear_proxy(self):
+        """Download directly, without a proxy."""
+        self.opener = urllib2.build_opener()
+
+    def _backoff_delay(self, attempt):
+        """Get the seconds to wait before retrying attempt, with full
+        jitter."""
+        return random.uniform(0, min(self.max_backoff,
+                                     self.backoff * 2 ** attempt))
+
+    def _record_attempt(self, attempt, started, outcome, error=None,
+                        wire_bytes=0, body_bytes=0):
+        """Record the outcome, latency and sizes of a download attempt."""
+        self.attempts.append(FetchAttempt(url=self.url,
+                                          attempt=attempt,
+                                          started=started,
+                                          latency=time.time() - started,
+                                          outcome=outcome,
+                                          error=(repr(error) if error
+                                                 is not None else None),
+                                          wire_bytes=wire_bytes,
+                                          body_bytes=body_bytes))
+
+    def _download(self, consumer):
+        """Download the feed once, within the timeouts, into consumer.
+
+        Returns (wire_bytes, body_bytes).
+        :param consumer: Object whose feed() gets the decompressed chunks
+        """
+        started = time.time()
+        request = urllib2.Request(self.url,
+                                  headers={'Accept-Encoding': 'gzip, deflate'})
+        response = self.opener.open(request, timeout=self.connect_timeout)
+        try:
+            decoder = _Decoder(response.info().get('Content-Encoding'))
+            wire_bytes = body_bytes = 0
+
+            chunk = response.read(CHUNK_SIZE)
+            while chunk:
+                wire_bytes += len(chunk)
+                data = decoder.decode(chunk)
+                body_bytes += len(data)
+                consumer.feed(data)
+
+                if time.time() - started > self.read_timeout:
+                    raise socket.timeout('Feed download timed out')
+                chunk = response.read(CHUNK_SIZE)
+
+            data = decoder.flush()
+            body_bytes += len(data)
+            consumer.feed(data)
+        finally:
+            response.close()
+
+        return wire_bytes, body_bytes
+
+    def fetch(self, consumer_factory=_Buffer):
+        """Download the feed.
+
+        Every attempt streams the body into a new consumer made by
+        consumer_factory, and the result of the successful consumer's close()
+        is returned: the whole content by default. Raises CircuitOpenError
+        without connecting while the circuit is open, and FeedError once every
+        attempt has failed. Consumer errors are raised as is.
+        :param consumer_factory: Callable returning an object with feed(chunk)
+        and close() methods, e.g. FeedParser
+        """
+        if not self.breaker.allow():
+            raise CircuitOpenError(u'Too many failures, retrying later')
+
+        attempt = 0
+        while True:
+            started = time.time()
+            consumer = consumer_factory()
+            try:
+                with metrics.span('feed.download'):
+                    wire_bytes, body_bytes = self._download(consumer)
+            except TRANSPORT_ERRORS as error:
+                self._record_attempt(attempt, started, 'error', error)
+                metrics.incr('feed.errors')
+                if attempt >= self.max_retries or not _is_retryable(error):
+                    break
+            else:
+                self._record_attempt(attempt, started, 'ok',
+                                     wire_bytes=wire_bytes,
+                                     body_bytes=body_bytes)
+                metrics.incr('feed.wire_bytes', wire_bytes)
+                metrics.incr('feed.body_bytes', body_bytes)
+                self.breaker.record_success()
+                return consumer.close()
+
+            time.sleep(self._backoff_delay(attempt))
+            attempt += 1
+
+        if isinstance(error, urllib2.HTTPError) and error.code == 407:
+            # Not the upstream's fault, leave the circuit alone
+            raise ProxyAuthError(error)
+
+        self.breaker.record_failure()
+        raise FeedError(error)
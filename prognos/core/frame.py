@@ -0,0 +1,501 @@
+# -*- coding: utf-8 -*-
+
+# frame.py
+#
+# Copyright 2015
+# Leodanis Pozo Ramos <lpozo@openmailbox.org>
+# Ozkar L. Garcell <ozkar.garcell@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Columnar forecast data backed by NumPy structured arrays.
+
+A ForecastFrame holds one row per forecast, with the station and weather
+status as small integer ids and the dates as ordinals, so filtering, unit
+conversion, grouping and rolling statistics run over whole columns instead
+of Python tuples. Query results are loaded in fixed-size chunks, so large
+archives can be streamed or loaded without holding their rows as tuples.
+
+NumPy is optional, it is only imported when a frame is built.
+"""
+
+import csv
+import datetime
+from collections import OrderedDict
+
+from .statuses import STATUSES
+
+
+# Rows fetched and converted at a time
+DEFAULT_CHUNK_SIZE = 10000
+
+# Columns of a frame. Temperatures are Celsius unless converted, NaN when
+# missing. issue is the ordinal of the issue date, 0 if unknown
+FRAME_DTYPE = [('station', 'i4'),
+               ('date', 'i4'),
+               ('issue', 'i4'),
+               ('day_temp', 'f4'),
+               ('night_temp', 'f4'),
+               ('status', 'i2')]
+
+# Columns of the rows a frame loads, issue_date being optional
+FRAME_QUERY_COLUMNS = (u"year, month, day, location, day_temp, night_temp, "
+                       "weather_status")
+
+# Statistics of rolling()
+ROLLING_DTYPE = [('count', 'i4'), ('mean', 'f8'), ('std', 'f8')]
+
+
+def _import_numpy():
+    """Import NumPy, with a helpful message if it isn't installed."""
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError('ForecastFrame needs NumPy, install it with '
+                          '"pip install numpy"')
+
+    return numpy
+
+
+class FrameCodes(object):
+    """Ids of the stations and weather statuses of frames.
+
+    Frames loaded chunk by chunk share their FrameCodes, so ids mean the
+    same in all of them. Status ids are the positions of the canonical
+    status ids of a StatusVocabulary, so any phrase for the same weather
+    gets the same id.
+    """
+
+    def __init__(self, vocabulary=STATUSES):
+        """Initialize FrameCodes objects.
+
+        :param vocabulary: StatusVocabulary to resolve statuses with
+        """
+        self.vocabulary = vocabulary
+        self.stations = []
+        self.statuses = list(vocabulary.icons)
+        self.unavailable = self.statuses.index(vocabulary.default.id)
+
+        self._station_ids = {}
+        self._status_ids = dict((status, number) for number, status in
+                                enumerate(self.statuses))
+
+    def station_id(self, name):
+        """Get the id of a station, assigning a new one if needed."""
+        station_id = self._station_ids.get(name)
+        if station_id is None:
+            station_id = self._station_ids[name] = len(self.stations)
+            self.stations.append(name)
+
+        return station_id
+
+    def find_station(self, name):
+        """Get the id of a station, None if no frame has it."""
+        return self._station_ids.get(name)
+
+    def status_id(self, phrase):
+        """Get the id of a weather status phrase."""
+        return self._status_ids[self.vocabulary.lookup(phrase).id]
+
+
+class ForecastFrame(object):
+    """Forecasts as a NumPy structured array, see FRAME_DTYPE.
+
+    Operations return new frames sharing the same codes, data is never
+    modified in place.
+    """
+
+    def __init__(self, data, codes, unit='Celsius'):
+        """Initialize ForecastFrame objects.
+
+        :param data: Structured array with FRAME_DTYPE
+        :param codes: FrameCodes of the station and status ids in data
+        :param unit: Unit of the temperatures, 'Celsius' or 'Fahrenheit'
+        """
+        self.data = data
+        self.codes = codes
+        self.unit = unit
+
+    def __len__(self):
+        return len(self.data)
+
+    def __repr__(self):
+        return '<ForecastFrame {n} rows, {s} stations, {u}>'.format(
+            n=len(self.data), s=len(self.station_names), u=self.unit)
+
+    @classmethod
+    def empty(cls, codes=None):
+        """Build a frame without rows.
+
+        :param codes: FrameCodes, default to new ones
+        """
+        numpy = _import_numpy()
+
+        return cls(numpy.empty(0, dtype=FRAME_DTYPE), codes or FrameCodes())
+
+    @classmethod
+    def from_records(cls, records, codes=None, issue_date=None):
+        """Build a frame from rows.
+
+        :param records: Forecast records in the store layout, optionally
+        followed by an ISO issue date
+        :param codes: FrameCodes, default to new ones
+        :param issue_date: datetime.date the records were issued, for
+        records without one
+        """
+        numpy = _import_numpy()
+
+        codes = codes or FrameCodes()
+        if not records:
+            return cls.empty(codes)
+
+        columns = zip(*records)
+        data = numpy.empty(len(records), dtype=FRAME_DTYPE)
+
+        data['station'] = [codes.station_id(name) for name in columns[3]]
+
+        ordinals = {}
+        data['date'] = [
+            ordinals.get(date) or ordinals.setdefault(
+                date, datetime.date(*date).toordinal())
+            for date in zip(columns[0], columns[1], columns[2])]
+
+        if len(columns) > 7:
+            data['issue'] = [
+                ordinals.get(issue) or ordinals.setdefault(
+                    issue, datetime.datetime.strptime(
+                        issue, '%Y-%m-%d').date().toordinal())
+                for issue in columns[7]]
+        else:
+            data['issue'] = issue_date.toordinal() if issue_date else 0
+
+        status_ids = {}
+        data['status'] = [
+            status_ids[phrase] if phrase in status_ids else
+            status_ids.setdefault(phrase, codes.status_id(phrase))
+            for phrase in columns[6]]
+
+        # Missing temperatures are stored as 0 along an unavailable status
+        missing = data['status'] == codes.unavailable
+        for column, values in (('day_temp', columns[4]),
+                               ('night_temp', columns[5])):
+            data[column] = values
+            data[column][missing] = numpy.nan
+
+        return cls(data, codes)
+
+    @classmethod
+    def iter_query(cls, cursor, sql_cmd, parameters=(), codes=None,
+                   chunk_size=DEFAULT_CHUNK_SIZE):
+        """Run a query and yield its result as frames of up to chunk_size
+        rows, sharing the same codes.
+
+        :param cursor: DB-API cursor to run the query with
+        :param sql_cmd: Query selecting FRAME_QUERY_COLUMNS, optionally
+        followed by issue_date
+        :param parameters: Parameters of the query
+        :param codes: FrameCodes, default to new ones
+        :param chunk_size: Rows fetched and converted at a time
+        """
+        codes = codes or FrameCodes()
+        cursor.execute(sql_cmd, parameters)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+
+            yield cls.from_records(rows, codes)
+
+    @classmethod
+    def from_query(cls, cursor, sql_cmd, parameters=(), codes=None,
+                   chunk_size=DEFAULT_CHUNK_SIZE):
+        """Load the result of a query into a single frame, chunk by chunk.
+
+        Only chunk_size rows are ever held as Python tuples. See iter_query
+        for the parameters.
+        """
+        numpy = _import_numpy()
+
+        codes = codes or FrameCodes()
+        chunks = [frame.data for frame in cls.iter_query(
+            cursor, sql_cmd, parameters, codes, chunk_size)]
+        if not chunks:
+            return cls.empty(codes)
+
+        return cls(numpy.concatenate(chunks), codes)
+
+    @classmethod
+    def from_store(cls, store, codes=None, chunk_size=DEFAULT_CHUNK_SIZE):
+        """Load the stored forecast of a PrognosStore.
+
+        :param store: PrognosStore to load from
+        :param codes: FrameCodes, default to new ones
+        :param chunk_size: Rows fetched and converted at a time
+        """
+        return cls.from_query(
+            store.cursor_,
+            u"SELECT {c} FROM 'main'.'prognos';".format(
+                c=FRAME_QUERY_COLUMNS),
+            codes=codes, chunk_size=chunk_size)
+
+    @staticmethod
+    def archive_query(location=None, start=None, end=None):
+        """Get the query and parameters loading the archive of a
+        PrognosStore, for from_query or iter_query.
+
+        :param location: Only this station, default to all of them
+        :param start: datetime.date of the first issue date included
+        :param end: datetime.date of the last issue date included
+        """
+        conditions = []
+        parameters = []
+        for condition, value in ((u'location = ?', location),
+                                 (u'issue_date >= ?', start),
+                                 (u'issue_date <= ?', end)):
+            if value is not None:
+                conditions.append(condition)
+                parameters.append(value if condition.startswith('location')
+                                  else value.isoformat())
+
+        sql_cmd = u"SELECT {c}, issue_date FROM archive {w};".format(
+            c=FRAME_QUERY_COLUMNS,
+            w=u'WHERE ' + u' AND '.join(conditions) if conditions else u'')
+
+        return sql_cmd, tuple(parameters)
+
+    @property
+    def station_names(self):
+        """Get the names of the stations with rows, by station id."""
+        numpy = _import_numpy()
+
+        return [self.codes.stations[station_id]
+                for station_id in numpy.unique(self.data['station'])]
+
+    @property
+    def dates(self):
+        """Get the dates of the rows, as datetime.date objects."""
+        return [datetime.date.fromordinal(ordinal)
+                for ordinal in self.data['date'].tolist()]
+
+    def filter(self, mask):
+        """Get a frame with the rows selected by mask.
+
+        :param mask: Boolean array, or indices, over the rows
+        """
+        return ForecastFrame(self.data[mask], self.codes, self.unit)
+
+    def where(self, stations=None, start=None, end=None, statuses=None,
+              available=None):
+        """Get a frame with the rows matching every condition given.
+
+        :param stations: Station names
+        :param start: datetime.date of the first day included
+        :param end: datetime.date of the last day included
+        :param statuses: Canonical status ids, see statuses.STATUS_ICONS
+        :param available: True for rows with an available status only,
+        False for unavailable ones only
+        """
+        numpy = _import_numpy()
+
+        data = self.data
+        mask = numpy.ones(len(data), dtype=bool)
+        if stations is not None:
+            ids = [self.codes.find_station(name) for name in stations]
+            mask &= numpy.in1d(data['station'],
+                               [i for i in ids if i is not None])
+        if start is not None:
+            mask &= data['date'] >= start.toordinal()
+        if end is not None:
+            mask &= data['date'] <= end.toordinal()
+        if statuses is not None:
+            mask &= numpy.in1d(data['status'],
+                               [self.codes.statuses.index(status)
+                                for status in statuses])
+        if available is not None:
+            mask &= (data['status'] != self.codes.unavailable) == available
+
+        return self.filter(mask)
+
+    def convert(self, unit):
+        """Get a frame with the temperatures in unit.
+
+        Rounded half away from zero, as utils.convert_temp does.
+        :param unit: 'Celsius' or 'Fahrenheit'
+        """
+        numpy = _import_numpy()
+
+        if unit == self.unit:
+            return self
+        if unit not in ('Celsius', 'Fahrenheit'):
+            raise ValueError('Unknown temperature unit: {u}'.format(u=unit))
+
+        data = self.data.copy()
+        for column in ('day_temp', 'night_temp'):
+            values = data[column].astype('f8')
+            if unit == 'Fahrenheit':
+                values = values * 9.0 / 5 + 32
+            else:
+                values = (values - 32.0) * 5.0 / 9.0
+            data[column] = numpy.sign(values) * numpy.floor(
+                numpy.abs(values) + 0.5)
+
+        return ForecastFrame(data, self.codes, unit)
+
+    def sort(self):
+        """Get a frame sorted by station, date and issue date."""
+        numpy = _import_numpy()
+
+        data = self.data
+        order = numpy.lexsort((data['issue'], data['date'], data['station']))
+
+        return self.filter(order)
+
+    def group_by_station(self):
+        """Split the frame by station.
+
+        Returns an OrderedDict of station name -> frame sorted by date and
+        issue date, by station id.
+        """
+        numpy = _import_numpy()
+
+        frame = self.sort()
+        stations = frame.data['station']
+        starts = numpy.flatnonzero(numpy.diff(stations)) + 1
+
+        return OrderedDict(
+            (self.codes.stations[part['station'][0]],
+             ForecastFrame(part, self.codes, self.unit))
+            for part in numpy.split(frame.data, starts) if len(part))
+
+    def station_stats(self, column='day_temp'):
+        """Get count, mean, min and max of a temperature column by station.
+
+        Missing temperatures are left out. Returns an OrderedDict of station
+        name -> (count, mean, min, max), by station id, mean, min and max
+        being NaN for stations without temperatures.
+        :param column: 'day_temp' or 'night_temp'
+        """
+        numpy = _import_numpy()
+
+        stations = self.data['station']
+        values = self.data[column].astype('f8')
+        valid = ~numpy.isnan(values)
+        size = len(self.codes.stations)
+
+        present = numpy.bincount(stations, minlength=size) > 0
+        counts = numpy.bincount(stations[valid], minlength=size)
+        sums = numpy.bincount(stations[valid], weights=values[valid],
+                              minlength=size)
+        minimums = numpy.full(size, numpy.nan)
+        maximums = numpy.full(size, numpy.nan)
+        numpy.fmin.at(minimums, stations[valid], values[valid])
+        numpy.fmax.at(maximums, stations[valid], values[valid])
+
+        with numpy.errstate(invalid='ignore', divide='ignore'):
+            means = sums / counts
+
+        return OrderedDict(
+            (self.codes.stations[station_id],
+             (int(counts[station_id]), means[station_id],
+              minimums[station_id], maximums[station_id]))
+            for station_id in numpy.flatnonzero(present))
+
+    def rolling(self, column='day_temp', window=7):
+        """Get rolling statistics of a temperature column, by station.
+
+        Every row gets the count, mean and standard deviation of the
+        available temperatures of its station in the window rows ending on
+        it, rows ordered as sort() does. Returns a structured array with
+        ROLLING_DTYPE, aligned with the rows of this frame.
+        :param column: 'day_temp' or 'night_temp'
+        :param window: Number of rows in the window
+        """
+        numpy = _import_numpy()
+
+        data = self.data
+        result = numpy.empty(len(data), dtype=ROLLING_DTYPE)
+        if not len(data):
+            return result
+
+        order = numpy.lexsort((data['issue'], data['date'], data['station']))
+        stations = data['station'][order]
+        values = data[column][order].astype('f8')
+        valid = ~numpy.isnan(values)
+        values[~valid] = 0
+
+        # Cumulative sums with a leading 0, windows are differences of them
+        sums = numpy.concatenate(([0], numpy.cumsum(values)))
+        squares = numpy.concatenate(([0], numpy.cumsum(values ** 2)))
+        counts = numpy.concatenate(([0], numpy.cumsum(valid)))
+
+        # Windows start at the first row of their station at the earliest
+        positions = numpy.arange(len(order))
+        firsts = numpy.where(
+            numpy.concatenate(([True], stations[1:] != stations[:-1])),
+            positions, 0)
+        starts = numpy.maximum(positions - window + 1,
+                               numpy.maximum.accumulate(firsts))
+        ends = positions + 1
+
+        count = counts[ends] - counts[starts]
+        with numpy.errstate(invalid='ignore', divide='ignore'):
+            mean = (sums[ends] - sums[starts]) / count
+            variance = (squares[ends] - squares[starts]) / count - mean ** 2
+
+        result['count'][order] = count
+        result['mean'][order] = mean
+        result['std'][order] = numpy.sqrt(numpy.maximum(variance, 0))
+
+        return result
+
+    def records(self):
+        """Yield the rows as (location, date, issue_date, day_temp,
+        night_temp, status) tuples.
+
+        Dates are datetime.date objects, issue_date None if unknown,
+        missing temperatures None and status a canonical status id.
+        """
+        stations = self.codes.stations
+        statuses = self.codes.statuses
+        dates = {}
+        for station, date, issue, day_temp, night_temp, status in \
+                self.data.tolist():
+            yield (stations[station],
+                   dates.get(date) or dates.setdefault(
+                       date, datetime.date.fromordinal(date)),
+                   (dates.get(issue) or dates.setdefault(
+                       issue, datetime.date.fromordinal(issue)))
+                   if issue else None,
+                   None if day_temp != day_temp else int(day_temp),
+                   None if night_temp != night_temp else int(night_temp),
+                   statuses[status])
+
+    def write_csv(self, csv_file, header=True):
+        """Write the rows as CSV, in the layout of records().
+
+        :param csv_file: File object opened for writing in binary mode
+        :param header: Write a header row first
+        """
+        writer = csv.writer(csv_file)
+        if header:
+            writer.writerow(('location', 'date', 'issue_date', 'day_temp',
+                             'night_temp', 'status'))
+
+        for location, date, issue, day_temp, night_temp, status in \
+                self.records():
+            writer.writerow((location.encode('utf-8'),
+                             date.isoformat(),
+                             issue.isoformat() if issue else '',
+                             '' if day_temp is None else day_temp,
+                             '' if night_temp is None else night_temp,
+                             status))
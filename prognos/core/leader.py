@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+
+# leader.py
+#
+# Copyright 2015
+# Leodanis Pozo Ramos <lpozo@openmailbox.org>
+# Ozkar L. Garcell <ozkar.garcell@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module containing the LeaderLock class.
+
+Several processes can share one prognos.db: the app, the daemon, the API
+server, batch jobs. Only the process holding the leader lock fetches and
+ingests; the others read and watch PrognosStore.generation for new data.
+The lock is an flock on a file next to the DB, so the OS releases it when
+the leader dies and the next process to try becomes the leader.
+"""
+
+import os
+
+try:
+    import fcntl
+except ImportError:
+    # No flock on this platform, every process is its own leader
+    fcntl = None
+
+
+class LeaderLock(object):
+    """Non-blocking, cross-process leader lock."""
+
+    def __init__(self, lock_path):
+        """Initialize LeaderLock objects.
+
+        :param lock_path: Path to the lock file
+        """
+        self.lock_path = lock_path
+        self._lock_file = None
+
+    @property
+    def is_leader(self):
+        """Check if this process holds the lock."""
+        return self._lock_file is not None
+
+    def acquire(self):
+        """Try to become the leader, without blocking.
+
+        Returns True if this process holds the lock, already or now.
+        """
+        if self.is_leader:
+            return True
+
+        lock_file = open(self.lock_path, 'a+')
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except IOError:
+                lock_file.close()
+                return False
+
+        # Record the leader pid, for humans
+        lock_file.seek(0)
+        lock_file.truncate()
+        lock_file.write(str(os.getpid()))
+        lock_file.flush()
+
+        self._lock_file = lock_file
+
+        return True
+
+    def release(self):
+        """Stop being the leader, if this process was."""
+        if not self.is_leader:
+            return
+
+        if fcntl is not None:
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+        self._lock_file.close()
+        self._lock_file = None
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+
+# memprofile.py
+#
+# Copyright 2015
+# Leodanis Pozo Ramos <lpozo@openmailbox.org>
+# Ozkar L. Garcell <ozkar.garcell@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module containing the MemoryProfiler class.
+
+Snapshots the memory of the process, e.g. after every refresh, and what
+grew since the last snapshot. Allocations are traced with tracemalloc where
+the interpreter has it. Elsewhere, like on Python 2, live objects are
+counted by type through the garbage collector and the size is the resident
+set size of the process.
+"""
+
+import gc
+import json
+import threading
+import time
+from collections import Counter
+from os import makedirs
+from os.path import dirname
+from os.path import exists
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+try:
+    import tracemalloc
+except ImportError:  # Python 2
+    tracemalloc = None
+
+
+def rss_bytes():
+    """Get the resident set size of the process, in bytes.
+
+    Falls back to the peak resident set size where /proc isn't available,
+    and to 0 where neither is.
+    """
+    if resource is None:
+        return 0
+
+    try:
+        with open('/proc/self/statm') as statm:
+            pages = int(statm.read().split()[1])
+        return pages * resource.getpagesize()
+    except (IOError, OSError, ValueError, IndexError):
+        # ru_maxrss is in kilobytes on Linux, in bytes on OS X
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _count_objects():
+    """Count the objects tracked by the garbage collector, by type."""
+    return Counter(type(obj).__name__ for obj in gc.get_objects())
+
+
+class MemoryProfiler(object):
+    """Memory snapshots, with the top growths between them."""
+
+    def __init__(self, top=10, log_path=None, frames=10):
+        """Initialize MemoryProfiler objects.
+
+        :param top: Number of growths to keep in every snapshot
+        :param log_path: JSON lines file every snapshot is appended to
+        :param frames: Stack frames tracemalloc keeps per allocation
+        """
+        if log_path is not None and not exists(dirname(log_path)):
+            makedirs(dirname(log_path))
+
+        self.top = top
+        self.log_path = log_path
+        self.frames = frames
+        self.tracing = False
+        self._last = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start tracing allocations, if tracemalloc is available."""
+        if tracemalloc is not None and not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            self.tracing = True
+
+    def stop(self):
+        """Stop tracing allocations."""
+        if self.tracing:
+            tracemalloc.stop()
+            self.tracing = False
+        self._last = None
+
+    def memory(self):
+        """Get the memory in use: traced bytes while tracing, otherwise the
+        resident set size."""
+        if self.tracing:
+            return tracemalloc.get_traced_memory()[0]
+
+        return rss_bytes()
+
+    def snapshot(self, label=None):
+        """Take a snapshot after a full collection.
+
+        Returns a dict with the label, time, memory in bytes, number of live
+        objects and top growths since the last snapshot: (where, bytes,
+        count) while tracing, otherwise (type, 0, count).
+        :param label: What the snapshot is taken after, e.g. 'refresh'
+        """
+        gc.collect()
+
+        with self._lock:
+            if self.tracing:
+                current = tracemalloc.take_snapshot()
+                growths = [(str(stat.traceback[0]), stat.size_diff,
+                            stat.count_diff)
+                           for stat in (current.compare_to(self._last,
+                                                           'lineno')
+                                        if self._last is not None else ())
+                           if stat.size_diff > 0][:self.top]
+                objects = len(gc.get_objects())
+            else:
+                current = _count_objects()
+                growths = [(name, 0, count) for name, count in
+                           (current - self._last).most_common(self.top)
+                           ] if self._last is not None else []
+                objects = sum(current.itervalues())
+            self._last = current
+
+        snapshot = {'label': label,
+                    'time': time.time(),
+                    'memory': self.memory(),
+                    'objects': objects,
+                    'growths': growths}
+
+        if self.log_path is not None:
+            with open(self.log_path, 'a') as log_file:
+                log_file.write(json.dumps(snapshot) + '\n')
+
+        return snapshot
@@ -0,0 +1,270 @@
+# -*- coding: utf-8 -*-
+
+# metrics.py
+#
+# Copyright 2015
+# Leodanis Pozo Ramos <lpozo@openmailbox.org>
+# Ozkar L. Garcell <ozkar.garcell@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tracing spans, counters and histograms.
+
+Instrumentation is off by default and then costs one attribute check per
+call. Once enabled, every finished span goes to a JSON lines trace log and
+its duration to a histogram, and export() writes every metric in Prometheus
+text format, both under ~/.prognos/ by default:
+
+    with metrics.span('feed.download'):
+        ...
+    metrics.incr('feed.wire_bytes', len(chunk))
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from os import makedirs
+from os.path import exists
+from os.path import expanduser
+from os.path import join
+
+
+logger = logging.getLogger('prognos.metrics')
+
+# Where metrics are exported by default
+DEFAULT_DIRECTORY = join(expanduser('~'), '.prognos')
+
+# Upper bounds of the histogram buckets, in seconds
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5,
+                   5, 10, 30)
+
+
+def _metric_name(name):
+    """Get the Prometheus name of a metric, e.g. prognos_feed_download."""
+    return 'prognos_' + name.replace('.', '_').replace('-', '_')
+
+
+class _NullSpan(object):
+    """Span used while instrumentation is disabled."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span(object):
+    """Time a block, reporting it to Metrics on exit."""
+
+    def __init__(self, metrics_, name):
+        self.metrics = metrics_
+        self.name = name
+        self.parent = None
+        self.started = None
+
+    def __enter__(self):
+        stack = self.metrics.span_stack()
+        self.parent = stack[-1].name if stack else None
+        stack.append(self)
+        self.started = time.time()
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        duration = time.time() - self.started
+        self.metrics.span_stack().pop()
+        self.metrics.observe(self.name + '.seconds', duration)
+        self.metrics.log_span(self, duration,
+                              exc_type.__name__ if exc_type else None)
+
+        return False
+
+
+class _Histogram(object):
+    """Cumulative histogram of observed values."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+
+
+class Metrics(object):
+    """Registry of the counters and histograms of the process."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        """Initialize Metrics objects.
+
+        :param buckets: Upper bounds of the histogram buckets
+        """
+        self.enabled = False
+        self.buckets = buckets
+        self.counters = OrderedDict()
+        self.histograms = OrderedDict()
+        self.prometheus_path = None
+        self.trace_path = None
+        self._trace_file = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def enable(self, directory=DEFAULT_DIRECTORY):
+        """Start collecting metrics and logging spans.
+
+        Returns whether they were enabled: if directory can't be written,
+        the error is logged and metrics stay disabled.
+        :param directory: Where metrics.prom and trace.jsonl are written
+        """
+        with self._lock:
+            try:
+                if not exists(directory):
+                    makedirs(directory)
+                if self._trace_file is None:
+                    self._trace_file = open(join(directory, 'trace.jsonl'),
+                                            'a')
+            except (IOError, OSError) as error:
+                logger.warning('Metrics not enabled, %s: %s', directory,
+                               error)
+                return False
+
+            self.prometheus_path = join(directory, 'metrics.prom')
+            self.trace_path = join(directory, 'trace.jsonl')
+            self.enabled = True
+
+        return True
+
+    def disable(self):
+        """Stop collecting metrics, keeping the ones collected."""
+        with self._lock:
+            self.enabled = False
+            if self._trace_file is not None:
+                self._trace_file.close()
+                self._trace_file = None
+
+    def span_stack(self):
+        """Get the stack of open spans of the current thread."""
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+
+        return stack
+
+    def span(self, name):
+        """Get a context manager timing a block as a span called name."""
+        if not self.enabled:
+            return _NULL_SPAN
+
+        return _Span(self, name)
+
+    def incr(self, name, value=1):
+        """Add value to the counter called name."""
+        if not self.enabled:
+            return
+
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name, value):
+        """Record value in the histogram called name."""
+        if not self.enabled:
+            return
+
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = _Histogram(self.buckets)
+            histogram.observe(value)
+
+    def log_span(self, span, duration, error=None):
+        """Write a finished span to the trace log."""
+        line = json.dumps({'name': span.name,
+                           'parent': span.parent,
+                           'start': span.started,
+                           'duration': duration,
+                           'thread': threading.current_thread().name,
+                           'error': error})
+
+        with self._lock:
+            if self._trace_file is not None:
+                self._trace_file.write(line + '\n')
+                self._trace_file.flush()
+
+    def prometheus_text(self):
+        """Get every metric in Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for name, value in self.counters.iteritems():
+                metric = _metric_name(name) + '_total'
+                lines.append('# TYPE {m} counter'.format(m=metric))
+                lines.append('{m} {v}'.format(m=metric, v=value))
+
+            for name, histogram in self.histograms.iteritems():
+                metric = _metric_name(name)
+                lines.append('# TYPE {m} histogram'.format(m=metric))
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    lines.append('{m}_bucket{{le="{b}"}} {c}'.format(
+                        m=metric, b=bound, c=count))
+                lines.append('{m}_bucket{{le="+Inf"}} {c}'.format(
+                    m=metric, c=histogram.count))
+                lines.append('{m}_sum {s!r}'.format(m=metric,
+                                                    s=histogram.sum))
+                lines.append('{m}_count {c}'.format(m=metric,
+                                                   c=histogram.count))
+
+        return '\n'.join(lines) + '\n'
+
+    def export(self):
+        """Write every metric to metrics.prom, if enabled."""
+        if not self.enabled:
+            return
+
+        # Write it whole, scrapers never see half a file
+        temp_path = self.prometheus_path + '.tmp'
+        with open(temp_path, 'w') as prometheus_file:
+            prometheus_file.write(self.prometheus_text())
+        os.rename(temp_path, self.prometheus_path)
+
+
+def traced(name):
+    """Decorate a function so its calls are spans called name."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not metrics.enabled:
+                return func(*args, **kwargs)
+
+            with metrics.span(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+# Metrics of the process
+metrics = Metrics()
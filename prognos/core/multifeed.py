@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+
+# multifeed.py
+#
+# Copyright 2015
+# Leodanis Pozo Ramos <lpozo@openmailbox.org>
+# Ozkar L. Garcell <ozkar.garcell@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Download several feeds concurrently.
+
+Every feed downloads in its own thread, with at most max_per_host
+downloads to the same host at a time. Results are handed over as they
+complete, so a refresh takes as long as the slowest feed, bounded by an
+overall deadline, instead of the sum of all of them.
+"""
+
+import Queue
+import threading
+import time
+import urlparse
+
+from .feed import FeedError
+from .parser import ParseError
+
+
+class DeadlineError(FeedError):
+    """The feed didn't download before the deadline."""
+
+
+def fetch_all(clients, consumer_factory, on_result, flights=None,
+              max_per_host=2, deadline=120):
+    """Download the feeds of clients concurrently.
+
+    on_result(client, result, error) is called in the calling thread for
+    every feed, as soon as it completes: with the result of
+    client.fetch(consumer_factory) and None, or with None and the error.
+    Feeds still downloading at the deadline get a DeadlineError and their
+    threads are left to finish in the background.
+    :param clients: FeedClients to download
+    :param consumer_factory: Consumer factory passed to FeedClient.fetch,
+    or a dict of client URL -> consumer factory
+    :param on_result: Callable getting every result
+    :param flights: SingleFlight to download through, or None
+    :param max_per_host: Maximum concurrent downloads from the same host
+    :param deadline: Seconds to wait for all feeds
+    """
+    results = Queue.Queue()
+    host_slots = dict((urlparse.urlparse(client.url).netloc,
+                       threading.BoundedSemaphore(max_per_host))
+                      for client in clients)
+
+    def download(client):
+        """Download a feed and queue its result, whatever happens."""
+        outcome = (client, None,
+                   FeedError(u'%s download ended unexpectedly' % client.url))
+        try:
+            if isinstance(consumer_factory, dict):
+                factory = consumer_factory[client.url]
+            else:
+                factory = consumer_factory
+
+            with host_slots[urlparse.urlparse(client.url).netloc]:
+                if flights is None:
+                    result = client.fetch(factory)
+                else:
+                    result = flights.do(client.url, client.fetch, factory)
+        except (FeedError, ParseError) as error:
+            outcome = (client, None, error)
+        except Exception as error:  # Must not leave the caller waiting
+            outcome = (client, None, FeedError(error))
+        else:
+            outcome = (client, result, None)
+        finally:
+            results.put(outcome)
+
+    for client in clients:
+        thread = threading.Thread(target=download, args=(client,),
+                                  name='prognos-fetch')
+        thread.daemon = True
+        thread.start()
+
+    ends_at = time.time() + deadline
+    pending = list(clients)
+    while pending:
+        remaining = ends_at - time.time()
+        if remaining <= 0:
+            break
+
+        try:
+            client, result, error = results.get(timeout=remaining)
+        except Queue.Empty:
+            break
+
+        pending.remove(client)
+        on_result(client, result, error)
+
+    for client in pending:
+        on_result(client, None, DeadlineError(
+            u'%s took longer than %s s' % (client.url, deadline)))
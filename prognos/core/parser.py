@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+
+# parser.py
+#
+# Copyright 2015
+# Leodanis Pozo Ramos <lpozo@openmailbox.org>
+# Ozkar L. Garcell <ozkar.garcell@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Parser for the Met RSS feed."""
+
+import hashlib
+import re
+from collections import OrderedDict
+from collections import namedtuple
+
+from .catalog import StationCatalog
+from .dates import parse_feed_date
+from .metrics import metrics
+
+
+# Stations of the Met feed, in feed order. Other stations in the feed are
+# registered in the catalog as they show up
+LOCATIONS = (u'Pinar del Río',
+             u'La Habana',
+             u'Varadero',
+             u'Cienfuegos',
+             u'Cayo Coco',
+             u'Camagüey',
+             u'Holguín',
+             u'Santiago de Cuba')
+
+# Every day in an item description takes four cells: day, day temperature,
+# night temperature and weather status
+CELLS_PER_DAY = 4
+
+_CELL_RE = re.compile(r'<td>\W*?.*?</td>')
+
+# A parsed feed: its forecast cells, the sha1 hex digest of its content and
+# the datetime.date it was issued, from its pubDate or lastBuildDate, None if
+# it has neither
+ParsedFeed = namedtuple('ParsedFeed', 'forecast digest issue_date')
+
+
+class ParseError(ValueError):
+    """The feed content could not be parsed."""
+
+
+def _read_forecast(tree_root, catalog):
+    """Get forecast cells out of the feed's parsed xml tree.
+
+    Items without forecast cells, like the feed's header and footer, are
+    skipped. The other ones are matched to their station by title, by GUID
+    if they have no title, or by position among the items with cells if
+    they have neither.
+    :param tree_root: Root element of the feed
+    :param catalog: StationCatalog to identify and register stations in
+    """
+    # Store forecast data in an OrderedDict
+    forecast = OrderedDict()
+    for position, item in enumerate(
+            item for item in tree_root.iterfind('channel/item')
+            if _CELL_RE.search(item.findtext('description') or u'')):
+        location = catalog.resolve(title=item.findtext('title'),
+                                   guid=item.findtext('guid'))
+        if location is None:
+            if position >= len(LOCATIONS):
+                continue
+            location = LOCATIONS[position]
+
+        # Clean data from xml tags and spaces: ' </td>'
+        forecast[location] = [cell[4:-5].strip() for cell in
+                              _CELL_RE.findall(item.findtext('description'))]
+
+    return forecast
+
+
+class FeedParser(object):
+    """Incremental parser for the feed, fed chunk by chunk as it downloads.
+
+    close() returns a ParsedFeed.
+    """
+
+    def __init__(self, catalog=None):
+        """Initialize FeedParser objects.
+
+        :param catalog: StationCatalog to match items with, default to a new
+        one with LOCATIONS
+        """
+        # Imported here so importing the core stays cheap
+        from lxml import etree
+
+        if catalog is None:
+            catalog = StationCatalog(LOCATIONS)
+
+        self.catalog = catalog
+        self._etree = etree
+        self._parser = etree.XMLParser()
+        self._sha1 = hashlib.sha1()
+
+    def feed(self, chunk):
+        """Parse the next chunk of the feed."""
+        if not chunk:
+            return
+
+        self._sha1.update(chunk)
+        try:
+            self._parser.feed(chunk)
+        except self._etree.XMLSyntaxError as error:
+            raise ParseError(u'Malformed feed: %s' % error)
+
+    def close(self):
+        """Finish parsing and return the ParsedFeed.
+
+        Most of the XML is parsed while it downloads, in feed(), so the
+        feed.parse span only covers the rest and reading the forecast out of
+        the tree.
+        """
+        with metrics.span('feed.parse'):
+            try:
+                tree_root = self._parser.close()
+            except self._etree.XMLSyntaxError as error:
+                raise ParseError(u'Malformed feed: %s' % error)
+
+            return ParsedFeed(
+                forecast=_read_forecast(tree_root, self.catalog),
+                digest=self._sha1.hexdigest(),
+                issue_date=parse_feed_date(
+                    tree_root.findtext('channel/pubDate') or
+                    tree_root.findtext('channel/lastBuildDate')))
+
+
+def parse_feed(xml_content, catalog=None):
+    """Parse the content of the weather site to get weather forecast data.
+
+    Returns an OrderedDict mapping every location to the list of cells in
+    its item, cleaned from xml tags and spaces.
+    :param xml_content: Content of weather site xml file.
+    :param catalog: StationCatalog to match items with, see FeedParser
+    """
+    parser = FeedParser(catalog)
+    parser.feed(xml_content)
+
+    return parser.close().forecast
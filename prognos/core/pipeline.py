@@ -0,0 +1,312 @@
+# -*- coding: utf-8 -*-
+
+# pipeline.py
+#
+# Copyright 2015
+# Leodanis Pozo Ramos <lpozo@openmailbox.org>
+# Ozkar L. Garcell <ozkar.garcell@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module containing the ForecastPipeline class.
+
+The pipeline runs fetch -> parse -> transform -> diff -> store and reports
+back through callbacks, so UIs, daemons and batch jobs can all drive it.
+"""
+
+import datetime
+from collections import OrderedDict
+
+from .diff import apply_to_records
+from .diff import diff_records
+from .metrics import metrics
+from .multifeed import fetch_all
+from .singleflight import feed_flights
+from .statuses import UNAVAILABLE
+from .transform import keep_current
+
+
+class ForecastPipeline(object):
+    """Fetch, parse, transform and store the forecast of some providers.
+
+    Every provider (see providers.base.ForecastProvider) can have several
+    feeds. All feeds are downloaded concurrently and every feed is stored as
+    soon as it arrives, merged with the last records of the others, each
+    record tagged with the name of its provider as its source. Where feeds
+    overlap, the one that comes first wins, providers in order.
+
+    Every ingest is diffed against the stored generation and only the
+    changes are written, see diff.Changeset. Given a ForecastAnalytics,
+    every feed's forecast is also archived under its issue date and the
+    analytics updated with it; workers pass one, UIs leave it out.
+
+    Callbacks are bound with bind(), Kivy style:
+        on_changed(changeset): after an ingest changed the stored records,
+        with the Changeset, before on_stored
+        on_stored(records): after new records have been stored, with every
+        record of the new generation
+        on_unchanged(): when a feed is the same as the last one ingested
+        on_error(error): with the FeedError or ParseError of a failed feed
+    """
+
+    events = ('on_changed', 'on_stored', 'on_unchanged', 'on_error')
+
+    def __init__(self, store, providers, flights=feed_flights,
+                 max_per_host=2, deadline=120, analytics=None):
+        """Initialize ForecastPipeline objects.
+
+        :param store: PrognosStore to write records into
+        :param providers: ForecastProviders to fetch, the first feed of the
+        first one is the main feed
+        :param flights: SingleFlight coalescing downloads of the same feed,
+        shared by every pipeline in the process by default
+        :param max_per_host: Maximum concurrent downloads from the same host
+        :param deadline: Seconds to wait for all feeds on a refresh
+        :param analytics: analytics.ForecastAnalytics to archive every
+        feed's forecast into, None not to archive
+        """
+        self.store = store
+        self.providers = list(providers)
+        self.clients = [client for provider in self.providers
+                        for client in provider.clients]
+        self.client = self.clients[0]
+        self.flights = flights
+        self.max_per_host = max_per_host
+        self.deadline = deadline
+        self._callbacks = dict((event, []) for event in self.events)
+
+        # Let the catalogs know the stations registered in earlier runs
+        for provider in self.providers:
+            provider.catalog.load(store.get_stations(provider.name))
+
+        # Provider of every feed, by feed URL
+        self.feed_providers = dict((client.url, provider)
+                                   for provider in self.providers
+                                   for client in provider.clients)
+
+        # Digest of the last content ingested, and its records, by feed URL
+        self.last_digests = {}
+        self.feed_records = {}
+
+        # Stored generation, record_key -> record, and the sources of its
+        # locations, see _stored_records
+        self._stored = {}
+        self._stored_sources = {}
+        self._stored_generation = None
+
+        # Accuracy and drift of the archived forecasts, if archiving
+        self.analytics = analytics
+
+    def bind(self, **kwargs):
+        """Bind callbacks to events, e.g. bind(on_stored=callback)."""
+        for event, callback in kwargs.iteritems():
+            self._callbacks[event].append(callback)
+
+    def unbind(self, **kwargs):
+        """Unbind callbacks previously bound with bind()."""
+        for event, callback in kwargs.iteritems():
+            self._callbacks[event].remove(callback)
+
+    def dispatch(self, event, *args):
+        """Call the callbacks bound to event."""
+        for callback in self._callbacks[event]:
+            callback(*args)
+
+    def _register_stations(self, provider):
+        """Persist the stations newly registered in provider's catalog."""
+        stations = provider.catalog.drain_new()
+        if stations:
+            self.store.register_stations(stations, provider.name)
+
+    def _stored_records(self):
+        """Get the stored generation, as a dict of record_key -> record.
+
+        Kept in memory between ingests, it is only read back from the store
+        when another process or writer stored a newer generation.
+        """
+        generation = self.store.generation
+        if generation != self._stored_generation:
+            self._stored = dict((record[:4], record) for record in
+                                self.store.get_forecast_data())
+            self._stored_sources = self.store.get_sources()
+            self._stored_generation = generation
+
+        return self._stored
+
+    @staticmethod
+    def _current_records(stored, today):
+        """Get today's available records of the stored generation.
+
+        :param stored: dict of record_key -> record
+        :param today: datetime.date for today
+        """
+        key = (today.year, today.month, today.day)
+
+        return [record for record in stored.itervalues()
+                if record[:3] == key and record[6] != UNAVAILABLE]
+
+    def _merged_records(self):
+        """Merge the last records of every feed, first feeds winning.
+
+        Returns the records and a dict of location -> source.
+        """
+        merged = OrderedDict()
+        sources = {}
+        for client in reversed(self.clients):
+            source = self.feed_providers[client.url].name
+            for record in self.feed_records.get(client.url, ()):
+                merged[record[:4]] = record
+                sources[record[3]] = source
+
+        return merged.values(), sources
+
+    def _store_forecast(self, forecast, url, issue_date=None):
+        """Transform the parsed forecast of a feed and store what changed.
+
+        Returns the records of the new generation.
+        :param forecast: forecast field of the feed's ParsedFeed
+        :param url: URL of the feed
+        :param issue_date: datetime.date the feed was issued, default to today
+        """
+        if issue_date is None:
+            issue_date = datetime.date.today()
+
+        provider = self.feed_providers[url]
+        self._register_stations(provider)
+
+        with metrics.span('pipeline.transform'):
+            self.feed_records[url] = provider.to_records(forecast, issue_date)
+            merged, sources = self._merged_records()
+            stored = self._stored_records()
+            records = keep_current(merged,
+                                   self._current_records(stored, issue_date),
+                                   today=issue_date)
+
+            # Kept records keep their stored source
+            stored_sources = dict(self._stored_sources)
+            stored_sources.update(sources)
+
+        with metrics.span('pipeline.diff'):
+            changeset = diff_records(stored, records, self._stored_sources,
+                                     stored_sources)
+
+        self.store.apply_changeset(changeset, sources=stored_sources)
+        apply_to_records(stored, changeset)
+        self._stored_sources = stored_sources
+        self._stored_generation = self.store.generation
+
+        metrics.incr('pipeline.rows_ingested', len(records))
+        metrics.incr('pipeline.rows_changed', len(changeset))
+        if changeset:
+            self.dispatch('on_changed', changeset)
+        self.dispatch('on_stored', records)
+
+        # Archive the feed's forecast and update the analytics with it, once
+        # the new records are out
+        if self.analytics is not None:
+            archive_data = [(issue_date.isoformat(),) + record +
+                            (provider.name,)
+                            for record in self.feed_records[url]]
+            self.store.archive_forecast_data(archive_data)
+            self.analytics.update(archive_data)
+
+        return records
+
+    def ingest(self, content, issue_date=None):
+        """Parse, transform and store content of the main feed.
+
+        Returns the records of the new generation.
+        :param content: Feed content
+        :param issue_date: datetime.date the feed was issued, default to today
+        """
+        parser = self.feed_providers[self.client.url].parser()
+        parser.feed(content)
+
+        return self._store_forecast(parser.close().forecast, self.client.url,
+                                    issue_date)
+
+    def fetch(self):
+        """Download and parse the main feed, returning a ParsedFeed.
+
+        The feed is parsed while it downloads. Concurrent downloads of the
+        same feed, from any thread, share a single request, and a feed is
+        downloaded at most once every flights.min_interval seconds. Safe to
+        call from any thread.
+        """
+        return self.flights.do(self.client.url, self.client.fetch,
+                               self.feed_providers[self.client.url].parser)
+
+    def fetch_all(self, on_result):
+        """Download and parse every feed concurrently.
+
+        Blocks until all feeds are done or the deadline passes. Safe to call
+        from any thread.
+        :param on_result: Called as on_result(client, parsed, error) in the
+        calling thread as soon as every feed completes, see
+        multifeed.fetch_all
+        """
+        fetch_all(self.clients,
+                  dict((url, provider.parser) for url, provider in
+                       self.feed_providers.iteritems()),
+                  on_result,
+                  flights=self.flights,
+                  max_per_host=self.max_per_host,
+                  deadline=self.deadline)
+
+    def process(self, parsed, client=None):
+        """Store a parsed feed unless it was already stored.
+
+        Returns the stored records, or None if nothing was stored.
+        :param parsed: ParsedFeed, as fetch() returns
+        :param client: FeedClient the feed came from, default to the main one
+        """
+        url = (client or self.client).url
+
+        # The data is fresh as of now, whether it changed or not
+        self.store.record_refresh()
+
+        # Don't rewrite the store with the same content
+        if parsed.digest == self.last_digests.get(url):
+            self.dispatch('on_unchanged')
+            return None
+
+        records = self._store_forecast(parsed.forecast, url)
+        self.last_digests[url] = parsed.digest
+
+        return records
+
+    def refresh(self, force=False):
+        """Download every feed and ingest them as they arrive.
+
+        Returns the last stored records, or None if nothing was stored.
+        :param force: Download even if the store is up to date
+        """
+        # Connect only if database is not up to date
+        if not (force or self.store.db_is_not_updated):
+            return None
+
+        stored = []
+
+        def on_result(client, parsed, error):
+            """Ingest a feed as soon as it arrives."""
+            if error is not None:
+                self.dispatch('on_error', error)
+                return
+
+            records = self.process(parsed, client)
+            if records is not None:
+                stored.append(records)
+
+        self.fetch_all(on_result)
+
+        return stored[-1] if stored else None
@@ -0,0 +1,6 @@
+# -*- coding: utf-8 -*-
+
+# prognos.core.providers Package __init__.py file.
+#
+# Forecast provider plugins. base holds the provider interface and registry,
+# every other module is a provider shipped with Prognos.
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+
+# base.py
+#
+# Copyright 2015
+# Leodanis Pozo Ramos <lpozo@openmailbox.org>
+# Ozkar L. Garcell <ozkar.garcell@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Forecast provider interface and registry.
+
+A provider knows everything about one forecast source: where its feeds are,
+how to parse them incrementally, how to turn them into records and which
+weather statuses it reports. ForecastPipeline drives any number of them.
+
+Providers register themselves with register_provider. Providers shipped in
+other packages are found through the 'prognos.providers' entry point group
+by discover_providers.
+"""
+
+import logging
+
+from ..catalog import StationCatalog
+from ..feed import FeedClient
+
+
+# Entry point group of third party providers
+ENTRY_POINT_GROUP = 'prognos.providers'
+
+# Name of the provider used when none is given
+DEFAULT_PROVIDER = 'met'
+
+# Registered provider classes by name
+PROVIDERS = {}
+
+logger = logging.getLogger('prognos.providers')
+
+
+class ForecastProvider(object):
+    """Base class of the forecast providers.
+
+    Subclasses set name, locations, vocabulary and feed_urls, and
+    implement parser and to_records.
+    """
+
+    # Source name, stored in the source column of every record
+    name = None
+
+    # Locations known in advance, in feed order. Others are registered in
+    # catalog as they show up in the feeds
+    locations = ()
+
+    # StatusVocabulary of the weather statuses the provider reports
+    vocabulary = None
+
+    # URLs of the provider's feeds
+    feed_urls = ()
+
+    def __init__(self, feed_urls=None, **client_options):
+        """Initialize ForecastProvider objects.
+
+        :param feed_urls: URLs of the feeds to fetch, default to feed_urls
+        :param client_options: Keyword arguments for every FeedClient
+        """
+        self.catalog = StationCatalog(self.locations)
+        self.client_options = client_options
+        self.clients = [FeedClient(url=url, **client_options)
+                        for url in (feed_urls or self.feed_urls)]
+
+    def add_feed(self, url):
+        """Fetch another feed in the provider's format too.
+
+        :param url: URL of the feed
+        """
+        self.clients.append(FeedClient(url=url, **self.client_options))
+
+    def parser(self):
+        """Get a new incremental parser for one of the feeds.
+
+        The parser is fed with feed(chunk) while the feed downloads and
+        close() returns a ParsedFeed. It matches feed items to stations
+        through catalog.
+        """
+        raise NotImplementedError
+
+    def to_records(self, forecast, issue_date=None):
+        """Turn the forecast of a ParsedFeed into a list of records.
+
+        :param forecast: forecast field of a ParsedFeed
+        :param issue_date: datetime.date the feed was issued, default to today
+        """
+        raise NotImplementedError
+
+
+def register_provider(provider_class):
+    """Register a ForecastProvider class under its name.
+
+    Can be used as a class decorator.
+    """
+    PROVIDERS[provider_class.name] = provider_class
+
+    return provider_class
+
+
+def discover_providers():
+    """Register the providers shipped with Prognos and the ones installed
+    through the 'prognos.providers' entry point group.
+
+    Returns PROVIDERS.
+    """
+    # Importing the module registers the provider
+    from . import cubanweather  # noqa
+
+    try:
+        import pkg_resources
+    except ImportError:
+        return PROVIDERS
+
+    for entry_point in pkg_resources.iter_entry_points(ENTRY_POINT_GROUP):
+        try:
+            register_provider(entry_point.load())
+        except Exception as error:  # A broken plugin must not stop Prognos
+            logger.warning('Could not load provider %s: %s',
+                           entry_point.name, error)
+
+    return PROVIDERS
+
+
+def load_providers(names=(DEFAULT_PROVIDER,), **client_options):
+    """Build a provider for every name, in the same order.
+
+    Raises KeyError if a name isn't registered.
+    :param names: Names of the providers
+    :param client_options: Keyword arguments for every FeedClient
+    """
+    providers = discover_providers()
+
+    return [providers[name](**client_options) for name in names]
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+
+# cubanweather.py
+#
+# Copyright 2015
+# Leodanis Pozo Ramos <lpozo@openmailbox.org>
+# Ozkar L. Garcell <ozkar.garcell@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Provider of the Cuban Met (met.inf.cu) RSS feed."""
+
+from ..feed import FEED_URL
+from ..parser import FeedParser
+from ..parser import LOCATIONS
+from ..statuses import STATUSES
+from ..transform import transform
+from .base import ForecastProvider
+from .base import register_provider
+
+
+@register_provider
+class CubanWeatherProvider(ForecastProvider):
+    """Forecast of the Instituto de Meteorología de Cuba."""
+
+    name = 'met'
+    locations = LOCATIONS
+    vocabulary = STATUSES
+    feed_urls = (FEED_URL,)
+
+    def parser(self):
+        """Get a new incremental parser for the Met feed."""
+        return FeedParser(self.catalog)
+
+    def to_records(self, forecast, issue_date=None):
+        """Turn the forecast of a parsed Met feed into records."""
+        return transform(forecast, issue_date)
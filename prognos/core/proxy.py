@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+
+# proxy.py
+#
+# Copyright 2015
+# Leodanis Pozo Ramos <lpozo@openmailbox.org>
+# Ozkar L. Garcell <ozkar.garcell@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module containing the ProxySession class."""
+
+import time
+import urllib
+import urllib2
+
+
+def _quote(value):
+    """Quote a proxy user name or password for use in a proxy URI."""
+    if isinstance(value, unicode):
+        value = value.encode('utf-8')
+
+    return urllib.quote(value, safe='')
+
+
+class ProxySession(object):
+    """Authenticating HTTP proxy, with credentials kept for a while.
+
+    One session is built per proxy configuration. Credentials live in memory
+    only, until they expire or are cleared, and the opener built with them
+    is reused by every download. urllib2 sends them preemptively, so
+    downloads don't pay for a 407 round trip.
+    """
+
+    def __init__(self, host, port, ttl=4 * 3600):
+        """Initialize ProxySession objects.
+
+        :param host: Proxy host
+        :param port: Proxy port
+        :param ttl: Seconds credentials are kept for
+        """
+        self.host = host
+        self.port = port
+        self.ttl = ttl
+        self.opener = None
+        self._expires_at = 0
+
+    def matches(self, host, port):
+        """Check if the session is for the given proxy configuration."""
+        return (self.host, self.port) == (host, port)
+
+    @property
+    def has_credentials(self):
+        """Check if the session holds unexpired credentials."""
+        if self.opener is not None and time.time() >= self._expires_at:
+            self.clear_credentials()
+
+        return self.opener is not None
+
+    def set_credentials(self, user, password):
+        """Set the credentials and build the opener that uses them.
+
+        :param user: Proxy user name
+        :param password: Proxy password, any characters allowed
+        """
+        proxy_uri = 'http://{u}:{p}@{h}:{port}'.format(u=_quote(user),
+                                                       p=_quote(password),
+                                                       h=self.host,
+                                                       port=self.port)
+        proxy_handler = urllib2.ProxyHandler({'http': proxy_uri,
+                                              'https': proxy_uri})
+
+        self.opener = urllib2.build_opener(proxy_handler,
+                                           urllib2.ProxyBasicAuthHandler())
+        self._expires_at = time.time() + self.ttl
+
+    def clear_credentials(self):
+        """Forget the credentials."""
+        self.opener = None
+        self._expires_at = 0
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+
+# scheduler.py
+#
+# Copyright 2015
+# Leodanis Pozo Ramos <lpozo@openmailbox.org>
+# Ozkar L. Garcell <ozkar.garcell@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module containing the RefreshScheduler class."""
+
+import datetime
+import logging
+import random
+import threading
+
+from .metrics import metrics
+
+logger = logging.getLogger('prognos.scheduler')
+
+
+class RefreshScheduler(object):
+    """Run a ForecastPipeline on a schedule.
+
+    Every interval seconds, plus or minus jitter, the store is checked and
+    refreshed if its feeds were last fetched more than ttl ago. While the
+    feed keeps coming back unchanged, or failing, the interval doubles up to
+    max_interval.
+
+    With a LeaderLock, only refreshes while holding it, and keeps trying to
+    take it over on every check.
+    """
+
+    def __init__(self, pipeline, interval=1800, jitter=0.1, ttl=3600,
+                 max_interval=6 * 3600, leader=None):
+        """Initialize RefreshScheduler objects.
+
+        :param pipeline: ForecastPipeline to run
+        :param interval: Seconds between checks
+        :param jitter: Fraction of the delay to randomly add or subtract
+        :param ttl: Seconds stored data stays fresh
+        :param max_interval: Maximum seconds between checks when backing off
+        :param leader: LeaderLock to hold while refreshing, or None
+        """
+        self.pipeline = pipeline
+        self.interval = interval
+        self.jitter = jitter
+        self.ttl = ttl
+        self.max_interval = max_interval
+        self.leader = leader
+
+        # Number of consecutive refreshes that brought no new data
+        self.idle_refreshes = 0
+
+        self._stop_event = threading.Event()
+
+    @property
+    def is_stale(self):
+        """Check if the stored data must be refreshed: it is out of date,
+        or the feeds were last fetched, changed or not, more than ttl ago."""
+        store = self.pipeline.store
+        if store.db_is_not_updated:
+            return True
+
+        age = datetime.datetime.utcnow() - store.last_refresh
+
+        return age > datetime.timedelta(seconds=self.ttl)
+
+    def next_delay(self):
+        """Get the seconds to wait before the next check."""
+        delay = min(self.interval * 2 ** min(self.idle_refreshes, 16),
+                    self.max_interval)
+
+        return max(0, delay + delay * random.uniform(-self.jitter,
+                                                     self.jitter))
+
+    def run_once(self):
+        """Refresh the store if its data is stale.
+
+        Returns the stored records, or None if nothing was stored.
+        """
+        if self.leader is not None and not self.leader.acquire():
+            logger.debug('Another process is the leader')
+            self.idle_refreshes = 0
+            return None
+
+        if not self.is_stale:
+            logger.debug('Stored data is fresh')
+            self.idle_refreshes = 0
+            return None
+
+        with metrics.span('refresh'):
+            records = self.pipeline.refresh(force=True)
+        if records is None:
+            self.idle_refreshes += 1
+            logger.info('No new data, backing off')
+        else:
+            self.idle_refreshes = 0
+            logger.info('Stored %d records', len(records))
+        metrics.export()
+
+        return records
+
+    def run(self):
+        """Run until stop() is called, then give up leadership."""
+        self._stop_event.clear()
+        try:
+            while not self._stop_event.is_set():
+                try:
+                    self.run_once()
+                except Exception:
+                    logger.exception('Refresh failed')
+                    self.idle_refreshes += 1
+
+                self._stop_event.wait(self.next_delay())
+        finally:
+            if self.leader is not None:
+                self.leader.release()
+
+    def stop(self):
+        """Stop a running scheduler."""
+        self._stop_event.set()
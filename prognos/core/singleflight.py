@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+
+# singleflight.py
+#
+# Copyright 2015
+# Leodanis Pozo Ramos <lpozo@openmailbox.org>
+# Ozkar L. Garcell <ozkar.garcell@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module containing the SingleFlight class."""
+
+import threading
+import time
+
+
+class _Call(object):
+    """A call in flight."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+    """Coalesce concurrent calls for the same key into one.
+
+    Callers asking for a key while a call for it is in flight wait for that
+    call and get its result (or its exception). A successful result is
+    reused for min_interval seconds after it completes, and released once
+    it expires.
+    """
+
+    def __init__(self, min_interval=0):
+        """Initialize SingleFlight objects.
+
+        :param min_interval: Seconds a successful result is reused for
+        """
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._results = {}
+
+    def do(self, key, func, *args, **kwargs):
+        """Call func(*args, **kwargs) unless a call for key is in flight or
+        completed less than min_interval seconds ago.
+
+        :param key: Key identifying the call, e.g. a URL
+        :param func: Callable to run
+        """
+        with self._lock:
+            last = self._results.pop(key, None)
+            if last is not None and time.time() - last[0] < self.min_interval:
+                self._results[key] = last
+                return last[1]
+
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if leader:
+            try:
+                call.result = func(*args, **kwargs)
+            except Exception as error:
+                call.error = error
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                    if call.error is None and self.min_interval > 0:
+                        self._results[key] = (time.time(), call.result)
+                    self._release_expired()
+                call.done.set()
+        else:
+            call.done.wait()
+
+        if call.error is not None:
+            raise call.error
+
+        return call.result
+
+    def _release_expired(self):
+        """Drop the results that can't be reused anymore. Must hold the
+        lock."""
+        expired_at = time.time() - self.min_interval
+        for key, (completed, _) in self._results.items():
+            if completed <= expired_at:
+                del self._results[key]
+
+    def forget(self, key):
+        """Drop the reusable result of key, so the next call runs."""
+        with self._lock:
+            self._results.pop(key, None)
+
+
+# Flights shared by every feed download in the process, keyed by URL
+feed_flights = SingleFlight(min_interval=60)
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+
+# statuses.py
+#
+# Copyright 2015
+# Leodanis Pozo Ramos <lpozo@openmailbox.org>
+# Ozkar L. Garcell <ozkar.garcell@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Weather statuses reported by the Met feed and their images.
+
+Statuses are matched through a StatusVocabulary built at import time: known
+phrases are a dict lookup, other phrases are matched in any case and with or
+without accents, falling back to the closest known phrase, and memoized in a
+bounded cache.
+"""
+
+import difflib
+import threading
+from collections import OrderedDict
+from collections import namedtuple
+
+from .metrics import metrics
+from .text import normalize_key
+
+
+# Status used when no forecast is available
+UNAVAILABLE = u'No disponible'
+
+# Canonical status id -> image
+STATUS_ICONS = OrderedDict([
+    ('unavailable', u'images/weather-none-available.png'),
+    ('showers-scattered', u'images/weather-showers-scattered-day.png'),
+    ('showers-afternoon', u'images/weather-showers-scattered-night.png'),
+    ('showers', u'images/weather-showers-day.png'),
+    ('few-clouds', u'images/weather-few-clouds.png'),
+    ('many-clouds', u'images/weather-many-clouds.png'),
+    ('clear', u'images/weather-clear.png'),
+    ('storm', u'images/weather-storm-day.png'),
+    ('wind', u'images/weather-mist.png')])
+
+# Known phrases, in Spanish and English -> canonical status id
+STATUS_PHRASES = OrderedDict([
+    (UNAVAILABLE, 'unavailable'),
+    (u'Not available', 'unavailable'),
+    (u'Lluvias Ocasionales', 'showers-scattered'),
+    (u'Lluvias dispersas', 'showers-scattered'),
+    (u'Lluvias aisladas', 'showers-scattered'),
+    (u'Isolated Showers', 'showers-scattered'),
+    (u'Scattered Showers', 'showers-scattered'),
+    (u'Lluvias en la Tarde', 'showers-afternoon'),
+    (u'Afternoon Showers', 'showers-afternoon'),
+    (u'Chubascos', 'showers'),
+    (u'Lluvias', 'showers'),
+    (u'Showers', 'showers'),
+    (u'Parcialmente Nublado', 'few-clouds'),
+    (u'Partly Cloudy', 'few-clouds'),
+    (u'Nublado', 'many-clouds'),
+    (u'Cloudy', 'many-clouds'),
+    (u'Soleado', 'clear'),
+    (u'Despejado', 'clear'),
+    (u'Sunny', 'clear'),
+    (u'Clear', 'clear'),
+    (u'Tormentas', 'storm'),
+    (u'Thunderstorms', 'storm'),
+    (u'Vientos', 'wind'),
+    (u'Windy', 'wind')])
+
+# A matched status: its canonical id and image
+Status = namedtuple('Status', 'id icon')
+
+
+class StatusVocabulary(object):
+    """Map weather status phrases to canonical statuses."""
+
+    def __init__(self, phrases=STATUS_PHRASES, icons=STATUS_ICONS,
+                 default='unavailable', cutoff=0.75, cache_size=256):
+        """Initialize StatusVocabulary objects.
+
+        :param phrases: dict of known phrase -> status id
+        :param icons: dict of status id -> image
+        :param default: Status id of phrases that match nothing
+        :param cutoff: Minimum similarity, 0 to 1, of a fuzzy match
+        :param cache_size: Maximum number of unknown phrases memoized
+        """
+        self.icons = icons
+        self.default = Status(default, icons[default])
+        self.cutoff = cutoff
+        self.cache_size = cache_size
+
+        # Exact phrase -> Status, and normalized phrase -> Status
+        self._exact = dict((phrase, Status(status_id, icons[status_id]))
+                           for phrase, status_id in phrases.iteritems())
+        self._index = dict((normalize_key(phrase), status)
+                           for phrase, status in self._exact.iteritems())
+
+        # Memoized matches of other phrases, least recently used first
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _match(self, key):
+        """Get the Status of the known phrase closest to key."""
+        matches = difflib.get_close_matches(key, self._index, n=1,
+                                            cutoff=self.cutoff)
+
+        return self._index[matches[0]] if matches else self.default
+
+    def lookup(self, phrase):
+        """Get the Status of a weather status phrase.
+
+        :param phrase: Weather status as the feed reports it
+        """
+        status = self._exact.get(phrase)
+        if status is not None:
+            return status
+
+        with self._lock:
+            status = self._cache.pop(phrase, None)
+            metrics.incr('cache.statuses.misses' if status is None else
+                         'cache.statuses.hits')
+            if status is None:
+                key = normalize_key(phrase or u'')
+                status = self._index.get(key) or self._match(key)
+            self._cache[phrase] = status
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+        return status
+
+    def icon(self, phrase):
+        """Get the image of a weather status phrase."""
+        return self.lookup(phrase).icon
+
+
+# Vocabulary of the Met feed
+STATUSES = StatusVocabulary()
@@ -0,0 +1,514 @@
+# -*- coding: utf-8 -*-
+
+# store.py
+#
+# Copyright 2015
+# Leodanis Pozo Ramos <lpozo@openmailbox.org>
+# Ozkar L. Garcell <ozkar.garcell@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module containing the PrognosStore class."""
+
+import sqlite3 as db_api  # So you can change the db manager any time you like
+import datetime
+from os import makedirs
+from os.path import dirname
+from os.path import exists
+from os.path import expanduser
+from os.path import join
+
+from ..utils import get_today_date
+from .metrics import traced
+from .statuses import UNAVAILABLE
+
+
+# Where Prognos keeps its DB on desktop platforms
+DEFAULT_DATABASE_PATH = join(expanduser('~'), '.prognos', 'prognos.db')
+
+
+class PrognosStore(object):
+    """Database for storing forecast data."""
+
+    def __init__(self, database_path):
+        """Initialize PrognosStore objects.
+
+        If database_path can't be opened, a :memory: DB is used instead and
+        in_memory is set to True.
+        :param database_path: Path to the DB file
+        """
+        self.database_path = database_path
+        self.in_memory = False
+
+        self.connection = None
+        self.cursor_ = None
+
+        try:
+            # Create the DB folder if needed
+            if database_path != ':memory:' and not exists(
+                    dirname(database_path)):
+                makedirs(dirname(database_path))
+
+            # Create a connection to prognos DB
+            self._create_db_connection(db_path=self.database_path)
+
+            # Create the table
+            self._create_table()
+        except (db_api.Error, OSError):
+            # If an error occur, create a connection to a :memory: DB
+            self._create_db_connection(db_path=':memory:')
+
+            # Create the table
+            self._create_table()
+
+            self.in_memory = True
+
+    def _create_db_connection(self, db_path):
+        """Create a connection to prognos.db.
+
+        :param db_path: Path to the DB
+        """
+        # Create the connection to prognos.db
+        self.connection = db_api.connect(database=db_path)
+
+        # Create a cursor
+        self.cursor_ = self.connection.cursor()
+
+    def _create_table(self):
+        """Create a table in prognos.db."""
+        self.cursor_.executescript("""
+            PRAGMA encoding="UTF-8";
+            CREATE TABLE IF NOT EXISTS prognos
+                (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                year INT,
+                month INT,
+                day INT,
+                location TEXT,
+                day_temp INT,
+                night_temp INT,
+                weather_status TEXT,
+                date_created DATETIME DEFAULT current_timestamp,
+                source TEXT,
+                UNIQUE(year, month, day, location));
+            CREATE INDEX IF NOT EXISTS idx_date ON prognos
+                (year, month, day);
+            CREATE TABLE IF NOT EXISTS metadata
+                (key TEXT PRIMARY KEY,
+                value);
+            CREATE TABLE IF NOT EXISTS stations
+                (key TEXT PRIMARY KEY,
+                name TEXT,
+                source TEXT);
+            CREATE TABLE IF NOT EXISTS archive
+                (issue_date TEXT,
+                year INT,
+                month INT,
+                day INT,
+                location TEXT,
+                day_temp INT,
+                night_temp INT,
+                weather_status TEXT,
+                source TEXT,
+                PRIMARY KEY(issue_date, year, month, day, location));
+            CREATE TABLE IF NOT EXISTS archived_files
+                (path TEXT PRIMARY KEY,
+                issue_date TEXT,
+                rows INT);""")
+
+        # DBs created before providers have no source column
+        columns = [row[1] for row in self.cursor_.execute(
+            u"PRAGMA table_info(prognos);")]
+        if 'source' not in columns:
+            self.cursor_.execute(
+                u"ALTER TABLE prognos ADD COLUMN source TEXT;")
+
+        # Save changes
+        self.connection.commit()
+
+    @traced('store.write')
+    def store_weather_forecast_data(self, forecast_data, sources=None):
+        """Store the forecast data into the database.
+
+        :param forecast_data: Data to store in DB. A list of tuples.
+        Every tuple in the list must include information for every field in the
+        DB, this is: (year, month, day, location, day_temp, night_temp,
+        weather_status) in that order.
+        :param sources: dict of location -> name of the provider its data
+        comes from, locations missing from it get no source
+        """
+        sources = sources or {}
+
+        # Delete old information
+        self.cursor_.execute(u"DELETE FROM 'main'.'prognos' ")
+
+        # Inset data into the database
+        self.cursor_.executemany(u"INSERT INTO"
+                                 " prognos("
+                                 " year,"
+                                 " month,"
+                                 " day,"
+                                 " location,"
+                                 " day_temp,"
+                                 " night_temp,"
+                                 " weather_status,"
+                                 " source) "
+                                 "VALUES(?, ?, ?, ?, ?, ?, ?, ?)",
+                                 (record + (sources.get(record[3]),)
+                                  for record in forecast_data))
+
+        # Let readers in other processes know there is new data
+        self._bump_generation()
+
+        # Save data
+        self.connection.commit()
+
+    @traced('store.write')
+    def apply_changeset(self, changeset, sources=None):
+        """Write only what changed since the stored generation.
+
+        Removed records are deleted, changed records updated in place and
+        added records inserted, all in a single transaction. Does nothing if
+        changeset is empty.
+        :param changeset: diff.Changeset between the stored records and the
+        new ones
+        :param sources: dict of location -> name of the provider its data
+        comes from, locations missing from it get no source
+        """
+        if not changeset:
+            return
+
+        sources = sources or {}
+
+        self.cursor_.executemany(u"DELETE FROM 'main'.'prognos' "
+                                 "WHERE year = ? AND month = ? AND day = ? "
+                                 "AND location = ?;",
+                                 (record[:4]
+                                  for record in changeset.removals))
+
+        self.cursor_.executemany(u"UPDATE 'main'.'prognos' SET"
+                                 " day_temp = ?,"
+                                 " night_temp = ?,"
+                                 " weather_status = ?,"
+                                 " source = ?,"
+                                 " date_created = current_timestamp "
+                                 "WHERE year = ? AND month = ? AND day = ? "
+                                 "AND location = ?;",
+                                 (record[4:] + (sources.get(location),) +
+                                  record[:4]
+                                  for location, records in
+                                  changeset.changed.iteritems()
+                                  for record in records))
+
+        self.cursor_.executemany(u"INSERT OR REPLACE INTO"
+                                 " prognos("
+                                 " year,"
+                                 " month,"
+                                 " day,"
+                                 " location,"
+                                 " day_temp,"
+                                 " night_temp,"
+                                 " weather_status,"
+                                 " source) "
+                                 "VALUES(?, ?, ?, ?, ?, ?, ?, ?)",
+                                 (record + (sources.get(location),)
+                                  for location, records in
+                                  changeset.added.iteritems()
+                                  for record in records))
+
+        # Let readers in other processes know there is new data
+        self._bump_generation()
+
+        # Save data
+        self.connection.commit()
+
+    def _bump_generation(self):
+        """Increment the generation, within the current transaction."""
+        self.cursor_.execute(u"INSERT OR REPLACE INTO metadata(key, value) "
+                             "VALUES('generation', ?);",
+                             (self.generation + 1,))
+
+    @property
+    @traced('store.generation')
+    def generation(self):
+        """Get the generation of the stored data.
+
+        Every store increments it, so readers can tell new data is in by
+        comparing it with the last generation they saw.
+        """
+        generation = self.cursor_.execute(
+            u"SELECT value FROM metadata WHERE key = 'generation';").fetchone()
+
+        return generation[0] if generation else 0
+
+    @property
+    def lock_path(self):
+        """Get the path of the leader lock file for this DB."""
+        return join(dirname(self.database_path), 'prognos.lock')
+
+    @traced('store.get_forecast_data')
+    def get_forecast_data(self):
+        """Get every stored forecast row.
+
+        Rows have the same layout store_weather_forecast_data expects: (year,
+        month, day, location, day_temp, night_temp, weather_status).
+        """
+        sql_cmd = (u"SELECT"
+                   " year,"
+                   " month,"
+                   " day,"
+                   " location,"
+                   " day_temp,"
+                   " night_temp,"
+                   " weather_status "
+                   "FROM 'main'.'prognos';")
+
+        return self.cursor_.execute(sql_cmd).fetchall()
+
+    @traced('store.get_sources')
+    def get_sources(self):
+        """Get a dict of location -> source of its stored data."""
+        sql_cmd = (u"SELECT DISTINCT location, source FROM 'main'.'prognos' "
+                   "WHERE source IS NOT NULL;")
+
+        return dict(self.cursor_.execute(sql_cmd).fetchall())
+
+    @traced('store.get_stations')
+    def get_stations(self, source):
+        """Get the (key, name) pairs of the stations of source, in
+        registration order.
+
+        :param source: Name of the provider
+        """
+        sql_cmd = (u"SELECT key, name FROM stations "
+                   "WHERE source = ? ORDER BY rowid;")
+
+        return self.cursor_.execute(sql_cmd, (source,)).fetchall()
+
+    @traced('store.register_stations')
+    def register_stations(self, stations, source):
+        """Persist stations registered in a StationCatalog.
+
+        :param stations: (key, name) pairs, as StationCatalog.drain_new
+        returns
+        :param source: Name of the provider
+        """
+        self.cursor_.executemany(u"INSERT OR IGNORE INTO stations"
+                                 "(key, name, source) VALUES(?, ?, ?);",
+                                 [(key, name, source)
+                                  for key, name in stations])
+
+        # Save data
+        self.connection.commit()
+
+    @traced('store.archive')
+    def archive_forecast_data(self, archive_data, files=()):
+        """Store forecasts into the archive, in a single transaction.
+
+        Forecasts already archived for the same issue date are replaced.
+        :param archive_data: List of tuples (issue_date, year, month, day,
+        location, day_temp, night_temp, weather_status, source), issue_date
+        being an ISO date string
+        :param files: (path, issue_date, rows) of the feed files the data
+        comes from, to record them as archived
+        """
+        self.cursor_.executemany(u"INSERT OR REPLACE INTO archive VALUES"
+                                 "(?, ?, ?, ?, ?, ?, ?, ?, ?);",
+                                 archive_data)
+        self.cursor_.executemany(u"INSERT OR REPLACE INTO archived_files"
+                                 "(path, issue_date, rows) VALUES(?, ?, ?);",
+                                 files)
+
+        # Save data
+        self.connection.commit()
+
+    @traced('store.get_archived_files')
+    def get_archived_files(self):
+        """Get the set of the paths of the feed files already archived."""
+        return set(row[0] for row in self.cursor_.execute(
+            u"SELECT path FROM archived_files;"))
+
+    @traced('store.get_extended_forecast')
+    def get_extended_forecast(self, location_, days):
+        """Get extended forecast data.
+
+        :param location_: Current location.
+        :param days: Number of days to include in extended forecast.
+        """
+        # TODO: Take into account the month
+        sql_cmd = (u"SELECT"
+                   " day,"
+                   " location,"
+                   " day_temp,"
+                   " night_temp,"
+                   " weather_status "
+                   "FROM 'main'.'prognos' "
+                   "WHERE"
+                   " location = '{l}';").format(l=location_)
+
+        data = self.cursor_.execute(sql_cmd)
+
+        return data.fetchall()[:days]
+
+    @traced('store.get_current_forecast')
+    def get_current_forecast(self, location_=None):
+        """Get the forecast for the current day.
+
+        :param location_: If a location_ is given, returns data only for that
+        location, otherwise returns data for all locations.
+        """
+        sql_cmd = (u"SELECT"
+                   " location,"
+                   " day,"
+                   " month,"
+                   " year,"
+                   " day_temp,"
+                   " night_temp, "
+                   " weather_status "
+                   "FROM 'main'.'prognos' "
+                   "WHERE"
+                   " year = '{0}' AND"
+                   " month = '{1}' AND"
+                   " day = '{2}' AND")
+
+        if location_ is None:
+            sql_cmd += u" weather_status != '{ws}';"
+            sql_cmd = sql_cmd.format(*get_today_date(), ws=UNAVAILABLE)
+        else:
+            sql_cmd += u" location= '{l}';"
+            sql_cmd = sql_cmd.format(*get_today_date(), l=location_)
+
+        data = self.cursor_.execute(sql_cmd)
+
+        if data:
+            return data.fetchall()
+
+        return None
+
+    @traced('store.current_forecast_in_db')
+    def current_forecast_in_db(self, location_=None):
+        """Test if current day forecast data is in db.
+
+        :param location_: If a location_ is given, check data only for that
+        location, otherwise check data for all locations.
+        """
+        sql_cmd = (u"SELECT"
+                   " year,"
+                   " month,"
+                   " day "
+                   "FROM 'main'.'prognos' "
+                   "WHERE"
+                   " year='{0}' AND"
+                   " month='{1}' AND"
+                   " day='{2}'")
+
+        if location_ is None:
+            sql_cmd += u';'
+            sql_cmd = sql_cmd.format(*get_today_date())
+        else:
+            sql_cmd += u" AND location='{l}';"
+            sql_cmd = sql_cmd.format(*get_today_date(), l=location_)
+
+        today = self.cursor_.execute(sql_cmd).fetchall()
+
+        if today:
+            return True
+
+        return False
+
+    @property
+    @traced('store.db_is_not_updated')
+    def db_is_not_updated(self):
+        """Check if the database is up to date."""
+        # Is data up to date?
+        sql_cmd = (u"SELECT"
+                   " year,"
+                   " month,"
+                   " day,"
+                   " weather_status "
+                   "FROM 'main'.'prognos';")
+
+        first_day = self.cursor_.execute(sql_cmd).fetchone()
+
+        if (first_day is None or
+                datetime.date(*first_day[:-1]) < datetime.date.today() or
+                first_day[3] == UNAVAILABLE):
+            return True
+
+        return False
+
+    @property
+    @traced('store.last_update')
+    def last_update(self):
+        """Get the UTC datetime of the last stored data, None if empty."""
+        sql_cmd = u"SELECT max(date_created) FROM 'main'.'prognos';"
+        last_update = self.cursor_.execute(sql_cmd).fetchone()[0]
+
+        if last_update is None:
+            return None
+
+        return datetime.datetime.strptime(last_update, '%Y-%m-%d %H:%M:%S')
+
+    def record_refresh(self):
+        """Record that the feeds were just fetched, even if nothing
+        changed, so the data counts as fresh."""
+        self.cursor_.execute(u"INSERT OR REPLACE INTO metadata(key, value) "
+                             "VALUES('last_refresh', "
+                             "datetime('now'));")
+
+        # Save data
+        self.connection.commit()
+
+    @property
+    @traced('store.last_refresh')
+    def last_refresh(self):
+        """Get the UTC datetime of the last successful fetch, default to
+        last_update if none was recorded."""
+        last_refresh = self.cursor_.execute(
+            u"SELECT value FROM metadata "
+            "WHERE key = 'last_refresh';").fetchone()
+
+        if last_refresh is None:
+            return self.last_update
+
+        return datetime.datetime.strptime(last_refresh[0],
+                                          '%Y-%m-%d %H:%M:%S')
+
+    @property
+    @traced('store.db_is_empty')
+    def db_is_empty(self):
+        """Check if the database is empty."""
+        # Is DB empty?
+        sql_cmd = u"SELECT * FROM 'main'.'prognos';"
+        db_content = self.cursor_.execute(sql_cmd).fetchall()
+        if not db_content:
+            return True
+
+        return False
+
+    @property
+    @traced('store.db_is_obsolete')
+    def db_is_obsolete(self):
+        """Check if the data stored in database is obsolete."""
+        sql_cmd = u"SELECT year, month, day FROM 'main'.'prognos';"
+        stored_days = self.cursor_.execute(sql_cmd).fetchall()
+        today = get_today_date(int_format=True)
+
+        if today not in stored_days:
+            return True
+
+        return False
+
+    def close_connection(self):
+        """Close the connection to database."""
+        if self.connection:
+            self.connection.close()
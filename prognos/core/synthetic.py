@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+
+# synthetic.py
+#
+# Copyright 2015
+# Leodanis Pozo Ramos <lpozo@openmailbox.org>
+# Ozkar L. Garcell <ozkar.garcell@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Synthetic feeds in the Met RSS format, for load and scale testing.
+
+generate_feed builds the same document for the same arguments: items whose
+description holds the <td> table of a station, between the header and
+footer items of the real feed, for any number of stations and days.
+Malformed and empty cells, unknown statuses and forecasts crossing the end
+of the month and year can be mixed in.
+"""
+
+import datetime
+import random
+from email.utils import formatdate
+from os.path import join
+from time import mktime
+from xml.sax.saxutils import escape
+
+from .parser import LOCATIONS
+from .statuses import STATUS_PHRASES
+
+
+# Statuses no vocabulary knows about
+UNKNOWN_STATUSES = (u'Granizo', u'Niebla densa', u'Ciclón tropical',
+                    u'Polvo del Sahara')
+
+# Garbage found in malformed cells
+MALFORMED_CELLS = (u'N/D', u'3O', u'--', u'2 8', u'<b>', u'?')
+
+_HEADER = (u'<?xml version="1.0" encoding="UTF-8"?>\n'
+           u'<rss version="2.0"><channel>'
+           u'<title>Pronóstico del tiempo</title>'
+           u'<link>http://www.met.inf.cu</link>'
+           u'<description>Instituto de Meteorología</description>'
+           u'<pubDate>{date}</pubDate>')
+
+_ITEM = (u'<item><title>{title}</title><guid>{guid}</guid>'
+         u'<description>{description}</description></item>')
+
+
+def station_names(stations):
+    """Get the names of the first stations stations: the real ones, then
+    made up ones."""
+    return [LOCATIONS[i] if i < len(LOCATIONS) else
+            u'Estación {n}'.format(n=i + 1) for i in xrange(stations)]
+
+
+def _cell(value, rng, malformed, empty):
+    """Format a cell, maybe malformed or empty."""
+    draw = rng.random()
+    if draw < empty:
+        value = u''
+    elif draw < empty + malformed:
+        value = rng.choice(MALFORMED_CELLS)
+
+    return u'<td> {v} </td>'.format(v=escape(value))
+
+
+def generate_feed(stations=len(LOCATIONS), days=5, issue_date=None, seed=0,
+                  malformed=0.0, empty=0.0, unknown_statuses=0.0,
+                  rollover=False, shuffle=False):
+    """Generate a feed in the Met format, as UTF-8 bytes.
+
+    :param stations: Number of stations
+    :param days: Number of forecast days of every station
+    :param issue_date: datetime.date of the first day, default to today
+    :param seed: Seed of the random data
+    :param malformed: Fraction of cells with garbage in them
+    :param empty: Fraction of empty cells
+    :param unknown_statuses: Fraction of statuses no vocabulary knows
+    :param rollover: Move issue_date so the forecast crosses the end of
+    the month and year
+    :param shuffle: Shuffle the order of the station items
+    """
+    rng = random.Random(seed)
+    if issue_date is None:
+        issue_date = datetime.date.today()
+    if rollover:
+        issue_date = datetime.date(issue_date.year, 12,
+                                   32 - max(1, days // 2))
+
+    known_statuses = [phrase for phrase in STATUS_PHRASES
+                      if STATUS_PHRASES[phrase] != 'unavailable']
+
+    items = []
+    for name in station_names(stations):
+        base = rng.randint(26, 33)
+        cells = []
+        for offset in xrange(days):
+            date = issue_date + datetime.timedelta(days=offset)
+            if rng.random() < unknown_statuses:
+                status = rng.choice(UNKNOWN_STATUSES)
+            else:
+                status = rng.choice(known_statuses)
+
+            for value in (unicode(date.day),
+                          unicode(base + rng.randint(-2, 2)),
+                          unicode(base - 8 + rng.randint(-2, 2)),
+                          status):
+                cells.append(_cell(value, rng, malformed, empty))
+
+        table = u'<table><tr>{c}</tr></table>'.format(c=u''.join(cells))
+        items.append(_ITEM.format(
+            title=escape(name),
+            guid=u'met-{g}'.format(g=len(items) + 1),
+            description=escape(table)))
+
+    if shuffle:
+        rng.shuffle(items)
+
+    header_item = _ITEM.format(title=u'Pronóstico para Cuba', guid=u'met-0',
+                               description=u'Pronóstico extendido')
+    footer_item = _ITEM.format(title=u'Fuente', guid=u'met-source',
+                               description=u'www.met.inf.cu')
+
+    header = _HEADER.format(date=formatdate(mktime(
+        issue_date.timetuple()) + 6 * 3600, localtime=True))
+
+    return u''.join([header, header_item] + items +
+                    [footer_item, u'</channel></rss>']).encode('utf-8')
+
+
+def write_snapshots(directory, count, first_date, **kwargs):
+    """Write count daily feeds, issued from first_date on, into directory.
+
+    Returns the paths of the feeds, named met-YYYYMMDD.xml.
+    :param directory: Existing directory to write the feeds into
+    :param count: Number of feeds
+    :param first_date: datetime.date of the first feed
+    :param kwargs: Other generate_feed arguments, the seed of every feed is
+    the seed argument plus its number
+    """
+    seed = kwargs.pop('seed', 0)
+    paths = []
+    for number in xrange(count):
+        issue_date = first_date + datetime.timedelta(days=number)
+        path = join(directory, issue_date.strftime('met-%Y%m%d.xml'))
+        with open(path, 'wb') as feed_file:
+            feed_file.write(generate_feed(issue_date=issue_date,
+                                          seed=seed + number, **kwargs))
+        paths.append(path)
+
+    return paths
@@ -0,0 +1,546 @@
+# -*- coding: utf-8 -*-
+
+# test_core.py
+#
+# Copyright 2015
+# Leodanis Pozo Ramos <lpozo@openmailbox.org>
+# Ozkar L. Garcell <ozkar.garcell@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit tests of the headless prognos.core package.
+
+Run them with: python -m unittest prognos.core.test_core
+"""
+
+import datetime
+import threading
+import time
+import unittest
+from xml.sax.saxutils import escape
+
+from .analytics import ForecastAnalytics
+from .analytics import WINDOW_FUNCTIONS
+from .catalog import StationCatalog
+from .circuit import CircuitBreaker
+from .dates import resolve_dates
+from .diff import diff_records
+from .singleflight import SingleFlight
+from .statuses import StatusVocabulary
+from .statuses import UNAVAILABLE
+from .store import PrognosStore
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    import lxml
+except ImportError:
+    lxml = None
+
+
+class ResolveDatesTest(unittest.TestCase):
+    """Tests of dates.resolve_dates."""
+
+    issue_date = datetime.date(2026, 10, 19)
+
+    def test_consecutive_days(self):
+        self.assertEqual(resolve_dates([19, 20, 21], self.issue_date),
+                         [datetime.date(2026, 10, day)
+                          for day in (19, 20, 21)])
+
+    def test_month_end_rollover(self):
+        self.assertEqual(
+            resolve_dates([30, 31, 1, 2], datetime.date(2026, 10, 30)),
+            [datetime.date(2026, 10, 30), datetime.date(2026, 10, 31),
+             datetime.date(2026, 11, 1), datetime.date(2026, 11, 2)])
+
+    def test_year_rollover(self):
+        self.assertEqual(
+            resolve_dates([31, 1], datetime.date(2026, 12, 31)),
+            [datetime.date(2026, 12, 31), datetime.date(2027, 1, 1)])
+
+    def test_first_day_in_next_month(self):
+        self.assertEqual(
+            resolve_dates([1, 2], datetime.date(2026, 10, 31)),
+            [datetime.date(2026, 11, 1), datetime.date(2026, 11, 2)])
+
+    def test_day_past_end_of_month(self):
+        self.assertEqual(
+            resolve_dates([30, 31, 1], datetime.date(2026, 11, 30)),
+            [datetime.date(2026, 11, 30), None, datetime.date(2026, 12, 1)])
+
+    def test_empty_first_day(self):
+        self.assertEqual(resolve_dates([0, 20, 21, 22], self.issue_date),
+                         [None] + [datetime.date(2026, 10, day)
+                                   for day in (20, 21, 22)])
+
+    def test_empty_day_in_the_middle(self):
+        self.assertEqual(resolve_dates([19, 0, 21, 22], self.issue_date),
+                         [datetime.date(2026, 10, 19), None,
+                          datetime.date(2026, 10, 21),
+                          datetime.date(2026, 10, 22)])
+
+    def test_malformed_days(self):
+        self.assertEqual(resolve_dates([None, 19, 99, 20], self.issue_date),
+                         [None, datetime.date(2026, 10, 19), None,
+                          datetime.date(2026, 10, 20)])
+
+    def test_malformed_day_before_rollover(self):
+        self.assertEqual(
+            resolve_dates([31, 0, 1], datetime.date(2026, 10, 31)),
+            [datetime.date(2026, 10, 31), None, datetime.date(2026, 11, 1)])
+
+    def test_no_days(self):
+        self.assertEqual(resolve_dates([], self.issue_date), [])
+        self.assertEqual(resolve_dates([0, 0], self.issue_date),
+                         [None, None])
+
+
+
+class DiffTest(unittest.TestCase):
+    """Tests of diff.diff_records and PrognosStore.apply_changeset."""
+
+    previous = [(2026, 10, 19, u'Pinar del Río', 30, 22, u'Soleado'),
+                (2026, 10, 20, u'Pinar del Río', 31, 23, u'Nublado'),
+                (2026, 10, 19, u'La Habana', 29, 21, u'Lluvias')]
+
+    current = [(2026, 10, 19, u'Pinar del Río', 30, 22, u'Soleado'),
+               (2026, 10, 20, u'Pinar del Río', 32, 23, u'Nublado'),
+               (2026, 10, 21, u'Pinar del Río', 30, 22, u'Tormentas')]
+
+    def test_diff(self):
+        changeset = diff_records(self.previous, self.current)
+        self.assertEqual(changeset.added, {u'Pinar del Río': [
+            (2026, 10, 21, u'Pinar del Río', 30, 22, u'Tormentas')]})
+        self.assertEqual(changeset.changed, {u'Pinar del Río': [
+            (2026, 10, 20, u'Pinar del Río', 32, 23, u'Nublado')]})
+        self.assertEqual(changeset.removed, {u'La Habana': [
+            (2026, 10, 19, u'La Habana', 29, 21, u'Lluvias')]})
+        self.assertEqual(changeset.locations,
+                         set([u'Pinar del Río', u'La Habana']))
+        self.assertEqual(len(changeset), 3)
+
+    def test_no_changes(self):
+        changeset = diff_records(self.previous, list(self.previous))
+        self.assertFalse(changeset)
+        self.assertEqual(len(changeset), 0)
+
+    def test_source_change(self):
+        changeset = diff_records(
+            self.previous, self.previous,
+            previous_sources={u'La Habana': 'cubanweather'},
+            sources={u'La Habana': 'other'})
+        self.assertEqual(changeset.changed.keys(), [u'La Habana'])
+
+    def test_apply_changeset(self):
+        store = PrognosStore(database_path=':memory:')
+        store.store_weather_forecast_data(forecast_data=self.previous)
+        store.apply_changeset(diff_records(self.previous, self.current))
+        self.assertEqual(sorted(store.get_forecast_data()),
+                         sorted(self.current))
+
+    def test_apply_empty_changeset(self):
+        store = PrognosStore(database_path=':memory:')
+        store.store_weather_forecast_data(forecast_data=self.previous)
+        store.apply_changeset(diff_records(self.previous, self.previous))
+        self.assertEqual(sorted(store.get_forecast_data()),
+                         sorted(self.previous))
+
+
+class StationCatalogTest(unittest.TestCase):
+    """Tests of catalog.StationCatalog."""
+
+    def setUp(self):
+        self.catalog = StationCatalog([u'Pinar del Río', u'La Habana',
+                                       u'Santiago de Cuba',
+                                       u'Estación 10'])
+
+    def test_seed_stations_are_not_new(self):
+        self.assertEqual(len(self.catalog), 4)
+        self.assertEqual(self.catalog.drain_new(), [])
+
+    def test_normalized_title(self):
+        self.assertEqual(self.catalog.resolve(u'  PINAR   DEL RIO '),
+                         u'Pinar del Río')
+        self.assertEqual(self.catalog.drain_new(), [])
+
+    def test_fuzzy_variant(self):
+        self.assertEqual(self.catalog.resolve(u'Santiago de Cubaa'),
+                         u'Santiago de Cuba')
+        self.assertEqual(self.catalog.resolve(u'Pinar del RÃ\xado'),
+                         u'Pinar del Río')
+        self.assertEqual(len(self.catalog), 4)
+
+        # Variants are indexed, and persisted, under the known station
+        self.assertEqual([name for _, name in self.catalog.drain_new()],
+                         [u'Santiago de Cuba', u'Pinar del Río'])
+
+    def test_other_number_is_a_new_station(self):
+        self.assertEqual(self.catalog.resolve(u'Estación 11'),
+                         u'Estación 11')
+        self.assertEqual(self.catalog.drain_new(),
+                         [(u'estacion 11', u'Estación 11')])
+
+    def test_unrelated_title_is_a_new_station(self):
+        self.assertEqual(self.catalog.resolve(u'Cienfuegos'), u'Cienfuegos')
+        self.assertIn(u'Cienfuegos', self.catalog)
+
+    def test_title_before_guid(self):
+        self.assertEqual(self.catalog.resolve(u'Pinar del Rio', u'met-1'),
+                         u'Pinar del Río')
+
+        # The feed was reordered, its GUIDs are positional
+        self.assertEqual(self.catalog.resolve(u'La Habana', u'met-1'),
+                         u'La Habana')
+
+    def test_guid_without_title(self):
+        self.catalog.resolve(u'La Habana', u'met-2')
+        self.assertEqual(self.catalog.resolve(None, u'met-2'), u'La Habana')
+        self.assertEqual(self.catalog.resolve(u' ', u'met-2'), u'La Habana')
+        self.assertIsNone(self.catalog.resolve(None, u'met-3'))
+        self.assertIsNone(self.catalog.resolve())
+
+    def test_guids_are_not_persisted(self):
+        self.catalog.resolve(u'La Habana', u'met-2')
+        self.catalog.resolve(u'Cienfuegos', u'met-5')
+        self.assertEqual(self.catalog.drain_new(),
+                         [(u'cienfuegos', u'Cienfuegos')])
+
+    def test_guids_are_bounded(self):
+        catalog = StationCatalog([u'La Habana'], guids_size=2)
+        for number in xrange(5):
+            catalog.resolve(u'La Habana', u'met-{n}'.format(n=number))
+        self.assertIsNone(catalog.resolve(None, u'met-0'))
+        self.assertEqual(catalog.resolve(None, u'met-4'), u'La Habana')
+
+    def test_load(self):
+        catalog = StationCatalog()
+        catalog.load([(u'cienfuegos', u'Cienfuegos')])
+        self.assertEqual(catalog.resolve(u'CIENFUEGOS'), u'Cienfuegos')
+        self.assertEqual(catalog.drain_new(), [])
+
+
+@unittest.skipIf(lxml is None, 'lxml is not installed')
+class FeedParserTest(unittest.TestCase):
+    """Tests of parser.FeedParser."""
+
+    @staticmethod
+    def _item(title, guid, cells=None):
+        """Build a feed item, with a table of cells if given."""
+        description = (escape(u'<table><tr>{c}</tr></table>'.format(
+            c=u''.join(u'<td> {v} </td>'.format(v=cell)
+                       for cell in cells)))
+                       if cells is not None else u'Pronóstico extendido')
+
+        return (u'<item><title>{t}</title><guid>{g}</guid>'
+                u'<description>{d}</description></item>').format(
+            t=title, g=guid, d=description)
+
+    def _parse(self, items):
+        """Parse a feed of items with a fresh catalog."""
+        from .parser import FeedParser
+
+        parser = FeedParser()
+        parser.feed((u'<?xml version="1.0" encoding="UTF-8"?>'
+                     u'<rss version="2.0"><channel>'
+                     u'<title>Pronóstico del tiempo</title>{i}'
+                     u'</channel></rss>').format(
+            i=u''.join(items)).encode('utf-8'))
+
+        return parser.close().forecast
+
+    def test_items_without_cells_are_skipped(self):
+        forecast = self._parse([
+            self._item(u'Pronóstico para Cuba', u'met-0'),
+            self._item(u'Pinar del Río', u'met-1',
+                       [u'19', u'30', u'22', u'Soleado']),
+            self._item(u'Fuente', u'met-source', cells=None)])
+
+        self.assertEqual(forecast.keys(), [u'Pinar del Río'])
+        self.assertEqual(forecast[u'Pinar del Río'],
+                         [u'19', u'30', u'22', u'Soleado'])
+
+    def test_reordered_feed(self):
+        forecast = self._parse([
+            self._item(u'La Habana', u'met-1',
+                       [u'19', u'29', u'21', u'Lluvias']),
+            self._item(u'Pinar del Rio', u'met-2',
+                       [u'19', u'30', u'22', u'Soleado'])])
+
+        self.assertEqual(forecast[u'La Habana'][1], u'29')
+        self.assertEqual(forecast[u'Pinar del Río'][1], u'30')
+
+    def test_position_without_title_or_guid(self):
+        forecast = self._parse([
+            self._item(u'', u'', [u'19', u'30', u'22', u'Soleado']),
+            self._item(u'', u'', [u'19', u'29', u'21', u'Lluvias'])])
+
+        self.assertEqual(forecast.keys(), [u'Pinar del Río', u'La Habana'])
+
+
+class StatusVocabularyTest(unittest.TestCase):
+    """Tests of statuses.StatusVocabulary."""
+
+    def setUp(self):
+        self.vocabulary = StatusVocabulary()
+
+    def test_exact(self):
+        self.assertEqual(self.vocabulary.lookup(u'Parcialmente Nublado').id,
+                         'few-clouds')
+        self.assertEqual(self.vocabulary.lookup(u'Partly Cloudy').id,
+                         'few-clouds')
+        self.assertEqual(self.vocabulary.icon(u'Soleado'),
+                         u'images/weather-clear.png')
+
+    def test_accent_and_case_variants(self):
+        for phrase in (u'PARCIALMENTE NUBLADO', u' parcialmente   nublado ',
+                       u'Parcialménte Nublado'):
+            self.assertEqual(self.vocabulary.lookup(phrase).id,
+                             'few-clouds')
+        for phrase in (u'no disponible', u'NO DISPONÍBLE', UNAVAILABLE):
+            self.assertEqual(self.vocabulary.lookup(phrase).id,
+                             'unavailable')
+
+    def test_fuzzy_match(self):
+        self.assertEqual(self.vocabulary.lookup(u'Parcialmente Nubldo').id,
+                         'few-clouds')
+        self.assertEqual(self.vocabulary.lookup(u'Tormenta').id, 'storm')
+
+    def test_unrelated_phrases_fall_back_to_default(self):
+        for phrase in (u'Granizo', u'Nieve intensa', u'?', u'', None):
+            self.assertEqual(self.vocabulary.lookup(phrase),
+                             self.vocabulary.default)
+
+    def test_cache_is_bounded(self):
+        vocabulary = StatusVocabulary(cache_size=3)
+        for number in xrange(10):
+            vocabulary.lookup(u'Nublado {n}'.format(n=number))
+        self.assertEqual(len(vocabulary._cache), 3)
+
+        # Exact phrases are never cached
+        vocabulary.lookup(u'Nublado')
+        self.assertNotIn(u'Nublado', vocabulary._cache)
+
+    def test_cache_evicts_least_recently_used(self):
+        vocabulary = StatusVocabulary(cache_size=2)
+        vocabulary.lookup(u'soleado')
+        vocabulary.lookup(u'nublado')
+        vocabulary.lookup(u'soleado')
+        vocabulary.lookup(u'tormentas')
+        self.assertEqual(vocabulary._cache.keys(), [u'soleado',
+                                                    u'tormentas'])
+
+
+class SingleFlightTest(unittest.TestCase):
+    """Tests of singleflight.SingleFlight."""
+
+    def test_concurrent_calls_coalesce(self):
+        flights = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+        results = []
+
+        def fetch():
+            calls.append(1)
+            started.set()
+            release.wait()
+            return 'feed'
+
+        leader = threading.Thread(
+            target=lambda: results.append(flights.do('url', fetch)))
+        leader.start()
+        started.wait()
+        followers = [threading.Thread(
+            target=lambda: results.append(flights.do('url', fetch)))
+            for _ in xrange(3)]
+        for follower in followers:
+            follower.start()
+
+        # Let the followers reach the call in flight
+        time.sleep(0.1)
+        release.set()
+        for thread in [leader] + followers:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['feed'] * 4)
+
+    def test_error_is_not_reused(self):
+        flights = SingleFlight(min_interval=60)
+        calls = []
+
+        def fail():
+            calls.append(1)
+            raise ValueError('down')
+
+        for _ in xrange(2):
+            self.assertRaises(ValueError, flights.do, 'url', fail)
+        self.assertEqual(len(calls), 2)
+
+    def test_result_reused_for_min_interval(self):
+        flights = SingleFlight(min_interval=60)
+        calls = []
+        self.assertEqual(flights.do('url', calls.append, 1), None)
+        flights.do('url', calls.append, 2)
+        self.assertEqual(calls, [1])
+
+        flights.forget('url')
+        flights.do('url', calls.append, 3)
+        self.assertEqual(calls, [1, 3])
+
+    def test_keys_are_independent(self):
+        flights = SingleFlight(min_interval=60)
+        self.assertEqual(flights.do('a', lambda: 1), 1)
+        self.assertEqual(flights.do('b', lambda: 2), 2)
+
+
+class CircuitBreakerTest(unittest.TestCase):
+    """Tests of circuit.CircuitBreaker."""
+
+    def test_opens_after_threshold(self):
+        breaker = CircuitBreaker(failure_threshold=3, cooldown=60)
+        for _ in xrange(2):
+            breaker.record_failure()
+            self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(breaker.allow())
+
+    def test_success_resets_failures(self):
+        breaker = CircuitBreaker(failure_threshold=2, cooldown=60)
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    def test_half_open_after_cooldown(self):
+        breaker = CircuitBreaker(failure_threshold=1, cooldown=60)
+        breaker.record_failure()
+        breaker.opened_at -= 61
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertTrue(breaker.allow())
+
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    def test_half_open_failure_reopens(self):
+        breaker = CircuitBreaker(failure_threshold=3, cooldown=60)
+        for _ in xrange(3):
+            breaker.record_failure()
+        breaker.opened_at -= 61
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+
+
+@unittest.skipIf(numpy is None, 'NumPy is not installed')
+class RollingTest(unittest.TestCase):
+    """Tests of frame.ForecastFrame.rolling."""
+
+    def _frame(self, records):
+        from .frame import ForecastFrame
+
+        return ForecastFrame.from_records(
+            [record + ('2026-10-{d:02d}'.format(d=record[2]),)
+             for record in records])
+
+    def test_rolling(self):
+        frame = self._frame([
+            (2026, 10, 3, u'A', 30, 20, u'Soleado'),
+            (2026, 10, 1, u'A', 10, 20, u'Soleado'),
+            (2026, 10, 2, u'A', 20, 20, u'Soleado'),
+            (2026, 10, 1, u'B', 50, 20, u'Soleado')])
+        rolling = frame.rolling(window=2)
+
+        self.assertEqual(list(rolling['count']), [2, 1, 2, 1])
+        self.assertEqual(list(rolling['mean']), [25.0, 10.0, 15.0, 50.0])
+        self.assertEqual(list(rolling['std']), [5.0, 0.0, 5.0, 0.0])
+
+    def test_missing_temperatures(self):
+        frame = self._frame([
+            (2026, 10, 1, u'A', 10, 20, u'Soleado'),
+            (2026, 10, 2, u'A', 0, 0, UNAVAILABLE),
+            (2026, 10, 3, u'A', 30, 20, u'Soleado')])
+        rolling = frame.rolling(window=3)
+
+        self.assertEqual(list(rolling['count']), [1, 1, 2])
+        self.assertEqual(list(rolling['mean']), [10.0, 10.0, 20.0])
+
+    def test_empty(self):
+        from .frame import ForecastFrame
+
+        self.assertEqual(len(ForecastFrame.empty().rolling()), 0)
+
+
+@unittest.skipUnless(WINDOW_FUNCTIONS,
+                     'SQLite has no window functions')
+class AnalyticsParityTest(unittest.TestCase):
+    """The window functions SQL and the Python fallback of
+    analytics.ForecastAnalytics agree."""
+
+    # Phrases of the same statuses as the feed may spell them
+    statuses = (u'Lluvias dispersas', u'Lluvias Ocasionales',
+                u'lluvias aisladas', u'Soleado', u'Despejado', UNAVAILABLE)
+
+    def _archive(self):
+        """Get archive rows of two stations, issued up to 4 days ahead."""
+        rows = []
+        for number, location in enumerate((u'Pinar del Río', u'La Habana')):
+            for target in xrange(10, 16):
+                for lead in xrange(5):
+                    issue = datetime.date(2026, 10, target - lead)
+                    status = self.statuses[(target + lead + number) %
+                                           len(self.statuses)]
+                    available = status != UNAVAILABLE
+                    rows.append((
+                        issue.isoformat(), 2026, 10, target, location,
+                        30 + (target * lead + number) % 5 if available else 0,
+                        20 + (target + lead) % 3 if available else 0,
+                        status, 'cubanweather'))
+
+        # The final forecast of a day is missing
+        return [row for row in rows
+                if not (row[3] == 12 and row[0] == '2026-10-12')]
+
+    def _tables(self, window_functions):
+        """Build the aggregates and get their contents."""
+        store = PrognosStore(database_path=':memory:')
+        store.archive_forecast_data(self._archive())
+        analytics = ForecastAnalytics(store,
+                                      window_functions=window_functions)
+        analytics.rebuild()
+
+        return [store.cursor_.execute(
+            u"SELECT * FROM {t} ORDER BY 1, 2, 3, 4, 5;".format(
+                t=table)).fetchall()
+            for table in ('forecast_errors', 'station_accuracy')], analytics
+
+    def test_parity(self):
+        window, _ = self._tables(window_functions=True)
+        fallback, _ = self._tables(window_functions=False)
+        self.assertTrue(window[0])
+        self.assertEqual(window, fallback)
+
+    def test_statuses_compared_by_id(self):
+        _, analytics = self._tables(window_functions=False)
+        hit_rates = [accuracy.status_hit_rate
+                     for accuracy in analytics.lead_summary()
+                     if accuracy.lead > 0]
+        self.assertTrue(any(hit_rates))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+
+# text.py
+#
+# Copyright 2015
+# Leodanis Pozo Ramos <lpozo@openmailbox.org>
+# Ozkar L. Garcell <ozkar.garcell@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Text normalization shared by the station catalog and status vocabulary."""
+
+import unicodedata
+
+
+def normalize_key(text):
+    """Normalize text into a lookup key: no accents, case or extra spaces.
+
+    :param text: Text to normalize, e.g. a station name or weather status
+    """
+    text = unicodedata.normalize('NFKD', unicode(text))
+    text = u''.join(char for char in text if not unicodedata.combining(char))
+
+    return u' '.join(text.lower().split())
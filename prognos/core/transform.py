@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+
+# transform.py
+#
+# Copyright 2015
+# Leodanis Pozo Ramos <lpozo@openmailbox.org>
+# Ozkar L. Garcell <ozkar.garcell@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Transformer: turn parsed feed cells into forecast records.
+
+A forecast record is a tuple (year, month, day, location, day_temp,
+night_temp, weather_status), the layout PrognosStore stores.
+"""
+
+import datetime
+
+from .dates import next_valid_date
+from .dates import resolve_dates
+from .parser import CELLS_PER_DAY
+from .statuses import UNAVAILABLE
+
+
+# Number of days in the default forecast
+DEFAULT_DAYS = 5
+
+
+def _to_int(cell):
+    """Convert a feed cell to int, empty or malformed cells count as 0."""
+    try:
+        return int(cell)
+    except ValueError:
+        return 0
+
+
+def transform(forecast, issue_date=None):
+    """Transform parsed forecast cells into a list of records.
+
+    Empty temperatures become 0 and empty statuses become UNAVAILABLE. Days
+    that can't be resolved into a date are skipped.
+    :param forecast: OrderedDict of location -> cells, as parse_feed returns
+    :param issue_date: datetime.date the feed was issued, default to today
+    """
+    records = []
+    for location, cells in forecast.iteritems():
+        rows = [cells[i:i + CELLS_PER_DAY] for i in
+                xrange(0, len(cells) - CELLS_PER_DAY + 1, CELLS_PER_DAY)]
+        dates = resolve_dates([_to_int(row[0]) for row in rows],
+                              issue_date=issue_date)
+
+        for date, (_, day_temp, night_temp, status) in zip(dates, rows):
+            if date is None:
+                continue
+
+            records.append((date.year,  # Year
+                            date.month,  # Month
+                            date.day,  # Day
+                            location,  # Location
+                            _to_int(day_temp),  # Day temp
+                            _to_int(night_temp),  # Night temp
+                            status or UNAVAILABLE))  # Weather status
+
+    return records
+
+
+def keep_current(records, current_records, today=None):
+    """Keep today's stored forecast for locations the feed no longer has
+    today's forecast for.
+
+    :param records: Records from the feed
+    :param current_records: Today's records from the store
+    :param today: datetime.date for today, default to today
+    """
+    if today is None:
+        today = datetime.date.today()
+
+    key = (today.year, today.month, today.day)
+    online = set((record[3], record[:3]) for record in records)
+
+    return [record for record in current_records
+            if (record[3], key) not in online] + records
+
+
+def default_records(locations, today=None, days=DEFAULT_DAYS):
+    """Build default records for when no forecast is available.
+
+    :param locations: Locations to build records for
+    :param today: datetime.date of the first day, default to today
+    :param days: Number of days for every location
+    """
+    if today is None:
+        today = datetime.date.today()
+
+    records = []
+    for location in locations:
+        year, month, day = today.year, today.month, today.day
+        for _ in xrange(days):
+            date = next_valid_date(year, month, day)
+            year, month, day = date.year, date.month, date.day
+            records.append((year,  # Year
+                            month,  # Month
+                            day,  # Day
+                            location,  # Location
+                            0,  # Day temp
+                            0,  # Night temp
+                            UNAVAILABLE))  # Weather status
+
+            day += 1
+
+    return records
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+
+# imagecache.py
+#
+# Copyright 2015
+# Leodanis Pozo Ramos <lpozo@openmailbox.org>
+# Ozkar L. Garcell <ozkar.garcell@gmail.com>
+#
+# Important: Run this module to pack the weather icons into atlases:
+#     python -m prognos.imagecache
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module containing the WeatherImages class.
+
+Weather icons are packed into one Kivy atlas per screen density when the
+app is packaged (python cli.py atlas), so a single PNG is decoded for all of
+them. The atlas is decoded in the background once the app starts.
+"""
+
+import json
+from os.path import basename
+from os.path import dirname
+from os.path import exists
+from os.path import getmtime
+from os.path import join
+from os.path import splitext
+
+from kivy.atlas import Atlas
+from kivy.cache import Cache
+from kivy.loader import Loader
+from kivy.metrics import Metrics
+
+
+# Directory holding the images and name prefix of the weather atlases
+IMAGES_DIR = 'images'
+ATLAS_NAME = 'weather'
+
+# Density variants, from higher to lower: (minimum density, variant). Icons
+# for a variant live in images/<variant>/, mdpi icons live in images/
+DPI_VARIANTS = ((2.0, 'xhdpi'),
+                (1.5, 'hdpi'),
+                (0.0, 'mdpi'))
+
+
+def get_dpi_variant(density=None):
+    """Get the variant name for a screen density.
+
+    :param density: Screen density, default to the current Metrics.density
+    """
+    if density is None:
+        density = Metrics.density
+
+    for min_density, variant in DPI_VARIANTS:
+        if density >= min_density:
+            return variant
+
+    return DPI_VARIANTS[-1][1]
+
+
+def get_variant_image(image_path, variant):
+    """Get the path of image_path for a density variant, if it exists.
+
+    :param image_path: Path to the mdpi image, e.g. images/weather-clear.png
+    :param variant: One of the variants in DPI_VARIANTS
+    """
+    variant_path = join(IMAGES_DIR, variant, basename(image_path))
+
+    return variant_path if exists(variant_path) else image_path
+
+
+def get_atlas_name(variant):
+    """Get the atlas file name, without extension, for a density variant."""
+    return join(IMAGES_DIR, '{n}-{v}'.format(n=ATLAS_NAME, v=variant))
+
+
+def build_atlases(image_paths, size=1024, force=False):
+    """Pack image_paths into one atlas per density variant.
+
+    Atlases newer than all of their images are kept, unless force is set.
+    Returns the paths of the atlases built.
+    :param image_paths: Paths to the mdpi images
+    :param size: Size of the atlas pages
+    :param force: Rebuild up to date atlases too
+    """
+    image_paths = sorted(set(image_paths))
+    built = []
+    for _, variant in DPI_VARIANTS:
+        atlas_name = get_atlas_name(variant)
+        sources = [get_variant_image(path, variant) for path in image_paths]
+        if (not force and exists(atlas_name + '.atlas') and
+                getmtime(atlas_name + '.atlas') >=
+                max(getmtime(path) for path in sources)):
+            continue
+
+        Atlas.create(atlas_name, sources, size)
+        built.append(atlas_name + '.atlas')
+
+    return built
+
+
+class WeatherImages(object):
+    """Map weather image paths to atlas sources and keep them preloaded."""
+
+    def __init__(self, image_paths, density=None):
+        """Initialize WeatherImages objects.
+
+        :param image_paths: Paths to the weather images
+        :param density: Screen density, default to the current one
+        """
+        variant = get_dpi_variant(density)
+        atlas_name = self.atlas_name = get_atlas_name(variant)
+        self.atlas_path = atlas_name + '.atlas'
+
+        # Image path -> source used by Image widgets
+        self.sources = {}
+        for path in set(image_paths):
+            if exists(self.atlas_path):
+                self.sources[path] = 'atlas://{a}/{i}'.format(
+                    a=atlas_name, i=splitext(basename(path))[0])
+            else:
+                self.sources[path] = get_variant_image(path, variant)
+
+        # Keep loaded images referenced so they are never decoded again
+        self._images = []
+        self._atlas = None
+
+    def get_source(self, image_path):
+        """Get the source to use for image_path."""
+        return self.sources.get(image_path, image_path)
+
+    def preload(self, *args):
+        """Decode all weather images ahead of their first use.
+
+        Meant to be scheduled with Clock once the app starts. Images, the
+        atlas pages or the loose images if there is no atlas, are decoded in
+        the background by Kivy's Loader. Once the pages are in, the atlas is
+        put in Kivy's atlas cache, built from their cached textures.
+        :param args: For binding purpose only
+        """
+        # Delete the args parameter cause we don't use it
+        del args
+
+        if not exists(self.atlas_path):
+            self._images = [Loader.image(source) for source in
+                            set(self.sources.itervalues())]
+            return
+
+        # Atlas.load looks its pages up by this same path
+        with open(self.atlas_path) as atlas_file:
+            pages = [join(dirname(self.atlas_path), page)
+                     for page in json.load(atlas_file)]
+
+        self._images = [Loader.image(page) for page in pages]
+        for image in self._images:
+            if image.loaded:
+                self._on_page_loaded(image)
+            else:
+                image.bind(on_load=self._on_page_loaded)
+
+    def _on_page_loaded(self, image):
+        """Cache the atlas once all its pages are decoded.
+
+        :param image: ProxyImage of the page just loaded
+        """
+        # Upload the page, caching its texture for Atlas to pick up
+        image.texture
+
+        if self._atlas is None and all(page.loaded
+                                       for page in self._images):
+            self._atlas = Atlas(self.atlas_path)
+            Cache.append('kv.atlas', self.atlas_name, self._atlas)
+
+
+if __name__ == '__main__':
+    from .core.statuses import STATUSES
+    build_atlases(STATUSES.icons.values())
@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+
+# loadtest.py
+#
+# Copyright 2015
+# Leodanis Pozo Ramos <lpozo@openmailbox.org>
+# Ozkar L. Garcell <ozkar.garcell@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""End-to-end refresh latency and memory soak harness.
+
+Drives the headless ForecastPipeline against a feed URL, usually a
+StandInServer, refresh after refresh, and reports the percentiles of:
+    time to stored: from the start of a refresh until its records are in
+        the store
+    time to UI: until the views built on every ingest are rebuilt too, the
+        JSON API responses and the ForecastViews the UI renders from, and
+        the upcoming forecasts of the changed stations are read back as the
+        UI shows them
+
+run_soak refreshes the same way many more times, sampling the memory of the
+process with a MemoryProfiler, to check it stays flat.
+
+Run them with: python cli.py loadtest, and python cli.py soak
+"""
+
+import datetime
+import math
+import time
+from collections import OrderedDict
+
+from .core.api import ForecastResponses
+from .core.circuit import CircuitBreaker
+from .core.memprofile import MemoryProfiler
+from .core.pipeline import ForecastPipeline
+from .core.providers.cubanweather import CubanWeatherProvider
+from .core.proxy import ProxySession
+from .core.singleflight import SingleFlight
+from .core.store import PrognosStore
+from .utils import get_today_date
+from .views import ForecastViews
+
+
+# Percentiles reported
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(values, percent):
+    """Get the nearest-rank percentile of values, None if empty.
+
+    :param values: Sorted list of numbers
+    :param percent: Percentile, 0 to 100
+    """
+    if not values:
+        return None
+
+    rank = int(math.ceil(percent / 100.0 * len(values))) - 1
+
+    return values[max(0, min(rank, len(values) - 1))]
+
+
+def _apply_views(changeset, views, responses):
+    """Apply a changeset to what the UI and API build from the store.
+
+    Returns the number of upcoming forecasts of the changed stations, read
+    back with their temperatures as CubanWeather displays them.
+    """
+    views.apply(changeset)
+    responses.apply(changeset, datetime.date.today())
+
+    today = get_today_date(int_format=True)
+    shown = 0
+    for location in changeset.locations:
+        for row in views.get_upcoming(location, today):
+            views.get_temperatures(row)
+            shown += 1
+
+    return shown
+
+
+def _build_pipeline(url, refreshes, proxy, store, read_timeout):
+    """Build a pipeline refreshing from url for a harness run."""
+    provider = CubanWeatherProvider(
+        feed_urls=[url], read_timeout=read_timeout, max_retries=0,
+        breaker=CircuitBreaker(failure_threshold=refreshes + 1))
+    if proxy is not None:
+        host, port, user, password = proxy
+        session = ProxySession(host=host, port=port)
+        session.set_credentials(user=user, password=password)
+        provider.clients[0].set_proxy_session(session)
+
+    # Don't coalesce the refreshes, every one of them counts
+    return ForecastPipeline(store=store,
+                            providers=[provider],
+                            flights=SingleFlight(min_interval=0),
+                            deadline=read_timeout)
+
+
+def run_latency(url, refreshes=100, interval=0.0, proxy=None,
+                database_path=':memory:', read_timeout=30, report=None):
+    """Refresh from url refreshes times, timing every refresh.
+
+    Every refresh downloads, parses and diffs the feed even if it didn't
+    change, then stores and applies only what changed. Returns an
+    OrderedDict with the refresh, stored and failure counts, the number of
+    forecasts shown and the PERCENTILES of time to stored and time to UI in
+    seconds.
+    :param url: URL of the feed
+    :param refreshes: Number of refreshes
+    :param interval: Seconds between refreshes
+    :param proxy: (host, port, user, password) of a proxy to go through
+    :param database_path: DB to store into
+    :param read_timeout: Seconds to wait for a whole feed
+    :param report: Called as report(number, time_to_stored, time_to_ui)
+    after every refresh, the times being None if nothing was stored
+    """
+    store = PrognosStore(database_path=database_path)
+    pipeline = _build_pipeline(url, refreshes, proxy, store, read_timeout)
+    views = ForecastViews()
+    responses = ForecastResponses()
+    marks = {}
+    errors = []
+
+    def on_changed(changeset):
+        """Time the ingest and the views it updates."""
+        marks['stored'] = time.time()
+        marks['shown'] = _apply_views(changeset, views, responses)
+        marks['ui'] = time.time()
+
+    def on_stored(records):
+        """Time an ingest that changed nothing."""
+        del records
+        now = time.time()
+        marks.setdefault('stored', now)
+        marks.setdefault('ui', now)
+
+    pipeline.bind(on_changed=on_changed, on_stored=on_stored,
+                  on_error=errors.append)
+
+    stored_times = []
+    ui_times = []
+    shown = 0
+    try:
+        for number in xrange(refreshes):
+            marks.clear()
+            pipeline.last_digests.clear()
+
+            started = time.time()
+            pipeline.refresh(force=True)
+
+            if 'ui' in marks:
+                stored_times.append(marks['stored'] - started)
+                ui_times.append(marks['ui'] - started)
+                shown += marks.get('shown', 0)
+            if report is not None:
+                report(number, stored_times[-1] if 'ui' in marks else None,
+                       ui_times[-1] if 'ui' in marks else None)
+
+            if interval:
+                time.sleep(interval)
+    finally:
+        store.close_connection()
+
+    stored_times.sort()
+    ui_times.sort()
+
+    summary = OrderedDict([('refreshes', refreshes),
+                           ('stored', len(stored_times)),
+                           ('failures', len(errors)),
+                           ('shown', shown)])
+    for name, times in (('time_to_stored', stored_times),
+                        ('time_to_ui', ui_times)):
+        summary[name] = OrderedDict(('p{p}'.format(p=percent),
+                                     percentile(times, percent))
+                                    for percent in PERCENTILES)
+
+    return summary
+
+
+def run_soak(url, refreshes=10000, sample_every=100, warmup=0.1,
+             proxy=None, database_path=':memory:', read_timeout=30,
+             profiler=None, report=None):
+    """Refresh from url refreshes times, sampling the memory of the process.
+
+    Every refresh downloads, parses and stores the feed, and updates the
+    views, as run_latency does. Returns an OrderedDict with the refresh and
+    failure counts, the memory in bytes once warmed up and at the end, its
+    growth in between and the samples, as (refresh, memory, objects).
+    :param url: URL of the feed
+    :param refreshes: Number of refreshes
+    :param sample_every: Refreshes between memory samples
+    :param warmup: Fraction of the refreshes before the baseline sample
+    :param proxy: (host, port, user, password) of a proxy to go through
+    :param database_path: DB to store into
+    :param read_timeout: Seconds to wait for a whole feed
+    :param profiler: MemoryProfiler to sample with, a new one by default
+    :param report: Called with every sample, the dict
+    MemoryProfiler.snapshot returns
+    """
+    if profiler is None:
+        profiler = MemoryProfiler()
+
+    store = PrognosStore(database_path=database_path)
+    pipeline = _build_pipeline(url, refreshes, proxy, store, read_timeout)
+    views = ForecastViews()
+    responses = ForecastResponses()
+    errors = []
+
+    pipeline.bind(on_changed=lambda changeset: _apply_views(changeset, views,
+                                                            responses),
+                  on_error=lambda error: errors.append(repr(error)))
+
+    warmup_refreshes = max(1, int(refreshes * warmup))
+    samples = []
+    baseline = None
+    profiler.start()
+    try:
+        for number in xrange(1, refreshes + 1):
+            pipeline.last_digests.clear()
+            pipeline.refresh(force=True)
+
+            if number == warmup_refreshes or number % sample_every == 0 or \
+                    number == refreshes:
+                snapshot = profiler.snapshot(
+                    label='refresh {n}'.format(n=number))
+                samples.append((number, snapshot['memory'],
+                                snapshot['objects']))
+                if number == warmup_refreshes:
+                    baseline = snapshot['memory']
+                if report is not None:
+                    report(snapshot)
+    finally:
+        profiler.stop()
+        store.close_connection()
+
+    final = samples[-1][1]
+
+    return OrderedDict([('refreshes', refreshes),
+                        ('failures', len(errors)),
+                        ('baseline', baseline),
+                        ('final', final),
+                        ('growth', final - baseline),
+                        ('samples', samples)])
@@ -23,11 +23,13 @@
 """
 """
 
+import json
 from os import makedirs
-from os.path import expanduser, join, exists
+from os.path import dirname, expanduser, join, exists
 
 from kivy import platform
 from kivy.app import App
+from kivy.clock import Clock
 from kivy.core.window import Window
 from kivy.lang import Builder
 from kivy.properties import ObjectProperty
@@ -35,8 +37,11 @@ from kivy.uix.anchorlayout import AnchorLayout
 from kivy.uix.settings import SettingsWithSidebar
 
 from .aboutdialog import AboutDialog
+from .core.metrics import metrics
+from .core.metrics import traced
+from .imagecache import WeatherImages
+from .watchdog import StallWatchdog
 from .msgbox import MsgBox
-from .utils import convert_temp
 from .utils import get_current_date
 from .weather import CubanWeather
 
@@ -67,6 +72,10 @@ class PrognosRoot(AnchorLayout, object):
         # Instance of CubanWeather class
         self.cuban_weather = CubanWeather(self.prognos_app)
 
+        # Coalesce UI updates requested within the same frame
+        self._update_ui_trigger = Clock.create_trigger(
+            lambda dt: self.update_ui(self.cuban_weather.weather_forecast))
+
         self.update_prognos(
             location_=self.prognos_app.location,
             weather_forecast_=self.cuban_weather.weather_forecast)
@@ -100,13 +109,13 @@ class PrognosRoot(AnchorLayout, object):
                                   unicode(weather_status))
 
     def _set_temp(self, temp, label, hour):
-        """Set the min and max temperature in the UI."""
-        if self.cuban_weather.weather_forecast[temp]:
-            temp_ = int(self.cuban_weather.weather_forecast[temp])
-            temp_ = convert_temp(temp_value=temp_,
-                                 to_temp=self.prognos_app.temp_unit[:-3])
-        else:
-            temp_ = 0
+        """Set the min and max temperature in the UI.
+
+        Temperatures are precomputed in every unit at ingest, so this is only
+        a lookup.
+        """
+        temp_ = self.cuban_weather.weather_forecast['temps'][
+            self.prognos_app.temp_unit][temp]
 
         label.text = (hour + ' ' + unicode(temp_) + ' ' +
                       self.prognos_app.temp_unit[-2:])
@@ -128,6 +137,7 @@ class PrognosRoot(AnchorLayout, object):
         # Update UI
         self.update_ui(weather_forecast=weather_forecast_)
 
+    @traced('ui.update')
     def update_ui(self, weather_forecast):
         """Update all elements in the UI.
 
@@ -144,8 +154,8 @@ class PrognosRoot(AnchorLayout, object):
         self._set_weather_status(weather_forecast['weather_status'])
 
         # Then the main weather image
-        self.set_weather_image(image_path=self.cuban_weather.weather_statuses[
-            weather_forecast['weather_status']])
+        self.set_weather_image(image_path=self.cuban_weather.vocabulary.icon(
+            weather_forecast['weather_status']))
 
         # Then the minimum temperature label
         self._set_temp(temp='night_temp',
@@ -157,6 +167,13 @@ class PrognosRoot(AnchorLayout, object):
                        label=self.max_temp_label,
                        hour=u'En la tarde:')
 
+    def schedule_update_ui(self):
+        """Update the UI with the current forecast on the next frame.
+
+        Several calls within the same frame result in a single update.
+        """
+        self._update_ui_trigger()
+
     def set_weather_image(self, image_path, *args):
         """Set the weather image in the UI.
 
@@ -166,7 +183,8 @@ class PrognosRoot(AnchorLayout, object):
         # Delete the args parameter cause we don't use it
         del args
 
-        self.weather_image.source = image_path
+        self.weather_image.source = (
+            self.prognos_app.weather_images.get_source(image_path))
 
     def update_weather_forecast(self):
         """Update the weather forecast information in the UI."""
@@ -223,12 +241,35 @@ class PrognosApp(App, object):
         self.host = u''
         self.port = u''
         self.use_proxy = False
+        self.weather_images = None
+        self.watchdog = None
 
     def _on_close(self):
         """Triggered when app/window is closed to close DB connection."""
+        # Stop the instrumentation if it is running
+        self._set_instrumentation(enabled=False)
+
         # Close prognos_db connection on window close or app exit
         self.root.cuban_weather.prognos_db.close_connection()
 
+    def _set_instrumentation(self, enabled):
+        """Start or stop the main-thread stall watchdog and the metrics.
+
+        :param enabled: True to start them, False to stop them.
+        """
+        if enabled:
+            if self.watchdog is None:
+                self.watchdog = StallWatchdog(log_path=join(
+                    dirname(self.get_application_config()),
+                    'instrumentation.log'))
+            self.watchdog.start()
+            metrics.enable(dirname(self.get_application_config()))
+        else:
+            if self.watchdog is not None:
+                self.watchdog.stop()
+            metrics.export()
+            metrics.disable()
+
     def build_config(self, config):
         """Build the Prognos' config and set default values."""
         config.setdefaults('general', {
@@ -242,6 +283,10 @@ class PrognosApp(App, object):
             'port_': u''
         })
 
+        config.setdefaults('debug', {
+            'instrumentation_': '0'
+        })
+
     def build(self):
         """Build Prognos application."""
         # App icon
@@ -267,16 +312,32 @@ class PrognosApp(App, object):
         else:
             self.port = self.config.get('network', 'port_')
 
+        # Weather images, preloaded right after the first frame
+        self.weather_images = WeatherImages(
+            CubanWeather.vocabulary.icons.values())
+        Clock.schedule_once(self.weather_images.preload)
+
         # Root widget
         self.root = PrognosRoot(self)
 
+        # Opt-in frame time and stall instrumentation
+        self._set_instrumentation(
+            enabled=bool(int(self.config.get('debug', 'instrumentation_'))))
+
         return self.root
 
     def build_settings(self, settings):
         """Build Prognos' settings panel."""
+        # The location options come from the station catalog
+        with open('prognos/prognos.json') as panel_file:
+            panel = json.load(panel_file)
+        for setting in panel:
+            if setting.get('key') == 'location_':
+                setting['options'] = self.root.cuban_weather.catalog.names
+
         settings.add_json_panel('Prognos',
                                 self.config,
-                                'prognos/prognos.json')
+                                data=json.dumps(panel))
         settings.interface.menu.width = 150
         settings.interface.menu.close_button.text = 'OK'
         settings.interface.content.current_panel.children[0].disabled = (
@@ -290,20 +351,16 @@ class PrognosApp(App, object):
             token = (section, key)
             if token == ('general', 'location_'):
                 self.location = value
-                # On location change Update UI if forecast info is available
-                # in DB, else use default info
-                if self.root.cuban_weather.prognos_db.current_forecast_in_db(
-                        location_=self.location):
-                    self.root.cuban_weather.fetch_weather_locally(
-                        self.location)
-                else:
-                    self.root.cuban_weather.set_default_forecast_data()
-
-                self.root.update_ui(self.root.cuban_weather.weather_forecast)
+                # On location change Update UI with the forecast in the
+                # station index, or with default info if there is none
+                self.root.cuban_weather.select_location(self.location)
+                self.root.schedule_update_ui()
             elif token == ('general', 'temp_unit_'):
                 self.temp_unit = value
                 # On temperature unit change, update UI
-                self.root.update_ui(self.root.cuban_weather.weather_forecast)
+                self.root.schedule_update_ui()
+            elif token == ('debug', 'instrumentation_'):
+                self._set_instrumentation(enabled=bool(int(value)))
             elif token == ('network', 'use_proxy_'):
                 self.use_proxy = bool(int(value))
                 self._app_settings.interface.content.current_panel.\
@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+
+# standin.py
+#
+# Copyright 2015
+# Leodanis Pozo Ramos <lpozo@openmailbox.org>
+# Ozkar L. Garcell <ozkar.garcell@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Local stand-in for the Met site, and an authenticating proxy.
+
+StandInServer serves recorded or synthetic feeds at any path, with
+configurable latency, bandwidth, error rate and truncated bodies, so the
+refresh path can be measured in the lab without hitting met.inf.cu.
+StandInProxy is an HTTP forward proxy asking for Basic credentials.
+
+Run them with: python cli.py standin
+"""
+
+import base64
+import gzip
+import httplib
+import logging
+import random
+import threading
+import time
+import urllib2
+from BaseHTTPServer import BaseHTTPRequestHandler
+from BaseHTTPServer import HTTPServer
+from SocketServer import ThreadingMixIn
+from cStringIO import StringIO
+
+
+logger = logging.getLogger('prognos.standin')
+
+# Size of the chunks written to clients
+CHUNK_SIZE = 4 * 1024
+
+
+def _gzip(content):
+    """Compress content with gzip."""
+    buffer_ = StringIO()
+    with gzip.GzipFile(fileobj=buffer_, mode='wb') as gzip_file:
+        gzip_file.write(content)
+
+    return buffer_.getvalue()
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    """Serve the next feed of the server, the way the server is set up."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        content, error, truncate = server.next_response()
+
+        if server.latency:
+            time.sleep(server.latency)
+
+        if error:
+            self.send_response(503)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/rss+xml')
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            content = server.compressed[content]
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+
+        # Truncated responses stop halfway and drop the connection
+        end = len(content) // 2 if truncate else len(content)
+        for start in xrange(0, end, CHUNK_SIZE):
+            chunk = content[start:min(start + CHUNK_SIZE, end)]
+            self.wfile.write(chunk)
+            if server.bandwidth:
+                time.sleep(len(chunk) / float(server.bandwidth))
+
+        if truncate:
+            self.close_connection = True
+
+    def log_message(self, format_, *args):
+        logger.debug(format_, *args)
+
+
+class StandInServer(ThreadingMixIn, HTTPServer):
+    """Threaded HTTP server standing in for the Met site."""
+
+    daemon_threads = True
+
+    def __init__(self, address, feeds, latency=0.0, bandwidth=0,
+                 error_rate=0.0, truncate_rate=0.0, seed=0):
+        """Initialize StandInServer objects.
+
+        :param address: (host, port) to listen on, port 0 picks a free one
+        :param feeds: Feed contents, served in turn
+        :param latency: Seconds to wait before answering
+        :param bandwidth: Bytes per second of the body, 0 for no limit
+        :param error_rate: Fraction of requests answered with a 503
+        :param truncate_rate: Fraction of bodies cut halfway
+        :param seed: Seed of the errors and truncations
+        """
+        HTTPServer.__init__(self, address, _StandInHandler)
+        self.feeds = list(feeds)
+        self.compressed = dict((content, _gzip(content))
+                               for content in self.feeds)
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.error_rate = error_rate
+        self.truncate_rate = truncate_rate
+        self.requests = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        """Get the URL of the feed."""
+        return 'http://{h}:{p}/asp/genesis.asp?TB0=RSSFEED'.format(
+            h=self.server_address[0], p=self.server_address[1])
+
+    def next_response(self):
+        """Get (content, error, truncate) for the next request."""
+        with self._lock:
+            content = self.feeds[self.requests % len(self.feeds)]
+            self.requests += 1
+            draw = self._random.random()
+
+        return (content,
+                draw < self.error_rate,
+                self.error_rate <= draw < self.error_rate + self.truncate_rate)
+
+
+class _ProxyHandler(BaseHTTPRequestHandler):
+    """Forward GET requests for absolute URLs to their host."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        credentials = 'Basic ' + base64.b64encode(self.server.credentials)
+        if self.headers.get('Proxy-Authorization') != credentials:
+            self.server.rejected += 1
+            self.send_response(407)
+            self.send_header('Proxy-Authenticate', 'Basic realm="prognos"')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        headers = dict((name, value) for name, value in
+                       self.headers.items()
+                       if name.lower() not in ('proxy-authorization',
+                                               'proxy-connection',
+                                               'connection', 'host'))
+        try:
+            response = self.server.opener.open(
+                urllib2.Request(self.path, headers=headers), timeout=30)
+        except urllib2.HTTPError as error:
+            response = error
+        except urllib2.URLError:
+            self.send_response(502)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        try:
+            body = response.read()
+        except (IOError, httplib.HTTPException):
+            # Upstream dropped the connection, so do we
+            self.close_connection = True
+            return
+        finally:
+            response.close()
+
+        self.send_response(response.getcode())
+        for name in ('Content-Type', 'Content-Encoding'):
+            if response.info().get(name):
+                self.send_header(name, response.info()[name])
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format_, *args):
+        logger.debug(format_, *args)
+
+
+class StandInProxy(ThreadingMixIn, HTTPServer):
+    """Threaded HTTP forward proxy asking for Basic credentials."""
+
+    daemon_threads = True
+
+    def __init__(self, address, user, password):
+        """Initialize StandInProxy objects.
+
+        :param address: (host, port) to listen on, port 0 picks a free one
+        :param user: User name clients must send
+        :param password: Password clients must send
+        """
+        HTTPServer.__init__(self, address, _ProxyHandler)
+        self.credentials = '{u}:{p}'.format(u=user, p=password)
+        self.opener = urllib2.build_opener(urllib2.ProxyHandler({}))
+        self.rejected = 0
+
+
+def serve_in_background(server):
+    """Serve server's requests in a daemon thread, returning the thread."""
+    thread = threading.Thread(target=server.serve_forever,
+                              name='prognos-standin')
+    thread.daemon = True
+    thread.start()
+
+    return thread
@@ -26,20 +26,49 @@
 import time
 
 
+# Temperature units as shown in settings and the name convert_temp uses
+TEMP_UNITS = ((u'Celsius ºC', 'Celsius'),
+              (u'Fahrenheit ºF', 'Fahrenheit'))
+
+
+def _fahrenheit_to_celsius(temp_value):
+    return round((temp_value - 32.0) * 5.0 / 9.0)
+
+
+def _celsius_to_fahrenheit(temp_value):
+    return round((temp_value * 9.0 / 5) + 32)
+
+
 def convert_temp(temp_value=0.0, from_temp='Celsius', to_temp='Fahrenheit'):
     """Convert temperature from celsius to fahrenheit and vice versa.
 
-    :param temp_value: temperature value
+    :param temp_value: temperature value, or a list/tuple of values to convert
+    a whole column at once (a list is returned in that case)
     :param from_temp: Celsius or Fahrenheit
     :param to_temp: Celsius or Fahrenheit
     """
-
+    # Pick the conversion once, not once per value
     if from_temp == 'Fahrenheit' and to_temp == 'Celsius':
-        return round((temp_value - 32.0) * 5.0 / 9.0)
+        convert = _fahrenheit_to_celsius
     elif from_temp == 'Celsius' and to_temp == 'Fahrenheit':
-        return round((temp_value * 9.0 / 5) + 32)
+        convert = _celsius_to_fahrenheit
     else:
-        return round(temp_value)
+        convert = round
+
+    if isinstance(temp_value, (list, tuple)):
+        return [convert(value) for value in temp_value]
+
+    return convert(temp_value)
+
+
+def dual_temps(temp_values):
+    """Convert a column of celsius temperatures into every display unit.
+
+    Returns a dict mapping each unit in TEMP_UNITS to a list of int values.
+    :param temp_values: list or tuple of celsius temperatures
+    """
+    return dict((unit, [int(value) for value in convert_temp(
+        temp_values, to_temp=name)]) for unit, name in TEMP_UNITS)
 
 
 def get_today_date(int_format=False):
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+
+# views.py
+#
+# Copyright 2015
+# Leodanis Pozo Ramos <lpozo@openmailbox.org>
+# Ozkar L. Garcell <ozkar.garcell@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module containing the ForecastViews class.
+
+In-memory views the UI renders from, kept free of Kivy so the load test
+harness and the benchmarks drive the very same code as the app.
+"""
+
+from collections import OrderedDict
+
+from .core.diff import apply_to_index
+from .core.metrics import metrics
+from .core.statuses import STATUSES
+from .utils import dual_temps
+from .utils import TEMP_UNITS
+
+
+def convert_temperatures(forecast_data, vocabulary=STATUSES):
+    """Compute the temperatures of forecast_data in every unit.
+
+    Returns a dict mapping (location, year, month, day) to a dict of unit ->
+    {'day_temp': ..., 'night_temp': ...}. Missing temperatures (0, or a
+    status the vocabulary takes for unavailable) are kept as 0 in every
+    unit.
+    :param forecast_data: List of tuples in the layout that
+    store_weather_forecast_data expects.
+    :param vocabulary: StatusVocabulary to tell unavailable statuses with
+    """
+    # Convert whole columns at once
+    day_temps = dual_temps([row[4] for row in forecast_data])
+    night_temps = dual_temps([row[5] for row in forecast_data])
+
+    temperatures = {}
+    for i, row in enumerate(forecast_data):
+        available = (vocabulary.lookup(row[6]).id !=
+                     vocabulary.default.id)
+        temperatures[(row[3],) + tuple(row[:3])] = dict(
+            (unit, {'day_temp': (day_temps[unit][i]
+                                 if available and row[4] else 0),
+                    'night_temp': (night_temps[unit][i]
+                                   if available and row[5] else 0)})
+            for unit, _ in TEMP_UNITS)
+
+    return temperatures
+
+
+class ForecastViews(object):
+    """Forecast records indexed by location and date, and their
+    temperatures in every unit.
+
+    Full loads build them from scratch, ingests only apply what changed.
+    """
+
+    def __init__(self, vocabulary=STATUSES):
+        """Initialize ForecastViews objects.
+
+        :param vocabulary: StatusVocabulary to tell unavailable statuses with
+        """
+        self.vocabulary = vocabulary
+
+        # Location -> OrderedDict of (year, month, day) -> record, sorted by
+        # date, so current and upcoming forecasts are dict lookups instead
+        # of DB queries
+        self.station_index = {}
+
+        # Temperatures in every unit, keyed by (location, year, month, day),
+        # so the same day of two months never shares an entry
+        self.temperatures = {}
+
+    @property
+    def records(self):
+        """Get all the indexed records."""
+        return [record for dates in self.station_index.itervalues()
+                for record in dates.itervalues()]
+
+    def load(self, forecast_data):
+        """Build the views of all of forecast_data.
+
+        :param forecast_data: List of tuples in the layout that
+        store_weather_forecast_data expects.
+        """
+        with metrics.span('ui.index'):
+            index = {}
+            for row in sorted(forecast_data):
+                index.setdefault(row[3], OrderedDict())[row[:3]] = row
+
+            self.station_index = index
+            self.temperatures = convert_temperatures(forecast_data,
+                                                     self.vocabulary)
+
+    def apply(self, changeset):
+        """Update the views with what an ingest changed.
+
+        Only the locations in changeset are reindexed and only its added and
+        changed records are converted. Returns the temperatures converted.
+        :param changeset: diff.Changeset of the stored records
+        """
+        with metrics.span('ui.index'):
+            apply_to_index(self.station_index, changeset)
+            for record in changeset.removals:
+                self.temperatures.pop((record[3],) + tuple(record[:3]), None)
+            temperatures = convert_temperatures(changeset.upserts,
+                                                self.vocabulary)
+            self.temperatures.update(temperatures)
+
+        return temperatures
+
+    def get_record(self, location, date):
+        """Get the record of location for date, None if there is none.
+
+        :param location: Location of the record
+        :param date: (year, month, day) of the record
+        """
+        return self.station_index.get(location, {}).get(date)
+
+    def get_upcoming(self, location, today):
+        """Get the records of location from today on.
+
+        :param location: Location to get the records for
+        :param today: (year, month, day) of today
+        """
+        return [row for date, row in
+                self.station_index.get(location, {}).iteritems()
+                if date >= today]
+
+    def get_temperatures(self, record):
+        """Get the precomputed temperatures of a forecast in every unit.
+
+        Forecasts missing from the cache are converted and cached on the fly.
+        :param record: Tuple in the layout that store_weather_forecast_data
+        expects.
+        """
+        key = (record[3],) + tuple(record[:3])
+        if key in self.temperatures:
+            metrics.incr('cache.temperatures.hits')
+        else:
+            metrics.incr('cache.temperatures.misses')
+            self.temperatures.update(convert_temperatures([record],
+                                                          self.vocabulary))
+
+        return self.temperatures[key]
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+
+# watchdog.py
+#
+# Copyright 2015
+# Leodanis Pozo Ramos <lpozo@openmailbox.org>
+# Ozkar L. Garcell <ozkar.garcell@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module containing the StallWatchdog class.
+
+The watchdog records frame times through the Kivy Clock and, from a
+background thread, detects when the main thread stops ticking for longer than
+a threshold. The main thread's Python stack is captured while it is stalled,
+so blocking calls (sqlite, network I/O) show up in the log.
+"""
+
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from logging.handlers import RotatingFileHandler
+
+from kivy.clock import Clock
+from kivy.core.window import Window
+from kivy.uix.label import Label
+
+
+class StallWatchdog(object):
+    """Main-thread stall detector and frame-time recorder."""
+
+    def __init__(self, log_path, threshold=0.25, frames=300):
+        """Initialize StallWatchdog objects.
+
+        :param log_path: Path to the rotating log file
+        :param threshold: Seconds without a frame to consider a stall
+        :param frames: Number of recent frame times to keep
+        """
+        self.threshold = threshold
+        self.frame_times = deque(maxlen=frames)
+        self.stalls = 0
+
+        self.logger = logging.getLogger('prognos.watchdog')
+        self.logger.propagate = False
+        self.logger.setLevel(logging.INFO)
+        if not self.logger.handlers:
+            handler = RotatingFileHandler(log_path,
+                                          maxBytes=512 * 1024,
+                                          backupCount=3)
+            handler.setFormatter(logging.Formatter(
+                '%(asctime)s %(levelname)s %(message)s'))
+            self.logger.addHandler(handler)
+
+        self.overlay = Label(size_hint=(None, None),
+                             size=(400, 30),
+                             font_size=14,
+                             color=(1, 1, 0, 1))
+
+        self._heartbeat = time.time()
+        self._stall_stack = None
+        self._main_thread_id = None
+        self._running = False
+        self._thread = None
+        self._stop_event = None
+
+    def _on_frame(self, dt):
+        """Record a frame time and report the end of a stall."""
+        self.frame_times.append(dt)
+        self._heartbeat = time.time()
+
+        stack = self._stall_stack
+        if stack is not None:
+            self._stall_stack = None
+            self.stalls += 1
+            self.logger.warning(
+                'Main thread stalled for %.0f ms in:\n%s', dt * 1000, stack)
+
+    def _update_overlay(self, *args):
+        """Show frame stats on screen."""
+        # Delete the args parameter cause we don't use it
+        del args
+
+        if not self.frame_times:
+            return
+
+        mean = sum(self.frame_times) / len(self.frame_times)
+        self.overlay.text = (
+            u'fps: {fps:.0f}  frame: {mean:.0f} ms  max: {max:.0f} ms  '
+            u'stalls: {stalls}').format(fps=1.0 / mean if mean else 0,
+                                        mean=mean * 1000,
+                                        max=max(self.frame_times) * 1000,
+                                        stalls=self.stalls)
+        self.overlay.pos = (0, Window.height - self.overlay.height)
+
+    def _monitor(self, stop_event):
+        """Capture the main thread stack while it is stalled.
+
+        :param stop_event: threading.Event set to stop this thread
+        """
+        while not stop_event.wait(self.threshold / 2.0):
+            if (self._stall_stack is None and
+                    time.time() - self._heartbeat > self.threshold):
+                frame = sys._current_frames().get(self._main_thread_id)
+                if frame is not None:
+                    self._stall_stack = ''.join(traceback.format_stack(frame))
+
+    def start(self):
+        """Start the watchdog. Must be called from the main thread."""
+        if self._running:
+            return
+
+        self._running = True
+        self._main_thread_id = threading.current_thread().ident
+        self._heartbeat = time.time()
+
+        Clock.schedule_interval(self._on_frame, 0)
+        Clock.schedule_interval(self._update_overlay, 1)
+        Window.add_widget(self.overlay)
+
+        # Every thread gets its own event, so a restart never revives the
+        # thread of a previous start
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._monitor,
+                                        args=(self._stop_event,),
+                                        name='prognos-watchdog')
+        self._thread.daemon = True
+        self._thread.start()
+
+        self.logger.info('Watchdog started, threshold %.0f ms',
+                         self.threshold * 1000)
+
+    def stop(self):
+        """Stop the watchdog."""
+        if not self._running:
+            return
+
+        self._running = False
+        self._stop_event.set()
+        self._thread.join()
+        self._thread = None
+
+        Clock.unschedule(self._on_frame)
+        Clock.unschedule(self._update_overlay)
+        Window.remove_widget(self.overlay)
+
+        self.logger.info('Watchdog stopped after %d stalls', self.stalls)
@@ -20,16 +20,27 @@
 
 """Module containing the CubanWeather class."""
 
-import itertools
-import re
-import urllib2
-import datetime
-from lxml import etree
-from collections import OrderedDict
+import threading
 from functools import partial
 
+from kivy.clock import Clock
+
+from .core.feed import CircuitOpenError
+from .core.feed import FeedError
+from .core.feed import ProxyAuthError
+from .core.leader import LeaderLock
+from .core.diff import diff_records
+from .core.metrics import metrics
+from .core.pipeline import ForecastPipeline
+from .core.providers.base import load_providers
+from .core.providers.cubanweather import CubanWeatherProvider
+from .core.proxy import ProxySession
+from .core.statuses import UNAVAILABLE
+from .core.transform import default_records
 from .utils import get_current_date
-from .utils import convert_temp
+from .utils import get_today_date
+from .utils import TEMP_UNITS
+from .views import ForecastViews
 from .proxyauthdialog import ProxyAuthDialog
 from .msgbox import MsgBox
 from .database import PrognosDB
@@ -38,34 +49,18 @@ from .forecastdialog import ExtendedForecastDialog
 
 
 class CubanWeather(object):
-    """Cuban Weather class."""
-
-    # Locations tuple for avoiding malformed xml
-    locations = (u'Pinar del Río',
-                 u'La Habana',
-                 u'Varadero',
-                 u'Cienfuegos',
-                 u'Cayo Coco',
-                 u'Camagüey',
-                 u'Holguín',
-                 u'Santiago de Cuba')
-
-    # OrderedDict to store weather statuses and deal with malformed xml
-    weather_statuses = OrderedDict([
-        (u'No disponible', u'images/weather-none-available.png'),
-        (u'Lluvias Ocasionales', u'images/weather-showers-scattered-day.png'),
-        (u'Lluvias dispersas', u'images/weather-showers-scattered-day.png'),
-        (u'Lluvias aisladas', u'images/weather-showers-scattered-day.png'),
-        (u'Isolated Showers', u'images/weather-showers-scattered-day.png'),
-        (u'Lluvias en la Tarde', u'images/weather-showers-scattered-night.png'),
-        (u'Chubascos', u'images/weather-showers-day.png'),
-        (u'Parcialmente Nublado', u'images/weather-few-clouds.png'),
-        (u'Partly Cloudy', u'images/weather-few-clouds.png'),
-        (u'Nublado', u'images/weather-many-clouds.png'),
-        (u'Soleado', u'images/weather-clear.png'),
-        (u'sunny', u'images/weather-clear.png'),
-        (u'Tormentas', u'images/weather-storm-day.png'),
-        (u'Vientos', u'images/weather-mist.png')])
+    """Cuban Weather class.
+
+    UI front end of the headless ForecastPipeline in prognos.core. All
+    knowledge about the Met feed lives in its provider,
+    CubanWeatherProvider.
+    """
+
+    # Provider of the forecast shown in the UI
+    provider = CubanWeatherProvider
+
+    # Weather statuses and their images, tolerant to malformed xml
+    vocabulary = provider.vocabulary
 
     def __init__(self, prognos_app):
         """Initialize CubanWeather objects."""
@@ -75,14 +70,47 @@ class CubanWeather(object):
         # Create a Database, a connection and a table
         self.prognos_db = PrognosDB()
 
+        # Only the leader process fetches and writes, see LeaderLock
+        self.leader = LeaderLock(self.prognos_db.lock_path)
+
+        # Generation of the data in the in-memory views
+        self.generation = None
+
+        # Fetch -> parse -> transform -> store pipeline
+        self.pipeline = ForecastPipeline(
+            store=self.prognos_db,
+            providers=load_providers([self.provider.name]))
+        self.pipeline.bind(on_changed=self._apply_changeset,
+                           on_error=self._show_connection_error)
+
+        # Stations shown in the UI, see StationCatalog
+        self.catalog = self.pipeline.providers[0].catalog
+        self.stations_count = len(self.catalog)
+
         # Initialize variables
-        self.xml_forecast_data = OrderedDict()
-        self.forecast_data = []
         self.weather_forecast = {}
 
+        # Station index and temperatures the UI renders from
+        self.views = ForecastViews(self.vocabulary)
+
         # Set default forecast data and store them in DB
         self.set_default_forecast_data()
 
+        # Index the data already in DB
+        self._load_forecast_data(self.prognos_db.get_forecast_data())
+
+        # Pick up data stored by other processes, e.g. the daemon
+        Clock.schedule_interval(self._check_generation, 10)
+
+        # Proxy session for the current proxy configuration
+        self.proxy_session = None
+
+        # Errors of the refresh in progress
+        self._fetch_errors = []
+
+        # Whether a refresh is running, taps meanwhile are ignored
+        self._refreshing = False
+
         # Dialog for proxy authentication
         self.proxy_auth_dialog = ProxyAuthDialog()
         self.proxy_auth_dialog.ok_button.bind(on_release=self._handle_proxy)
@@ -103,324 +131,324 @@ class CubanWeather(object):
         self.proxy_auth_dialog.user_text.text = u''
         self.proxy_auth_dialog.password_text.text = u''
 
-        # TODO: Fix the problem with scape characters in passwords
-        http_proxy_uri = ''.join([u'http://',
-                                  user,
-                                  u':',
-                                  r'%s' % password,
-                                  u'@',
-                                  self.prognos_app.host,
-                                  u':',
-                                  self.prognos_app.port])
-        proxy_handler = urllib2.ProxyHandler({'http': http_proxy_uri})
-        proxy_auth_handler = urllib2.ProxyBasicAuthHandler()
-
-        # Build and install an opener for using it globally
-        proxy_opener = urllib2.build_opener(proxy_handler,
-                                            proxy_auth_handler)
-        urllib2.install_opener(opener=proxy_opener)
+        # Keep the credentials for the session
+        self.proxy_session.set_credentials(user=user, password=password)
+        self._set_proxy_session(self.proxy_session)
 
         # Connect to weather site through the proxy
         self._connect_to_weather_site()
 
-    def _parse_weather_site_xml(self, xml_content):
-        """Parse the content of the weather site to get weather forecast data.
+    def _set_proxy_session(self, session):
+        """Fetch every feed through the proxy of session, or directly if
+        session is None."""
+        for client in self.pipeline.clients:
+            if session is None:
+                client.clear_proxy()
+            else:
+                client.set_proxy_session(session)
 
-        :param xml_content: Content of weather site xml file.
+    @staticmethod
+    def _show_connection_error(error):
+        """Show the error of a failed refresh.
+
+        :param error: FeedError or ParseError raised by the pipeline.
         """
-        tree_root = etree.fromstring(xml_content)
-
-        # Get forecast data
-        xml_descriptions = [element.text for element in tree_root.findall(
-            'channel/item/description')[1:-1]]
-
-        # Store forecast data in an OrderedDict
-        for item, value in itertools.izip(xml_descriptions, self.locations):
-            self.xml_forecast_data[value] = re.findall(
-                r'<td>\W*?.*?</td>', item)
-
-    def _transform_forecast_data(self):
-        """Transform forecast data into a list to be stored in DB."""
-        for key, value in self.xml_forecast_data.iteritems():
-            # Clean data from xml tags and spaces: ' </td>'
-            for i, item in enumerate(value):
-                self.xml_forecast_data[key][i] = self.xml_forecast_data[
-                    key][i].strip(' </td>')
-
-            # Insert locations
-            for i in xrange(0, len(value) + 1, 5):
-                self.xml_forecast_data[key].insert(i, key)
-
-            # Fill in empty (u'') items with default values:
-            # u'0', u'0', u'0', u'No disponible'
-            for i in xrange(len(value)):
-                if not self.xml_forecast_data[key][i]:
-                    if i not in range(4, len(value), 5):
-                        self.xml_forecast_data[key][i] = u'0'
-                    else:
-                        self.xml_forecast_data[key][i] = (
-                            self.weather_statuses.keys()[0])
-
-        # Put values in a list
-        data = []
-        for value in self.xml_forecast_data.values():
-            data += value
-
-        # List of tuples containing forecast data
-        online_data = [(data[i],  # Location
-                        u'%s' % int(data[i + 1]),  # Day
-                        u'%s' % int(get_current_date('month_int')),  # Month
-                        u'%s' % int(get_current_date('year')))  # Year
-                       for i in xrange(0, len(data), 5)]
-
-        # Get DB current forecast
-        current_data = (self.prognos_db.get_current_forecast() if
-                        self.prognos_db.current_forecast_in_db() else None)
-
-        # Convert int data to unicode for comparison purposes
-        data_to_inset = []
-        for i, item in enumerate(current_data):
-            current_data[i] = list(current_data[i])
-            for j in xrange(len(item)):
-                current_data[i][j] = unicode(current_data[i][j])
-            data_to_inset.append(tuple(current_data[i][:2] +
-                                       current_data[i][4:]))
-            current_data[i] = tuple(current_data[i][0:4])
-
-        # Test if DB data for current day is in online data, otherwise
-        # insert them
-        for c_datum, key, i_datum in itertools.izip(
-                current_data,
-                self.xml_forecast_data.keys(),
-                data_to_inset):
-
-            if c_datum not in online_data:
-                for i, item in enumerate(i_datum):
-                    self.xml_forecast_data[key].insert(i, item)
-
-        # Fixing the change of month and year issue
-        month, year = self._get_months_years()
-
-        # Variable to store forecast data
-        self.forecast_data = []
-
-        # Final forecast data ready to be store in prognos_db
-        self.forecast_data = [(int(year[j]),  # Year
-                               int(month[j]),  # Month
-                               int(data[i + 1]),  # Day
-                               data[i],  # Location
-                               int(data[i + 2]),  # Day temp
-                               int(data[i + 3]),  # Night temp
-                               unicode(data[i + 4]))  # Weather status
-                              for i, j in itertools.izip(
-                                  xrange(0, len(data), 5),
-                                  xrange(0, len(data)))]
-
-    def _get_months_years(self):
-        """"""
-        def test_month_year(days_, test='month_int'):
-            """Test for month and year.
-
-            :param days_: A list of integers representing a logical sequence of day
-            :param test: Take values 'month_int' or 'year'
-            """
-            current_month = int(get_current_date('month_int'))
-            current_test = value_ = int(get_current_date(test))
-            result = []
-
-            if test == 'month_int':
-                value_ = 1 if current_month == 12 else current_test + 1
-            elif test == 'year':
-                value_ = current_test + 1 if current_month == 12 else current_test
-
-            for day in days_:
-                if day < days_[0]:
-                    result.append(value_)
-                else:
-                    result.append(current_test)
-
-            return result
-
-        days = []
-        months = []
-        years = []
-        for value in self.xml_forecast_data.values():
-            for i, datum in enumerate(value):
-                if i in range(1, len(value), 5):
-                    days.append(datum)
-            months += test_month_year(days_=days)
-            years += test_month_year(days_=days, test='year')
-
-        return months, years
+        msg_box = MsgBox()
+        if isinstance(error, CircuitOpenError):
+            msg_box.msg_label.text = 'El sitio del tiempo no responde, se ' \
+                                     'muestran los últimos datos ' \
+                                     'disponibles. Inténtelo más tarde.'
+        elif isinstance(error, FeedError):
+            msg_box.msg_label.text = 'Su conexión no está disponible o ' \
+                                     'los datos de conexión son ' \
+                                     'incorrectos. Verifíquelos e ' \
+                                     'inténtelo nuevamente.'
+        else:
+            msg_box.msg_label.text = 'Los datos recibidos del sitio del ' \
+                                     'tiempo no son válidos. Inténtelo ' \
+                                     'más tarde.'
+        msg_box.title = 'Error de conexión'
+        msg_box.open()
 
     def _display_data(self, *args):
         """Manage the data displaying for extended forecast."""
         # Delete the args parameter cause we don't use it
         del args
 
-        # Get data to show from prognos_db
-        data = self.prognos_db.get_extended_forecast(
-            location_=self.prognos_app.location,
-            days=self.days_dialog.days)
+        # Get data to show from the station index
+        data = self.get_upcoming_forecast(self.prognos_app.location)[
+            :self.days_dialog.days]
 
         # Create the dialog to display the info for extended forecast
         forecast_dialog = ExtendedForecastDialog()
 
-        # Display the data
-        i = 0
-        for item in data:
-            data_to_show = list(item)
-
-            # Append the corresponding weather image
-            data_to_show.append(self.weather_statuses[data_to_show[4]])
-
-            for datum in data_to_show:
-                if i > 0 and not (i + 1) % 6:
-                    forecast_dialog.data_labels[i].source = datum
-                elif (i in range(3, 41, 6) + range(2, 40, 6) and
-                        self.prognos_app.temp_unit == u'Fahrenheit ºF'):
-                    if data_to_show[4] == self.weather_statuses.keys()[0]:
-                        forecast_dialog.data_labels[i].text = (
-                            '0' + ' ' + self.prognos_app.temp_unit[-2:])
-                    else:
-                        forecast_dialog.data_labels[i].text = (
-                            unicode(convert_temp(datum))
-                            + ' ' + self.prognos_app.temp_unit[-2:])
-                elif i in range(3, 41, 6) + range(2, 40, 6):
-                    forecast_dialog.data_labels[i].text = (
-                        unicode(datum) + ' ' + self.prognos_app.temp_unit[-2:])
-                else:
-                    forecast_dialog.data_labels[i].text = unicode(datum)
-                i += 1
+        # Display the data, six labels per row: day, location, day temp,
+        # night temp, weather status and weather image
+        unit = self.prognos_app.temp_unit
+        symbol = unit[-2:]
+        labels = forecast_dialog.data_labels
+        for row, record in enumerate(data):
+            day, location, _, _, weather_status = record[2:]
+            temps = self.views.get_temperatures(record)[unit]
+            first = row * 6
+
+            labels[first].text = unicode(day)
+            labels[first + 1].text = unicode(location)
+            labels[first + 2].text = (unicode(temps['day_temp']) +
+                                      ' ' + symbol)
+            labels[first + 3].text = (unicode(temps['night_temp']) +
+                                      ' ' + symbol)
+            labels[first + 4].text = unicode(weather_status)
+            labels[first + 5].source = (
+                self.prognos_app.weather_images.get_source(
+                    self.vocabulary.icon(weather_status)))
 
         # Show the dialog
         forecast_dialog.open()
 
-    @staticmethod
-    def _get_day(year, month, day):
-        try:
-            datetime.date(year, month, day)
-            return year, month, day
-        except ValueError:
-            year = year if month + 1 <= 12 else year + 1
-            month = month + 1 if month + 1 <= 12 else 1
-            return year, month, 1
+    def _load_forecast_data(self, forecast_data):
+        """Build the in-memory views of all the stored forecast data.
 
-    def set_default_forecast_data(self):
-        """Set default forecast data and store them in db."""
-        # Weather forecast default data
-        self.weather_forecast = {
-            'location': self.prognos_app.location,
+        Called on startup and when default data is stored, ingests only
+        apply what changed, see _apply_changeset.
+        :param forecast_data: List of tuples in the layout that
+        store_weather_forecast_data expects.
+        """
+        self.views.load(forecast_data)
+        self._on_views_updated()
+
+    def _apply_changeset(self, changeset):
+        """Update the in-memory views with what an ingest changed.
+
+        :param changeset: diff.Changeset of the stored records
+        """
+        self.views.apply(changeset)
+        self._on_views_updated()
+
+    def _on_views_updated(self):
+        """Keep track of the generation the in-memory views show."""
+        self.generation = self.prognos_db.generation
+
+        # Rebuild the settings panel with the new stations next time it opens
+        if len(self.catalog) != self.stations_count:
+            self.stations_count = len(self.catalog)
+            self.prognos_app.destroy_settings()
+
+    def _reload_if_changed(self):
+        """Update the in-memory views if another process stored new data.
+
+        Returns the diff.Changeset applied, None if there is no new data.
+        """
+        if self.prognos_db.generation == self.generation:
+            return None
+
+        changeset = diff_records(self.views.records,
+                                 self.prognos_db.get_forecast_data())
+        self._apply_changeset(changeset)
+
+        return changeset
+
+    def _check_generation(self, *args):
+        """Update the UI if another process changed the data of the current
+        location.
+
+        :param args: For binding purpose only
+        """
+        # Delete the args parameter cause we don't use it
+        del args
+
+        changeset = self._reload_if_changed()
+        if changeset and self.prognos_app.location in changeset.locations:
+            self.prognos_app.root.update_prognos(
+                location_=self.prognos_app.location,
+                weather_forecast_=self.weather_forecast)
+
+    def _get_default_forecast(self, location):
+        """Get the default forecast for location, used when no data is
+        available."""
+        return {
+            'location': location,
             'day': get_current_date(),
             'month_int': get_current_date('month_int'),
             'year': get_current_date('year'),
             'day_temp': 0,
             'night_temp': 0,
-            'weather_status': self.weather_statuses.keys()[0]}
+            'weather_status': UNAVAILABLE,
+            'temps': dict((unit, {'day_temp': 0, 'night_temp': 0})
+                          for unit, _ in TEMP_UNITS)}
 
-        # Store the default forecast data in DB
-        if self.prognos_db.db_is_empty or self.prognos_db.db_is_obsolete:
-            # Store default data if no connection and no data is available
-            self.forecast_data = []
-            for location in self.locations:
-                day = int(get_current_date())
-                month = int(get_current_date('month_int'))
-                year = int(get_current_date('year'))
-                default_days = 0
-
-                while default_days < 5:
-                    year, month, day = self._get_day(year, month, day)
-                    self.forecast_data.append(
-                        (year,  # Year
-                         month,  # Month
-                         day,  # Day
-                         location,  # Location
-                         0,  # Day temp
-                         0,  # Night temp
-                         self.weather_statuses.keys()[0]))  # Weather status
-
-                    day += 1
-                    default_days += 1
+    def set_default_forecast_data(self):
+        """Set default forecast data and store them in db."""
+        # Weather forecast default data
+        self.weather_forecast = self._get_default_forecast(
+            self.prognos_app.location)
 
+        # Store the default forecast data in DB, unless another process is
+        # the leader
+        if ((self.prognos_db.db_is_empty or self.prognos_db.db_is_obsolete)
+                and self.leader.acquire()):
+            # Store default data if no connection and no data is available
+            forecast_data = default_records(self.catalog.names)
             self.prognos_db.store_weather_forecast_data(
-                forecast_data=self.forecast_data)
+                forecast_data=forecast_data,
+                sources=dict.fromkeys(self.catalog.names,
+                                      self.provider.name))
+            self._load_forecast_data(forecast_data)
+            self.leader.release()
 
     def _connect_to_weather_site(self, *args):
         """Method for fetching the weather forecast data from Met site.
 
-        This method parses the cuban weather site xml to get the weather
-        forecast data to update DB.
+        Feeds are downloaded and parsed in a background thread. Downloads
+        requested while another one is in flight share its result (see
+        ForecastPipeline.fetch_all), then every feed is stored in the main
+        thread by _on_feed_fetched as soon as it arrives. Ignored while a
+        refresh is running: the process holds the leader lock, so acquiring
+        it again would succeed and start a second worker.
         """
         # Delete the args parameter cause we don't use it
         del args
 
-        # Weather URL for Cuba
-        weather_site_url = u'http://www.met.inf.cu/asp/genesis.asp?TB0=RSSFEED'
-
-        # Variables for storing weather site content as string
-        weather_site_content = None
-
-        # Connect to weather site and retrieve the forecast information
-        try:
-            # Connect only if database is not up to date
-            if self.prognos_db.db_is_not_updated:
-                # This code is for debugging purposes:
-                # with open('data_file.xml', 'r') as weather_site:
-                #     weather_site_content = weather_site.read()
-                weather_site = urllib2.urlopen(url=weather_site_url)
-                weather_site_content = weather_site.read()
-                # This code is for debugging purposes:
-                with open('data_file.xml', 'w') as xml:
-                    xml.write(weather_site_content)
-        except urllib2.URLError:
-            # Show error message on URLError
-            msg_box = MsgBox()
-            msg_box.msg_label.text = 'Su conexión no está disponible o ' \
-                                     'los datos de conexión son incorrectos. ' \
-                                     'Verifíquelos e inténtelo nuevamente.'
-            msg_box.title = 'Error de conexión'
-            msg_box.open()
+        if self._refreshing:
+            return
+
+        # Connect only if database is not up to date
+        if not self.prognos_db.db_is_not_updated:
+            self._on_refresh_done()
+            return
+
+        # Another process fetches for this device, show its latest data
+        if not self.leader.acquire():
+            self._reload_if_changed()
+            self._on_refresh_done()
+            return
+
+        self._refreshing = True
+        self._fetch_errors = []
+        thread = threading.Thread(target=self._fetch_feeds,
+                                  name='prognos-refresh')
+        thread.daemon = True
+        thread.start()
+
+    def _fetch_feeds(self):
+        """Download and parse the feeds and hand them over to the main
+        thread as they arrive."""
+        self.pipeline.fetch_all(
+            on_result=lambda client, parsed, error: Clock.schedule_once(
+                partial(self._on_feed_fetched, client, parsed, error)))
+
+        Clock.schedule_once(self._on_refresh_done)
+
+    def _on_feed_fetched(self, client, parsed, error, *args):
+        """Store a downloaded feed.
+
+        :param client: FeedClient the feed came from
+        :param parsed: ParsedFeed, None if the download failed
+        :param error: FeedError or ParseError of a failed download, or None
+        :param args: For binding purpose only
+        """
+        # Delete the args parameter cause we don't use it
+        del args
 
-        if weather_site_content:
-            # Parse the content of the weather site
-            self._parse_weather_site_xml(xml_content=weather_site_content)
+        if error is not None:
+            if isinstance(error, ProxyAuthError):
+                # Ask for the credentials again next time
+                self.proxy_session.clear_credentials()
+            self._fetch_errors.append(error)
+        else:
+            # Stores what changed, applied through the on_changed callback
+            self.pipeline.process(parsed, client)
 
-            # Transform forecast data to be stored in DB
-            self._transform_forecast_data()
+    def _on_refresh_done(self, *args):
+        """Report the first error of a refresh, if any, and update the UI.
 
-            # Store weather forecast data in prognos_db
-            self.prognos_db.store_weather_forecast_data(
-                forecast_data=self.forecast_data)
+        :param args: For binding purpose only
+        """
+        # Delete the args parameter cause we don't use it
+        del args
 
-        # Fetch weather forecast from prognos_db and update the UI
+        if self._fetch_errors:
+            self._show_connection_error(self._fetch_errors[0])
+            self._fetch_errors = []
+
+        self._refreshing = False
+        self.leader.release()
+
+        # Fetch weather forecast from the station index and update the UI
         self.prognos_app.root.update_prognos(
             location_=self.prognos_app.location,
             weather_forecast_=self.weather_forecast)
 
+        metrics.export()
+
+    def get_upcoming_forecast(self, location):
+        """Get the forecast records for location from today on.
+
+        :param location: Location to get the records for.
+        """
+        return self.views.get_upcoming(location,
+                                       get_today_date(int_format=True))
+
+    def _set_weather_forecast(self, record):
+        """Put a forecast record in weather_forecast for displaying purposes.
+
+        :param record: Tuple in the layout that store_weather_forecast_data
+        expects.
+        """
+        (self.weather_forecast['year'],
+         self.weather_forecast['month_int'],
+         self.weather_forecast['day'],
+         self.weather_forecast['location'],
+         self.weather_forecast['day_temp'],
+         self.weather_forecast['night_temp'],
+         self.weather_forecast['weather_status']) = record
+
+        self.weather_forecast['temps'] = self.views.get_temperatures(record)
+
     def fetch_weather_locally(self, location):
-        """Fetch the weather data from prognos_db."""
-        # Get the forecast data from DB
-        data = self.prognos_db.get_current_forecast(location)
-
-        # Put forecast data in a dict for displaying purposes
-        if data:
-            (self.weather_forecast['location'],
-             self.weather_forecast['day'],
-             self.weather_forecast['month_int'],
-             self.weather_forecast['year'],
-             self.weather_forecast['day_temp'],
-             self.weather_forecast['night_temp'],
-             self.weather_forecast['weather_status']) = data[0]
+        """Fetch the weather data from the station index.
+
+        weather_forecast is left untouched if location has no forecast for
+        today.
+        """
+        record = self.views.get_record(location,
+                                       get_today_date(int_format=True))
+
+        if record:
+            self._set_weather_forecast(record)
+
+    def select_location(self, location):
+        """Switch weather_forecast to location.
+
+        Uses only the station index: no DB access and no writes. Falls back
+        to the default forecast if location has no forecast for today.
+        """
+        record = self.views.get_record(location,
+                                       get_today_date(int_format=True))
+
+        if record:
+            self._set_weather_forecast(record)
+        else:
+            self.weather_forecast = self._get_default_forecast(location)
 
     def fetch_weather_online(self, use_proxy, host, port):
         """Manage the beginning of proxy authentication process if needed."""
         if use_proxy:
-            if host and port:
+            # Build a new session only when the proxy configuration changes
+            if (self.proxy_session is None or
+                    not self.proxy_session.matches(host, port)):
+                self.proxy_session = ProxySession(host=host, port=port)
+
+            if host and port and self.proxy_session.has_credentials:
+                # Credentials are still valid, don't ask for them again
+                self._set_proxy_session(self.proxy_session)
+                self._connect_to_weather_site()
+            elif host and port:
                 # Updating weather image on cancel
                 self.proxy_auth_dialog.cancel_button.bind(on_release=partial(
                     self.prognos_app.root.set_weather_image,
-                    self.weather_statuses[self.weather_forecast[
-                        'weather_status']]))
+                    self.vocabulary.icon(self.weather_forecast[
+                        'weather_status'])))
 
                 # Open authentication dialog
                 self.proxy_auth_dialog.open()
@@ -432,7 +460,8 @@ class CubanWeather(object):
                                          'inténtelo nuevamente.'
                 msg_box.title = 'Error de conexión'
                 msg_box.open()
-                self.prognos_app.root.set_weather_image(self.weather_statuses[
-                    self.weather_forecast['weather_status']])
+                self.prognos_app.root.set_weather_image(self.vocabulary.icon(
+                    self.weather_forecast['weather_status']))
         else:
+            self._set_proxy_session(None)
             self._connect_to_weather_site()